@@ -0,0 +1,101 @@
+import json
+
+# this module records how the aligner graded one attempt, step by step
+# pass an AlignmentTrace as trace= to the aligner, nothing is recorded (or paid for) otherwise
+# NOTE: steps run from the start of both sequences to the end, like reading the alignment
+
+MOVE_NAMES = ('diagonal', 'deletion', 'insertion')
+
+
+class AlignmentTrace:
+    """
+    Structured record of one alignment.
+
+    Attributes:
+    -----------
+        engine (str): Aligner that filled the trace (e.g., 'needleman_wunsch')
+        parameters (dict): Scoring parameters of the aligner
+        target (list): Target IPA phonemes with spaces
+        user (list): User IPA phonemes with spaces
+        steps (list): One dict per alignment step with move, target/user index and phoneme,
+                      feature_distance, score (of the step), total (score so far) and severity
+        score (float): Alignment score of the path
+        accuracy (float): Accuracy percentage
+        mispronounced (dict): Target phoneme index -> severity, as returned by the aligner
+    """
+
+    def __init__(self):
+        self.engine = None
+        self.parameters = {}
+        self.target = []
+        self.user = []
+        self.steps = []
+        self.score = None
+        self.accuracy = None
+        self.mispronounced = {}
+
+    def add_step(self, move, target_index, user_index, step_score, feature_distance=None, severity=None):
+        """
+        Append the next step of the path.
+
+        Args:
+        -----
+            move (int): 0: diagonal, 1: deletion (up), 2: insertion (left)
+            target_index (int): Target phoneme index the step reads (None for insertions)
+            user_index (int): User phoneme index the step reads (None for deletions)
+            step_score (float): Score the step adds
+            feature_distance (float): Distance between the two phonemes (diagonal steps)
+            severity (str): 'partial'/'incorrect' the step marked on the target, None if correct
+        """
+        total = (self.steps[-1]['total'] if self.steps else 0.0) + step_score
+        self.steps.append({
+            'move': MOVE_NAMES[move],
+            'target_index': target_index,
+            'user_index': user_index,
+            'target': None if target_index is None else self.target[target_index],
+            'user': None if user_index is None else self.user[user_index],
+            'feature_distance': feature_distance,
+            'score': step_score,
+            'total': total,
+            'severity': severity,
+        })
+
+    def to_dict(self):
+        """The trace as plain python types (safe to json.dump)."""
+        return {
+            'engine': self.engine,
+            'parameters': self.parameters,
+            'target': self.target,
+            'user': self.user,
+            'steps': self.steps,
+            'score': self.score,
+            'accuracy': self.accuracy,
+            'mispronounced': {str(k): v for k, v in sorted(self.mispronounced.items())},
+        }
+
+    def to_json(self, **kwargs):
+        """The trace as a JSON string, kwargs go to json.dumps (e.g., indent=2)."""
+        return json.dumps(self.to_dict(), ensure_ascii=False, **kwargs)
+
+    def render(self):
+        """
+        The trace as a text table, one row per step.
+
+        Returns:
+        --------
+            str: Table with a header and a summary line
+        """
+        lines = [f"{self.engine} {self.parameters}",
+                 f"{'move':<10}{'target':>8}{'user':>8}{'dist':>8}{'score':>9}{'total':>9}  severity"]
+        for step in self.steps:
+            target = '-' if step['target'] is None else repr(step['target'])
+            user = '-' if step['user'] is None else repr(step['user'])
+            distance = '' if step['feature_distance'] is None else f"{step['feature_distance']:.3f}"
+            lines.append(f"{step['move']:<10}{target:>8}{user:>8}{distance:>8}{step['score']:>9.3f}"
+                         f"{step['total']:>9.3f}  {step['severity'] or ''}")
+        accuracy = '' if self.accuracy is None else f", accuracy {self.accuracy:.2f}%"
+        lines.append(f"score {self.score:.3f}{accuracy}, mispronounced {self.mispronounced}")
+        return '\n'.join(lines)
+
+    def __str__(self):
+        return self.render()
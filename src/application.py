@@ -3,6 +3,8 @@ from tkinter import ttk
 from text_gen import gen_random_text
 import text_processing as tp
 import error_detection as ed
+import pronunciation_lattice as pl
+import corpus_index as ci
 import models as md
 from audio_recorder import AudioRecorder
 import matplotlib.pyplot as plt
@@ -46,9 +48,7 @@ class Application:
         self.recorder = AudioRecorder(callback=self.process_audio, tag="pronunciation")
         self.stt_model = md.STTModel()
 
-        self.current_text = gen_random_text()
-        self.current_phoneme = tp.text_to_ipa_phoneme(self.current_text)
-        self.display_phoneme = ''.join(self.current_phoneme)
+        self.load_phrase()
         self.error_info = None
 
         self.panel = PronunciationPanel(self.root, tts_callback=self.play_tts)
@@ -527,12 +527,24 @@ class Application:
         self.jaide_gui_frame.pack_forget()
         self.root.update()
 
+    def load_phrase(self):
+        """Pick a new practice phrase with its phonemes and offsets."""
+        corpus = ci.load_corpus()
+        if corpus is not None:
+            # precomputed by build_corpus_index.py, nothing to convert
+            self.current_text, self.current_phoneme, self.offset_index = corpus.random_entry()
+        else:
+            self.current_text = gen_random_text()
+            self.current_phoneme = tp.text_to_ipa_phoneme(self.current_text)
+            self.offset_index = ed.build_offset_index(self.current_text, self.current_phoneme)
+        self.display_phoneme = self.current_phoneme.display
+        # lexicon variants (e.g., 'either' as ˈiðɝ or ˈaɪðɝ) are graded as correct
+        self.lattice = pl.PronunciationLattice.from_phrase(self.current_text, self.current_phoneme, self.offset_index)
+
     def generate(self):
         """Generate new text, update UI, and remove old audio files."""
         self.recorder.delete_recording()
-        self.current_text = gen_random_text()
-        self.current_phoneme = tp.text_to_ipa_phoneme(self.current_text)
-        self.display_phoneme = ''.join(self.current_phoneme)
+        self.load_phrase()
         self.error_info = None
 
         self.text_display.config(state="normal")
@@ -562,11 +574,13 @@ class Application:
         """Processes recorded audio and highlights incorrect phonemes."""
         print("Processing audio:", filename)
 
-        user_text = self.stt_model.transcribe(filename)
-        print("Transcription:", user_text)
+        # grade every likely transcription, one asr slip shouldnt fail the learner
+        user_texts = self.stt_model.transcribe_nbest(filename)
+        user_text = user_texts[0]
+        print("Transcriptions:", user_texts)
 
-        user_phonemes = tp.text_to_ipa_phoneme(user_text)
-        print("Phonemes:", user_phonemes)
+        hypotheses = [tp.text_to_ipa_phoneme(text) for text in user_texts]
+        print("Phonemes:", hypotheses[0])
 
         target_words = self.current_text.split()
         user_words = user_text.split()
@@ -577,7 +591,8 @@ class Application:
             self.user_play_button.config(state="normal")
             return
 
-        self.error_info = ed.get_pronunciation_score(self.current_text, self.current_phoneme, user_phonemes)
+        self.error_info = ed.get_pronunciation_score_nbest(self.current_text, self.current_phoneme, hypotheses,
+                                                           offset_index=self.offset_index, lattice=self.lattice)
         # create section for accuracy later
         self.highlight_text(self.error_info['incorrect_indices'])
         self.highlight_phonemes(self.error_info['phoneme_indices'])
@@ -610,11 +625,10 @@ class Application:
         self.phoneme_display.tag_add("correct", "1.0", tk.END)
 
         for phoneme_idx, severity in phoneme_indices:
-            # need to know starting pos by adding num characters for each index upto current
-            # this is because phonemes are displayed as flat list and processed split
-            start_pos = sum(len(self.current_phoneme[i]) for i in range(phoneme_idx))
-            phoneme_length = len(self.current_phoneme[phoneme_idx])
-            self.phoneme_display.tag_add(severity, f"1.{start_pos}", f"1.{start_pos + phoneme_length}")
+            # phonemes are displayed as flat list and processed split
+            # so the display position comes from the offset index
+            start_pos, end_pos = self.offset_index.display_span(phoneme_idx)
+            self.phoneme_display.tag_add(severity, f"1.{start_pos}", f"1.{end_pos}")
 
         self.phoneme_display.config(state="disabled")
 
@@ -663,12 +677,12 @@ class Application:
             start_index = int(word_start.split('.')[1])
             end_index = int(word_end.split('.')[1])
             # get the word info for the word clicked
-            for word_feedback in self.error_info['word_feedback']:
-                if start_index <= word_feedback['char_start_index'] and \
-                    end_index <= word_feedback['char_end_index']:
-                    return word_feedback['word'], word_feedback['phonemes']
-            # if it reaches this i have failed you
-            return None
+            word_index = self.offset_index.word_at(start_index, end_index)
+            if word_index is None:
+                # if it reaches this i have failed you
+                return None
+            word_feedback = self.error_info['word_feedback'][word_index]
+            return word_feedback['word'], word_feedback['phonemes']
 
     def play_tts(self, text):
         md.play_tts(text)
@@ -0,0 +1,317 @@
+import argparse
+import json
+import re
+import sys
+import time
+import tracemalloc
+import numpy as np
+import error_detection as ed
+import phoneme_inventory as pi
+import distance_table as dt
+import lexicon as lx
+import pronunciation_lattice as pl
+from text_processing import ARPA_TO_IPA
+from text_gen import FILE_PATH
+
+# benchmark for the alignment engines on synthetic learner attempts
+# targets come from res/sentences.json (lexicon pronunciations so g2p isnt needed),
+# attempts get substitutions, deletions and insertions injected at set rates
+# run: python src/benchmark.py --count 300 --sentences 1,4 --engines needleman_wunsch,batch
+# NOTE: exits with 1 if an engine that should match needleman_wunsch exactly doesnt
+
+# engines expected to give exactly the needleman_wunsch result
+EXACT_ENGINES = {'needleman_wunsch', 'banded', 'low_memory', 'incremental', 'lattice', 'batch', 'get_pronunciation_score'}
+
+
+class MispronunciationGenerator:
+    """
+    Turns target phonemes into learner-like attempts.
+
+    Substitutions pick a near confusion (one of the closest phonemes in the
+    distance table) or a far one (one of the most distant) so both partial and
+    incorrect severities show up. Every error covers a run of 1 to max_run phonemes
+    inside one word.
+    """
+
+    def __init__(self, substitution_rate=0.1, deletion_rate=0.05, insertion_rate=0.05,
+                 near_fraction=0.7, max_run=1, neighbours=5, seed=0):
+        """
+        Args:
+        -----
+            substitution_rate (float): Chance a phoneme starts a substituted run
+            deletion_rate (float): Chance a phoneme starts a deleted run
+            insertion_rate (float): Chance a run of extra phonemes follows a phoneme
+            near_fraction (float): Share of substitutions that use a near confusion
+            max_run (int): Longest run of phonemes one error covers
+            neighbours (int): How many nearest/farthest phonemes count as near/far
+            seed (int): Random seed, same seed gives the same attempts
+        """
+        self.substitution_rate = substitution_rate
+        self.deletion_rate = deletion_rate
+        self.insertion_rate = insertion_rate
+        self.near_fraction = near_fraction
+        self.max_run = max_run
+        self.rng = np.random.default_rng(seed)
+        # confusions are phonemes a recognizer can actually output
+        self.candidates = pi.phoneme_ids(list(dict.fromkeys(ARPA_TO_IPA.values())))
+        cost = dt.cost_matrix()[:, self.candidates]
+        order = np.argsort(cost, axis=1, kind='stable')
+        # the phoneme itself (distance 0) is always first
+        self.near = self.candidates[order[:, 1:neighbours + 1]]
+        self.far = self.candidates[order[:, -neighbours:]]
+
+    def confusion(self, phoneme_id):
+        """Random near or far substitute for a phoneme id."""
+        pool = self.near if self.rng.random() < self.near_fraction else self.far
+        return int(self.rng.choice(pool[phoneme_id]))
+
+    def mutate(self, target_ids):
+        """
+        Make one attempt at a target.
+
+        Args:
+        -----
+            target_ids (np.ndarray): Target phoneme ids with spaces
+
+        Returns:
+        --------
+            np.ndarray: User phoneme ids
+        """
+        user = []
+        i = 0
+        while i < len(target_ids):
+            phoneme = int(target_ids[i])
+            if phoneme == pi.SPACE_ID:
+                user.append(phoneme)
+                i += 1
+                continue
+            # run length, cut at the end of the word
+            run = int(self.rng.integers(1, self.max_run + 1))
+            stop = i
+            while stop < min(i + run, len(target_ids)) and target_ids[stop] != pi.SPACE_ID:
+                stop += 1
+            r = self.rng.random()
+            if r < self.substitution_rate:
+                user.extend(self.confusion(int(p)) for p in target_ids[i:stop])
+                i = stop
+            elif r < self.substitution_rate + self.deletion_rate:
+                i = stop
+            else:
+                user.append(phoneme)
+                if r < self.substitution_rate + self.deletion_rate + self.insertion_rate:
+                    user.extend(int(p) for p in self.rng.choice(self.candidates, size=run))
+                i += 1
+        return np.array(user, dtype=np.intp)
+
+
+def load_sentences(path=FILE_PATH):
+    """Sentences of res/sentences.json."""
+    with open(path, encoding='utf-8') as f:
+        return [entry['sentence'] for entry in json.load(f)['data']]
+
+
+def sentence_phonemes(sentence):
+    """
+    Target phonemes of a sentence from the lexicon's main pronunciations.
+
+    Args:
+    -----
+        sentence (str): Sentence (e.g., "The quick brown fox")
+
+    Returns:
+    --------
+        list: List of IPA phonemes with spaces, None if a word isnt in the lexicon
+    """
+    # same cleaning as text_to_phoneme
+    words = re.sub(r"[^\w\s']", '', sentence.replace('’', "'")).split()
+    phonemes = []
+    for word in words:
+        variants = lx.pronunciations(word)
+        if not variants:
+            return None
+        if phonemes:
+            phonemes.append(' ')
+        phonemes.extend(variants[0])
+    return phonemes
+
+
+def build_workload(sentences, generator, sentences_per_item=1, count=200):
+    """
+    Target/attempt pairs made from consecutive sentences.
+
+    Args:
+    -----
+        sentences (list): Sentences to draw targets from
+        generator (MispronunciationGenerator): Makes the attempts
+        sentences_per_item (int): Sentences joined into one target (longer readings)
+        count (int): Number of pairs
+
+    Returns:
+    --------
+        list: (phrase, target_ids, user_ids) tuples
+    """
+    known = [(s, p) for s in sentences if (p := sentence_phonemes(s)) is not None]
+    workload = []
+    for k in range(count):
+        start = (k * sentences_per_item) % len(known)
+        chosen = [known[(start + i) % len(known)] for i in range(sentences_per_item)]
+        phrase = ' '.join(s for s, _ in chosen)
+        target = []
+        for _, phonemes in chosen:
+            target += ([' '] if target else []) + phonemes
+        target_ids = pi.phoneme_ids(target)
+        workload.append((phrase, target_ids, generator.mutate(target_ids)))
+    return workload
+
+
+def low_memory_needleman_wunsch(target_ids, user_ids, match_reward=3, gap_penalty=-2):
+    """needleman_wunsch forced onto its block by block path, whatever the size."""
+    similarity = (1 - dt.cost_matrix()) * match_reward
+    path = ed.low_memory_alignment(similarity, target_ids, user_ids, gap_penalty)
+    return ed.follow_traceback(path, 1, 1, 0, target_ids, user_ids), ed.weighted_accuracy(target_ids, user_ids)
+
+
+def incremental_needleman_wunsch(target_ids, user_ids, chunk=4):
+    """IncrementalAligner fed a few phonemes at a time."""
+    aligner = ed.IncrementalAligner(target_ids)
+    for start in range(0, len(user_ids), chunk):
+        aligner.extend(user_ids[start:start + chunk])
+    return aligner.finish()
+
+
+def chain_lattice(target_ids):
+    """Lattice with only the target pronunciation (no lexicon variants)."""
+    spans = ed.word_spans(target_ids).tolist()
+    return pl.PronunciationLattice(target_ids, [[] for _ in spans], spans)
+
+
+def score_result(phrase, target_ids, user_ids):
+    """get_pronunciation_score as a (mispronounced, accuracy) result."""
+    error_info = ed.get_pronunciation_score(phrase, target_ids, user_ids, use_cache=False)
+    return dict(error_info['phoneme_indices']), error_info['accuracy']
+
+
+# name -> engine(phrase, target_ids, user_ids) returning (mispronounced, accuracy)
+ENGINES = {
+    'needleman_wunsch': lambda phrase, t, u: ed.needleman_wunsch(t, u),
+    'banded': lambda phrase, t, u: ed.needleman_wunsch(t, u, band=ed.MIN_BAND),
+    'low_memory': lambda phrase, t, u: low_memory_needleman_wunsch(t, u),
+    'incremental': lambda phrase, t, u: incremental_needleman_wunsch(t, u),
+    'hierarchical': lambda phrase, t, u: ed.hierarchical_needleman_wunsch(t, u),
+    'affine': lambda phrase, t, u: ed.affine_needleman_wunsch(t, u),
+    'lattice': lambda phrase, t, u: ed.lattice_needleman_wunsch(chain_lattice(t), u),
+    'get_pronunciation_score': score_result,
+}
+# engines that take the whole workload in one call
+BATCH_ENGINES = {
+    'batch': lambda workload: ed.batch_needleman_wunsch([(t, u) for _, t, u in workload]),
+}
+
+
+def run_engine(name, workload):
+    """
+    Run one engine over the workload.
+
+    Returns:
+    --------
+        tuple: (results, seconds per pair) for every pair, batch engines
+               report the same amortized time for every pair
+    """
+    if name in BATCH_ENGINES:
+        start = time.perf_counter()
+        results = BATCH_ENGINES[name](workload)
+        return results, [(time.perf_counter() - start) / len(workload)] * len(workload)
+    engine = ENGINES[name]
+    results, latencies = [], []
+    for phrase, target_ids, user_ids in workload:
+        start = time.perf_counter()
+        results.append(engine(phrase, target_ids, user_ids))
+        latencies.append(time.perf_counter() - start)
+    return results, latencies
+
+
+def peak_memory(name, workload):
+    """Peak traced memory in bytes while an engine runs over the workload (timing would be inflated)."""
+    tracemalloc.start()
+    try:
+        run_engine(name, workload)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def same_result(a, b):
+    """Whether two (mispronounced, accuracy) results match."""
+    return dict(a[0]) == dict(b[0]) and abs(a[1] - b[1]) <= 1e-9
+
+
+def run_benchmark(workload, engines, memory_items=20):
+    """
+    Benchmark engines on one workload and check them against needleman_wunsch.
+
+    Args:
+    -----
+        workload (list): (phrase, target_ids, user_ids) from build_workload
+        engines (list): Engine names (keys of ENGINES or BATCH_ENGINES)
+        memory_items (int): Pairs of the workload peak memory is measured on
+
+    Returns:
+    --------
+        dict: Engine name -> pairs_per_second, p50_ms, p95_ms, peak_mb, mismatches
+    """
+    # loads the distance tables and lexicon so the first engine isnt charged for it
+    for name in engines:
+        run_engine(name, workload[:2])
+    reference = run_engine('needleman_wunsch', workload)[0]
+    report = {}
+    for name in engines:
+        results, latencies = run_engine(name, workload)
+        latencies_ms = np.array(latencies) * 1000
+        report[name] = {
+            'pairs_per_second': len(workload) / sum(latencies),
+            'p50_ms': float(np.percentile(latencies_ms, 50)),
+            'p95_ms': float(np.percentile(latencies_ms, 95)),
+            'peak_mb': peak_memory(name, workload[:memory_items]) / 2**20,
+            'mismatches': sum(not same_result(a, b) for a, b in zip(results, reference)),
+        }
+    return report
+
+
+def print_report(report, title):
+    print(f"\n{title}")
+    print(f"{'engine':<25}{'pairs/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'peak MB':>10}{'mismatch':>10}")
+    for name, row in report.items():
+        print(f"{name:<25}{row['pairs_per_second']:>10.1f}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}"
+              f"{row['peak_mb']:>10.2f}{row['mismatches']:>10}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark alignment engines on synthetic attempts")
+    parser.add_argument('--count', type=int, default=100, help="pairs per workload")
+    parser.add_argument('--sentences', default='1,4', help="sentences per target, one workload each (e.g., 1,4,16)")
+    parser.add_argument('--engines', default=','.join(list(ENGINES) + list(BATCH_ENGINES)))
+    parser.add_argument('--substitution-rate', type=float, default=0.1)
+    parser.add_argument('--deletion-rate', type=float, default=0.05)
+    parser.add_argument('--insertion-rate', type=float, default=0.05)
+    parser.add_argument('--near-fraction', type=float, default=0.7)
+    parser.add_argument('--max-run', type=int, default=2)
+    parser.add_argument('--memory-items', type=int, default=20, help="pairs peak memory is measured on")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    engines = args.engines.split(',')
+    sentences = load_sentences()
+    failed = False
+    for sentences_per_item in map(int, args.sentences.split(',')):
+        generator = MispronunciationGenerator(args.substitution_rate, args.deletion_rate, args.insertion_rate,
+                                              args.near_fraction, args.max_run, seed=args.seed)
+        workload = build_workload(sentences, generator, sentences_per_item, args.count)
+        report = run_benchmark(workload, engines, args.memory_items)
+        mean_length = np.mean([len(t) for _, t, _ in workload])
+        print_report(report, f"{sentences_per_item} sentence(s) per target, {mean_length:.0f} phonemes on average")
+        failed |= any(report[name]['mismatches'] for name in engines if name in EXACT_ENGINES)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
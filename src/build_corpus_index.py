@@ -0,0 +1,73 @@
+import json
+import os
+import sys
+import numpy as np
+import phoneme_inventory as pi
+import text_processing as tp
+import error_detection as ed
+import corpus_index as ci
+
+# compiles res/sentences.json into the memory mapped corpus corpus_index.py reads
+# run again (python src/build_corpus_index.py) after editing the sentences, the g2p/lexicon
+# or the letter alignment, the app ignores a corpus built from other sentences
+
+
+def build(out_path=ci.CORPUS_PATH, sentences_path=ci.SENTENCES_PATH, workers=None):
+    """
+    Convert every sentence and write its phonemes and offsets to one file.
+
+    Args:
+    -----
+        out_path (Path): File to write
+        sentences_path (Path): Sentences file (text_gen format)
+        workers (int): Worker processes for g2p (see text_to_ipa_phonemes)
+
+    Returns:
+    --------
+        int: Number of sentences written
+    """
+    with open(sentences_path, encoding='utf-8') as f:
+        texts = [entry['sentence'] for entry in json.load(f)['data']]
+    sequences = tp.text_to_ipa_phonemes(texts, workers=workers,
+                                        progress=lambda done, total: print(f"{done}/{total}", file=sys.stderr))
+
+    sentence_rows, word_rows, span_rows, phoneme_rows, char_rows = [], [], [], [], []
+    text = bytearray()
+    for sentence, phonemes in zip(texts, sequences):
+        offset_index = ed.build_offset_index(sentence, phonemes)
+        columns = offset_index.columns()
+        text_start = len(text)
+        text += sentence.encode('utf-8')
+        words_start = len(text)
+        text += '\n'.join(offset_index.words).encode('utf-8')
+        spans = columns['word_phoneme_spans']
+        sentence_rows.append((text_start, words_start, words_start, len(text), len(word_rows),
+                              len(offset_index.words), len(span_rows), len(spans), len(phoneme_rows),
+                              len(phonemes), len(char_rows)))
+        word_rows.extend(zip(columns['word_char_starts'].tolist(), columns['word_char_ends'].tolist()))
+        span_rows.extend(map(tuple, spans.tolist()))
+        phoneme_rows.extend(zip(pi.phoneme_ids(phonemes).tolist(), *(columns[name].tolist() for name in
+                                                                    ci.PHONEME_COLUMNS[1:])))
+        char_rows.extend(zip(columns['first_start_from'].tolist(), columns['first_end_from'].tolist()))
+
+    symbols = '\n'.join(pi.PHONEMES).encode('utf-8')
+    tables = [np.array(rows, dtype='<i4').reshape(-1, len(names)) for rows, names in
+              ((sentence_rows, ci.SENTENCE_COLUMNS), (word_rows, ci.WORD_COLUMNS), (span_rows, ci.SPAN_COLUMNS),
+               (phoneme_rows, ci.PHONEME_COLUMNS), (char_rows, ci.CHAR_COLUMNS))]
+    header = ci.HEADER.pack(ci.MAGIC, ci.CORPUS_VERSION, ci.source_digest(sentences_path),
+                            *(len(table) for table in tables), len(text), len(symbols))
+    # written next to the target and moved over it, a running app never maps a half written corpus
+    temp_path = f'{out_path}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(header)
+        for table in tables:
+            f.write(table.tobytes())
+        f.write(text)
+        f.write(symbols)
+    os.replace(temp_path, out_path)
+    return len(sentence_rows)
+
+
+if __name__ == "__main__":
+    count = build(workers=int(sys.argv[1]) if len(sys.argv) > 1 else None)
+    print(f"{count} sentences -> {ci.CORPUS_PATH}")
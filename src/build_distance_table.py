@@ -0,0 +1,69 @@
+import json
+import os
+import sys
+from importlib.metadata import version
+from multiprocessing import Pool
+import numpy as np
+import phoneme_inventory as pi
+import distance_table as dt
+
+# builds the phoneme distance tables distance_table.py memory maps at runtime
+# run again (python src/build_distance_table.py) after adding phonemes to the inventory
+# or upgrading panphon, bump TABLE_VERSION when the file layout changes
+
+
+def feature_row(phoneme):
+    """panphon feature edit distance from one phoneme to every phoneme of the inventory."""
+    dist = dt.panphon_distance()
+    return [dist.feature_edit_distance(phoneme, other) for other in pi.PHONEMES]
+
+
+def segment_row(segment, segments):
+    """panphon weighted feature edit distance from one segment to every segment."""
+    dist = dt.panphon_distance()
+    return [dist.weighted_feature_edit_distance(segment, other) for other in segments]
+
+
+def build(out_dir=dt.RES_DIR, processes=None):
+    """
+    Compute both distance tables for the whole inventory and write them with their manifest.
+
+    Args:
+    -----
+        out_dir (Path): Directory the .npy files and manifest are written to
+        processes (int): Worker processes, every core if None
+
+    Returns:
+    --------
+        dict: The manifest that was written
+    """
+    dist = dt.panphon_distance()
+    phonemes = list(pi.PHONEMES)
+    expansion = [dist.fm.ipa_segs(phoneme) for phoneme in phonemes]
+    segments = list(dict.fromkeys(seg for segs in expansion for seg in segs))
+
+    with Pool(processes or os.cpu_count()) as pool:
+        distances = np.array(pool.map(feature_row, phonemes), dtype=np.float64)
+        substitution = np.array(pool.starmap(segment_row, [(seg, segments) for seg in segments]), dtype=np.float64)
+
+    version_tag = f'v{dt.TABLE_VERSION}'
+    manifest = {
+        'version': dt.TABLE_VERSION,
+        'panphon_version': version('panphon'),
+        'distance_file': f'distance_table_{version_tag}.npy',
+        'segment_file': f'segment_costs_{version_tag}.npy',
+        'phonemes': phonemes,
+        'segments': segments,
+        'expansion': expansion,
+        'segment_deletion': dist.weighted_feature_edit_distance(segments[0], ""),
+    }
+    np.save(out_dir / manifest['distance_file'], distances)
+    np.save(out_dir / manifest['segment_file'], substitution)
+    with open(out_dir / f'distance_table_{version_tag}.json', 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+    return manifest
+
+
+if __name__ == "__main__":
+    manifest = build(processes=int(sys.argv[1]) if len(sys.argv) > 1 else None)
+    print(f"{len(manifest['phonemes'])} phonemes, {len(manifest['segments'])} segments -> {dt.RES_DIR}")
@@ -0,0 +1,178 @@
+import os
+import sys
+from collections import Counter
+from multiprocessing import Pool
+import numpy as np
+import phoneme_inventory as pi
+import lexicon as lx
+import grapheme_alignment as ga
+
+# learns which letters spell every phoneme from the CMU lexicon and writes the
+# letter alignment of every lexicon pronunciation, grapheme_alignment.py reads it at runtime
+# run again (python src/build_grapheme_alignment.py) after changing the lexicon or phoneme mapping
+# NOTE: EM over every way of splitting a word into one chunk of MIN_CHUNK..MAX_CHUNK letters per phoneme,
+#       starting from all splits weighted equally
+
+EM_ITERATIONS = 6
+# chunks less likely than this are dropped from the model
+# (low enough to keep chunks only a word or two spell a phoneme with, like "ough" for /u/ in "through",
+# dropping them in an early iteration forces those words into wrong splits)
+MIN_PROBABILITY = 1e-6
+# words per worker task
+BATCH_SIZE = 2000
+
+
+def expected_counts(entries, probabilities):
+    """
+    E step, expected (phoneme id, chunk) counts over every split of a batch of pronunciations.
+
+    Args:
+    -----
+        entries (list): (word, phoneme ids) pairs
+        probabilities (dict): (phoneme id, chunk) -> probability, None weighs every chunk 1
+
+    Returns:
+    --------
+        Counter: (phoneme id, chunk) -> expected count
+    """
+    counts = Counter()
+    for word, phonemes in entries:
+        m, n = len(phonemes), len(word)
+        if not m * ga.MIN_CHUNK <= n <= m * ga.MAX_CHUNK:
+            continue
+        # chunk probability of phoneme i ending at letter j taking k letters
+        weight = [[[0.0] * (ga.MAX_CHUNK + 1) for _ in range(n + 1)] for _ in range(m)]
+        for i, phoneme in enumerate(phonemes):
+            for j in range(n + 1):
+                for k in range(ga.MIN_CHUNK, min(j, ga.MAX_CHUNK) + 1):
+                    if probabilities is None:
+                        weight[i][j][k] = 1.0
+                    else:
+                        weight[i][j][k] = probabilities.get((phoneme, word[j - k:j]), 0.0)
+        # forward/backward over (phonemes read, letters read)
+        forward = [[0.0] * (n + 1) for _ in range(m + 1)]
+        forward[0][0] = 1.0
+        for i in range(m):
+            for j in range(n + 1):
+                forward[i + 1][j] = sum(forward[i][j - k] * w for k, w in enumerate(weight[i][j]) if w)
+        total = forward[m][n]
+        if total <= 0.0:
+            continue
+        backward = [[0.0] * (n + 1) for _ in range(m + 1)]
+        backward[m][n] = 1.0
+        for i in range(m - 1, -1, -1):
+            for j in range(n + 1):
+                if not forward[i][j]:
+                    continue
+                backward[i][j] = sum(weight[i][j + k][k] * backward[i + 1][j + k]
+                                     for k in range(ga.MIN_CHUNK, min(n - j, ga.MAX_CHUNK) + 1))
+        for i, phoneme in enumerate(phonemes):
+            for j in range(n + 1):
+                after = backward[i + 1][j]
+                if not after:
+                    continue
+                for k, w in enumerate(weight[i][j]):
+                    if w and forward[i][j - k]:
+                        counts[(phoneme, word[j - k:j])] += forward[i][j - k] * w * after / total
+    return counts
+
+
+def normalize(counts):
+    """M step, chunk probabilities of every phoneme from expected counts."""
+    totals = Counter()
+    for (phoneme, _), count in counts.items():
+        totals[phoneme] += count
+    return {key: count / totals[key[0]] for key, count in counts.items()}
+
+
+def lexicon_entries():
+    """(word, phoneme ids) of every lexicon pronunciation, grouped by word in lexicon order."""
+    return [(word, tuple(pi.phoneme_ids(list(variant)).tolist()))
+            for word, variants in lx.get_lexicon().items() for variant in variants]
+
+
+def train(entries, pool, iterations=EM_ITERATIONS):
+    """
+    Learn chunk probabilities of every phoneme with EM.
+
+    Args:
+    -----
+        entries (list): (word, phoneme ids) pairs
+        pool (Pool): Worker pool the E step is spread over
+        iterations (int): EM iterations
+
+    Returns:
+    --------
+        dict: (phoneme id, chunk) -> probability
+    """
+    batches = [entries[k:k + BATCH_SIZE] for k in range(0, len(entries), BATCH_SIZE)]
+    probabilities = None
+    for iteration in range(iterations):
+        counts = Counter()
+        for batch_counts in pool.starmap(expected_counts, [(batch, probabilities) for batch in batches]):
+            counts.update(batch_counts)
+        # dropping unlikely chunks every iteration keeps the table sent to the workers small
+        probabilities = {key: p for key, p in normalize(counts).items() if p >= MIN_PROBABILITY}
+        print(f"iteration {iteration + 1}: {len(probabilities)} chunks", file=sys.stderr)
+    return probabilities
+
+
+def align_batch(entries, log_probabilities):
+    """Letter widths of every phoneme for a batch of pronunciations (see grapheme_alignment.viterbi_widths)."""
+    return [ga.viterbi_widths(word, phonemes, log_probabilities) for word, phonemes in entries]
+
+
+def build(out_path=ga.ALIGNMENT_PATH, processes=None):
+    """
+    Train the chunk model, align every lexicon pronunciation and write them to one .npz file.
+
+    Args:
+    -----
+        out_path (Path): File to write
+        processes (int): Worker processes, every core if None
+
+    Returns:
+    --------
+        int: Number of pronunciations written
+    """
+    entries = lexicon_entries()
+    with Pool(processes or os.cpu_count()) as pool:
+        probabilities = train(entries, pool)
+        log_probabilities = {key: float(np.log(p)) for key, p in probabilities.items()}
+        batches = [entries[k:k + BATCH_SIZE] for k in range(0, len(entries), BATCH_SIZE)]
+        alignments = [widths for batch in pool.starmap(align_batch, [(b, log_probabilities) for b in batches])
+                      for widths in batch]
+
+    words, word_entries = [], [0]
+    entry_starts, phoneme_ids, widths = [0], [], []
+    for (word, phonemes), entry_widths in zip(entries, alignments):
+        if not words or words[-1] != word:
+            words.append(word)
+            word_entries.append(word_entries[-1])
+        word_entries[-1] += 1
+        # pronunciations that cant be split keep an empty width list (lookup misses)
+        entry_widths = entry_widths or []
+        phoneme_ids.extend(phonemes if entry_widths else [])
+        widths.extend(entry_widths)
+        entry_starts.append(len(widths))
+
+    model = sorted(log_probabilities.items())
+    np.savez_compressed(
+        out_path,
+        version=np.array(ga.ALIGNMENT_VERSION),
+        symbols=ga.encode_strings(pi.PHONEMES),
+        words=ga.encode_strings(words),
+        word_entries=np.array(word_entries, dtype=np.int32),
+        entry_starts=np.array(entry_starts, dtype=np.int32),
+        phonemes=np.array(phoneme_ids, dtype=np.uint8),
+        widths=np.array(widths, dtype=np.uint8),
+        model_phonemes=np.array([phoneme for (phoneme, _), _ in model], dtype=np.uint8),
+        model_chunks=ga.encode_strings([chunk for (_, chunk), _ in model]),
+        model_log_probabilities=np.array([p for _, p in model], dtype=np.float32),
+    )
+    return len(entries)
+
+
+if __name__ == "__main__":
+    count = build(processes=int(sys.argv[1]) if len(sys.argv) > 1 else None)
+    print(f"{count} pronunciations -> {ga.ALIGNMENT_PATH}")
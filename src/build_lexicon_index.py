@@ -0,0 +1,57 @@
+import sys
+from array import array
+import phoneme_inventory as pi
+import lexicon as lx
+import lexicon_index as li
+
+# compiles CMU.in.IPA.txt into the memory mapped lexicon lexicon_index.py reads
+# run again (python src/build_lexicon_index.py) after changing the lexicon or phoneme mapping,
+# bump LEXICON_INDEX_VERSION when the file layout changes
+
+
+def build(out_path=li.INDEX_PATH, lexicon_path=lx.LEXICON_PATH):
+    """
+    Write every word of the lexicon with its pronunciations (stress removed, inventory ids).
+
+    Args:
+    -----
+        out_path (Path): File to write
+        lexicon_path (Path): Lexicon text file
+
+    Returns:
+    --------
+        int: Number of words written
+    """
+    lexicon = lx.read_lexicon(lexicon_path)
+    # binary search compares utf-8 bytes, so sort by them
+    words = sorted(lexicon, key=lambda word: word.encode('utf-8'))
+
+    word_offsets, word_variants = array('I', [0]), array('I', [0])
+    variant_starts, phonemes = array('I', [0]), array('B')
+    word_bytes = bytearray()
+    for word in words:
+        word_bytes += word.encode('utf-8')
+        word_offsets.append(len(word_bytes))
+        for variant in lexicon[word]:
+            phonemes.extend(pi.phoneme_ids(list(variant)).tolist())
+            variant_starts.append(len(phonemes))
+        word_variants.append(len(variant_starts) - 1)
+
+    symbols = '\n'.join(pi.PHONEMES).encode('utf-8')
+    header = li.HEADER.pack(li.MAGIC, li.LEXICON_INDEX_VERSION, len(words), len(variant_starts) - 1,
+                            len(phonemes), len(word_bytes), len(symbols))
+    with open(out_path, 'wb') as f:
+        f.write(header)
+        for section in (word_offsets, word_variants, variant_starts):
+            if sys.byteorder != 'little':
+                section.byteswap()
+            f.write(section.tobytes())
+        f.write(phonemes.tobytes())
+        f.write(word_bytes)
+        f.write(symbols)
+    return len(words)
+
+
+if __name__ == "__main__":
+    count = build()
+    print(f"{count} words -> {li.INDEX_PATH}")
@@ -0,0 +1,61 @@
+import sys
+from array import array
+from collections import defaultdict
+import lexicon_index as li
+import minimal_pairs as mp
+
+# compiles the lexicon index into the minimal pair file minimal_pairs.py reads
+# run again (python src/build_minimal_pairs.py) after rebuilding the lexicon index,
+# bump MINIMAL_PAIRS_VERSION when the file layout changes
+
+
+def build(out_path=mp.PAIRS_PATH, lexicon_path=li.INDEX_PATH):
+    """
+    Write every key two or more lexicon words share, with those words and their phoneme at the wildcard.
+
+    Args:
+    -----
+        out_path (Path): File to write
+        lexicon_path (Path): Compiled lexicon index
+
+    Returns:
+    --------
+        int: Number of keys written
+    """
+    lexicon = li.LexiconIndex(lexicon_path)
+    groups = defaultdict(set)
+    for word in range(len(lexicon)):
+        for ids in lexicon.variant_ids(word):
+            ids = bytes(ids)
+            for k, key in enumerate(mp.neighbour_keys(ids)):
+                groups[key].add((word, ids[k]))
+    # a key only one word has gives no pair
+    keys = sorted(key for key, members in groups.items() if len({word for word, _ in members}) > 1)
+
+    key_offsets, member_starts = array('I', [0]), array('I', [0])
+    member_words, member_phonemes = array('I'), array('B')
+    key_bytes = bytearray()
+    for key in keys:
+        key_bytes += key
+        key_offsets.append(len(key_bytes))
+        for word, phoneme in sorted(groups[key]):
+            member_words.append(word)
+            member_phonemes.append(phoneme)
+        member_starts.append(len(member_words))
+
+    header = mp.HEADER.pack(mp.MAGIC, mp.MINIMAL_PAIRS_VERSION, *mp.lexicon_sizes(lexicon),
+                            len(keys), len(member_words), len(key_bytes))
+    with open(out_path, 'wb') as f:
+        f.write(header)
+        for section in (key_offsets, member_starts, member_words):
+            if sys.byteorder != 'little':
+                section.byteswap()
+            f.write(section.tobytes())
+        f.write(member_phonemes.tobytes())
+        f.write(key_bytes)
+    return len(keys)
+
+
+if __name__ == "__main__":
+    count = build()
+    print(f"{count} keys -> {mp.PAIRS_PATH}")
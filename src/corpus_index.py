@@ -0,0 +1,188 @@
+import hashlib
+import mmap
+import os
+import random
+import struct
+import sys
+import threading
+import numpy as np
+import phoneme_inventory as pi
+from distance_table import RES_DIR
+from offset_index import OffsetIndex
+from text_gen import FILE_PATH as SENTENCES_PATH
+
+# this module serves the practice sentences with everything scoring needs already computed
+# (IPA phonemes, word/char spans, phoneme display offsets and words), built by build_corpus_index.py
+# the file is memory mapped on first use, picking a sentence only slices it and grader processes share its pages
+# NOTE: layout is little endian, a header then int32 tables (rows x columns)
+#       sentences x 11, words x 2, phoneme words x 2, phonemes x 6, chars x 2,
+#       then utf-8 text (sentences and their newline separated words) and the phoneme symbols
+
+CORPUS_VERSION = 1
+CORPUS_PATH = RES_DIR / f'corpus_v{CORPUS_VERSION}.bin'
+# magic, version, sha1 of sentences.json, sentences, words, phoneme words, phonemes, chars,
+# text bytes, symbol bytes
+HEADER = struct.Struct('<4sI20sIIIIIII')
+MAGIC = b'CRP1'
+# byte range of the text and of the words in the text blob, then first row and row count in the
+# word, phoneme word and phoneme tables and first row in the char table
+# (g2p can split a text into more or fewer phoneme words than words)
+SENTENCE_COLUMNS = ('text_start', 'text_end', 'words_start', 'words_end', 'word_start', 'word_count',
+                    'span_start', 'span_count', 'phoneme_start', 'phoneme_count', 'char_start')
+WORD_COLUMNS = ('word_char_starts', 'word_char_ends')
+SPAN_COLUMNS = ('phoneme_span_start', 'phoneme_span_stop')
+PHONEME_COLUMNS = ('phoneme_ids', 'phoneme_to_word', 'char_widths', 'word_offsets', 'display_starts', 'display_ends')
+CHAR_COLUMNS = ('first_start_from', 'first_end_from')
+
+_lock = threading.Lock()
+_corpus = None
+# file_stamps() of the last load that failed, retried only once a file changes
+_failed_stamps = None
+
+
+def source_digest(path=SENTENCES_PATH):
+    """sha1 of the sentences file, a corpus built from other sentences is ignored."""
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).digest()
+
+
+def file_stamps(path=CORPUS_PATH, sentences_path=SENTENCES_PATH):
+    """Modification times of the corpus and sentences files (None for a missing one)."""
+    stamps = []
+    for file in (path, sentences_path):
+        try:
+            stamps.append(os.stat(file).st_mtime_ns)
+        except OSError:
+            stamps.append(None)
+    return tuple(stamps)
+
+
+class CorpusIndex:
+    """
+    Read only view of a compiled practice corpus.
+
+    Attributes:
+    -----------
+        symbols (list): Phoneme symbols the stored ids refer to
+    """
+
+    def __init__(self, path=CORPUS_PATH):
+        """
+        Args:
+        -----
+            path (Path): Compiled corpus file
+        """
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (self.magic, self.version, self.digest, sentences, words, spans, phonemes,
+         chars, text_bytes, symbol_bytes) = HEADER.unpack_from(self._map)
+        offset = HEADER.size
+
+        def table(rows, columns):
+            nonlocal offset
+            array = np.frombuffer(self._map, dtype='<i4', count=rows * columns, offset=offset).reshape(rows, columns)
+            offset += array.nbytes
+            return array
+
+        self._sentences = table(sentences, len(SENTENCE_COLUMNS))
+        self._words = table(words, len(WORD_COLUMNS))
+        self._spans = table(spans, len(SPAN_COLUMNS))
+        self._phonemes = table(phonemes, len(PHONEME_COLUMNS))
+        self._chars = table(chars, len(CHAR_COLUMNS))
+        self._text_start = offset
+        offset += text_bytes
+        self.symbols = self._map[offset:offset + symbol_bytes].decode('utf-8').split('\n')
+
+    def valid(self, digest=None):
+        """
+        True if the file is a corpus of this version built from the current sentences.
+
+        Args:
+        -----
+            digest (bytes): source_digest() of the sentences (read if None)
+        """
+        # the tables are read in native order
+        return (self.magic == MAGIC and self.version == CORPUS_VERSION and sys.byteorder == 'little'
+                and self.digest == (digest or source_digest()))
+
+    def __len__(self):
+        return len(self._sentences)
+
+    def _text(self, start, end):
+        return self._map[self._text_start + start:self._text_start + end].decode('utf-8')
+
+    def sentence(self, k):
+        """Text of sentence k."""
+        row = self._sentences[k]
+        return self._text(row[0], row[1])
+
+    def entry(self, k):
+        """
+        Sentence k with its precomputed phonemes and offsets.
+
+        Args:
+        -----
+            k (int): Sentence number
+
+        Returns:
+        --------
+            tuple: (text, PhonemeSequence, OffsetIndex), same as text_to_ipa_phoneme and build_offset_index
+        """
+        (text_start, text_end, words_start, words_end, word_start, word_count,
+         span_start, span_count, phoneme_start, phoneme_count, char_start) = self._sentences[k].tolist()
+        text = self._text(text_start, text_end)
+        words = self._text(words_start, words_end).split('\n') if word_count else []
+        word_rows = self._words[word_start:word_start + word_count]
+        span_rows = self._spans[span_start:span_start + span_count]
+        phoneme_rows = self._phonemes[phoneme_start:phoneme_start + phoneme_count]
+        # click lookup covers every character position plus two
+        char_rows = self._chars[char_start:char_start + len(text) + 2]
+
+        symbols = self.symbols
+        phonemes = pi.PhonemeSequence.from_phonemes([symbols[i] for i in phoneme_rows[:, 0].tolist()])
+        columns = {
+            'word_char_starts': word_rows[:, 0],
+            'word_char_ends': word_rows[:, 1],
+            'word_phoneme_spans': span_rows,
+            'phoneme_to_word': phoneme_rows[:, 1],
+            'char_widths': phoneme_rows[:, 2],
+            'word_offsets': phoneme_rows[:, 3],
+            'display_starts': phoneme_rows[:, 4],
+            'display_ends': phoneme_rows[:, 5],
+            'first_start_from': char_rows[:, 0],
+            'first_end_from': char_rows[:, 1],
+        }
+        return text, phonemes, OffsetIndex.from_columns(words, columns)
+
+    def random_entry(self):
+        """entry() of a random sentence (like text_gen.gen_random_text)."""
+        return self.entry(random.randrange(len(self)))
+
+
+def load_corpus():
+    """
+    The compiled corpus, mapped on first use.
+
+    Returns:
+    --------
+        CorpusIndex: The corpus, None if it is missing, from another version or out of date
+    """
+    global _corpus, _failed_stamps
+    if _corpus is None:
+        # a failed load is only retried after the corpus is rebuilt or the sentences change,
+        # not on every new phrase (checking the sentences hashes the whole file)
+        stamps = file_stamps()
+        if stamps == _failed_stamps:
+            return None
+        with _lock:
+            if _corpus is None:
+                try:
+                    corpus = CorpusIndex()
+                    valid = corpus.valid()
+                except (FileNotFoundError, ValueError, struct.error):
+                    valid = False
+                if not valid:
+                    _failed_stamps = stamps
+                    return None
+                _corpus = corpus
+    return _corpus
@@ -0,0 +1,233 @@
+import json
+import threading
+from pathlib import Path
+import numpy as np
+import phoneme_inventory as pi
+from text_processing import ARPA_TO_IPA
+
+# this module serves panphon feature distances between phonemes at runtime
+# the tables are built offline by build_distance_table.py and memory mapped on first use,
+# so importing is instant and every process shares the same pages of the file
+# NOTE: symbols the table doesnt cover are computed with panphon once and cached here
+
+TABLE_VERSION = 1
+# confusable phonemes kept per phoneme (see confusable_ids)
+CONFUSABLE_K = 5
+RES_DIR = Path(__file__).resolve().parent.parent / 'res'
+MANIFEST_PATH = RES_DIR / f'distance_table_v{TABLE_VERSION}.json'
+
+# reentrant, the table loaders create the shared Distance while holding it
+_lock = threading.RLock()
+_distance = None
+_manifest = None
+_cost_matrix = None
+_weighted_costs = None
+_confusable = None
+
+
+def panphon_distance():
+    """
+    One shared panphon Distance, created on first use.
+
+    Loading panphon's feature tables is the slow part of a Distance,
+    so everything in the process reuses this one.
+
+    Returns:
+    --------
+        panphon.distance.Distance: Shared distance object
+    """
+    global _distance
+    if _distance is None:
+        with _lock:
+            if _distance is None:
+                import panphon.featuretable
+                from panphon.distance import Distance
+                # magic to default panphon to utf-8 encoding
+                # else it wont work on windows
+                panphon.featuretable.open = lambda fn, *args, **kwargs: open(fn, *args, encoding='utf-8', **kwargs)
+                _distance = Distance()
+    return _distance
+
+
+def load_manifest():
+    """
+    Manifest of the prebuilt tables, None if they are missing or from another version.
+
+    Returns:
+    --------
+        dict: version, panphon version, phonemes, segments, expansion, deletion and file names
+    """
+    global _manifest
+    if _manifest is None:
+        try:
+            with open(MANIFEST_PATH, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            return None
+        if manifest.get('version') != TABLE_VERSION:
+            return None
+        _manifest = manifest
+    return _manifest
+
+
+def extend_table(table, table_ids, symbols, distance):
+    """
+    Grow a square distance table to cover more symbols.
+
+    Args:
+    -----
+        table (np.ndarray): K x K distances between known symbols (may be memory mapped)
+        table_ids (np.ndarray): Index in symbols of every row of table
+        symbols (list): All symbols
+        distance (callable): distance(a, b) for two symbols
+
+    Returns:
+    --------
+        np.ndarray: N x N float64 distances, table itself if it already covers every symbol in order
+    """
+    size = len(symbols)
+    if len(table) == size and np.array_equal(table_ids, np.arange(size)):
+        return table
+    extended = np.empty((size, size), dtype=np.float64)
+    extended[np.ix_(table_ids, table_ids)] = table
+    known = np.zeros(size, dtype=bool)
+    known[table_ids] = True
+    for i in np.flatnonzero(~known).tolist():
+        for j in range(size):
+            extended[i, j] = distance(symbols[i], symbols[j])
+            extended[j, i] = distance(symbols[j], symbols[i])
+    return extended
+
+
+def cost_matrix():
+    """
+    panphon feature edit distance between every pair of phoneme ids.
+
+    The first call memory maps the prebuilt table, later calls only
+    compute rows for phonemes interned since then.
+
+    Returns:
+    --------
+        np.ndarray: N x N float64 matrix (read only), cost[a, b] is the distance between ids a and b
+    """
+    global _cost_matrix
+    table = _cost_matrix
+    if table is not None and len(table) == len(pi.PHONEMES):
+        return table
+    with _lock:
+        table, table_ids = _cost_matrix, np.arange(0 if _cost_matrix is None else len(_cost_matrix))
+        if table is None:
+            table = np.zeros((0, 0), dtype=np.float64)
+            manifest = load_manifest()
+            if manifest is not None:
+                table = np.load(RES_DIR / manifest['distance_file'], mmap_mode='r')
+                # ids only differ from the file order if symbols were interned before the table loaded
+                table_ids = np.array([pi.intern(p) for p in manifest['phonemes']], dtype=np.intp)
+        if len(table) != len(pi.PHONEMES) or not np.array_equal(table_ids, np.arange(len(table))):
+            # NOTE: kept float64, float32 rounding flips ties between equally good
+            #       alignments so grades would no longer match panphon exactly
+            table = extend_table(table, table_ids, pi.PHONEMES, panphon_distance().feature_edit_distance)
+            table.flags.writeable = False
+        _cost_matrix = table
+    return table
+
+
+def weighted_costs():
+    """
+    panphon's weighted feature edit costs between single segments, loaded on first use.
+
+    panphon measures distance over segments, not phonemes (e.g., 'aɪ' is two
+    segments, spaces and symbols it doesnt know are none), so every phoneme id
+    also gets the segment ids it expands to.
+
+    Returns:
+    --------
+        tuple: (S x S substitution cost, insertion/deletion cost of one segment,
+                N x 2 segment ids per phoneme id padded with -1)
+    """
+    global _weighted_costs
+    costs = _weighted_costs
+    if costs is not None and len(costs[2]) == len(pi.PHONEMES):
+        return costs[:3]
+    with _lock:
+        if _weighted_costs is None:
+            manifest = load_manifest()
+            if manifest is not None:
+                substitution = np.load(RES_DIR / manifest['segment_file'], mmap_mode='r')
+                segments = list(manifest['segments'])
+                deletion = manifest['segment_deletion']
+                phoneme_segments = {p: segs for p, segs in zip(manifest['phonemes'], manifest['expansion'])}
+            else:
+                substitution, segments, deletion, phoneme_segments = np.zeros((0, 0)), [], None, {}
+        else:
+            substitution, segments, deletion, phoneme_segments = _weighted_costs[3]
+
+        dist = None
+        expanded = []
+        for phoneme in pi.PHONEMES:
+            if phoneme not in phoneme_segments:
+                dist = dist or panphon_distance()
+                phoneme_segments[phoneme] = dist.fm.ipa_segs(phoneme)
+            expanded.append(phoneme_segments[phoneme])
+        known_segments = len(segments)
+        segments += [seg for seg in dict.fromkeys(seg for segs in expanded for seg in segs) if seg not in segments]
+        if len(segments) != known_segments:
+            dist = dist or panphon_distance()
+            substitution = extend_table(substitution, np.arange(known_segments), segments,
+                                        dist.weighted_feature_edit_distance)
+            substitution.flags.writeable = False
+        if deletion is None and segments:
+            deletion = panphon_distance().weighted_feature_edit_distance(segments[0], "")
+        segment_ids = {seg: i for i, seg in enumerate(segments)}
+        expansion = np.full((len(expanded), max(2, max(map(len, expanded)))), -1, dtype=np.intp)
+        for phoneme_id, segs in enumerate(expanded):
+            expansion[phoneme_id, :len(segs)] = [segment_ids[seg] for seg in segs]
+        # last item keeps what the next extension starts from
+        _weighted_costs = substitution, deletion, expansion, (substitution, segments, deletion, phoneme_segments)
+    return _weighted_costs[:3]
+
+
+def confusable_ids():
+    """
+    Nearest phonemes of every phoneme id by feature distance (a kNN over panphon's
+    feature vectors), built once from cost_matrix so a lookup is one array row.
+
+    Only phonemes the recognizer can output are neighbours (not spaces or extra symbols).
+
+    Returns:
+    --------
+        np.ndarray: N x CONFUSABLE_K phoneme ids, nearest first (ties keep inventory order)
+    """
+    global _confusable
+    table = _confusable
+    if table is not None and len(table) == len(pi.PHONEMES):
+        return table
+    with _lock:
+        cost = cost_matrix()
+        # ids 1.. are ARPA_TO_IPA's symbols, what the recognizer can output
+        candidates = pi.phoneme_ids(list(dict.fromkeys(ARPA_TO_IPA.values())))
+        distances = np.array(cost[:, candidates])
+        # a phoneme is not its own confusion
+        distances[candidates, np.arange(len(candidates))] = np.inf
+        order = np.argsort(distances, axis=1, kind='stable')[:, :CONFUSABLE_K]
+        table = candidates[order]
+        table.flags.writeable = False
+        _confusable = table
+    return table
+
+
+def confusable_phonemes(phoneme, k=CONFUSABLE_K):
+    """
+    Phonemes most easily confused with a phoneme.
+
+    Args:
+    -----
+        phoneme (str or int): IPA phoneme or phoneme id
+        k (int): Number of phonemes (at most CONFUSABLE_K)
+
+    Returns:
+    --------
+        list: IPA phonemes, most similar first
+    """
+    phoneme_id = phoneme if isinstance(phoneme, (int, np.integer)) else pi.intern(phoneme)
+    return [pi.PHONEMES[i] for i in confusable_ids()[phoneme_id, :k].tolist()]
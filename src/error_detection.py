@@ -1,16 +1,28 @@
 import numpy as np
-import pickle
-from panphon.distance import Distance
-import panphon.featuretable
-import re
-# magic to default panphon to utf-8 encoding
-# else it wont work on windows
-panphon.featuretable.open = lambda fn, *args, **kwargs: open(fn, *args, encoding='utf-8', **kwargs)
+import os
+from concurrent.futures import ProcessPoolExecutor
+import phoneme_inventory as pi
+import distance_table as dt
+from score_cache import ScoreCache
+from offset_index import OffsetIndex
+import grapheme_alignment as ga
+from alignment_trace import AlignmentTrace
+from score_result import ScoreResult
 # threshold which phonemes are considered slightly mispronounced
 COST_THRESHOLD = 0.09
+# narrowest band banded alignment fills, it is widened to hold every path
+# that could score as well as a straight one (see banded_alignment)
+MIN_BAND = 4
+# rough number of padded cells aligned together in one batch
+BATCH_CELLS = 2_000_000
+# full matrices bigger than this (about 36 MB of scores and traceback) are aligned block by block
+# when that peaks lower (see low_memory_block), each block about LOW_MEMORY_BLOCK_CELLS cells
+# (or sqrt(m) target phonemes if that is more)
+LOW_MEMORY_CELLS = 4_000_000
+LOW_MEMORY_BLOCK_CELLS = 1_000_000
 
-with open('res/dist_matrix.pkl', 'rb') as f:
-    dist_matrix = pickle.load(f)
+# repeated grades (retries, regrades, identical transcripts) are served from here
+score_cache = ScoreCache(max_entries=1024, max_bytes=64 * 1024 * 1024)
 
 IPA_MAPPINGS = {
    # consonants
@@ -25,377 +37,533 @@ IPA_MAPPINGS = {
     'i': 1, 'oʊ': 2, 'ɔɪ': 2, 'ʊ': 1, 'u': 1
 }
 
-def needleman_wunsch_with_debug(target_phonemes, user_phonemes, 
-                               match_reward=3, gap_penalty=-2, 
-                               word_boundary_penalty=-2):
+def build_offset_index(target_phrase, target_phonemes):
     """
-    Needleman-Wunsch with special handling for word boundaries (spaces)
-    with DEBUGGING. Change word_boundary to gap_penalty for no change
+    Build the word/phoneme/character offsets of a target phrase (see OffsetIndex).
     
     Args:
-        target_phonemes: List of target phonemes (including spaces)
-        user_phonemes: List of user phonemes (including spaces)
-        match_reward: Score for perfect matches
-        gap_penalty: Standard gap penalty
-        word_boundary_penalty: Higher penalty for gaps at word boundaries
-    """
-
-    # NOTE: this uses word_boundary penalty and will
-    #      probably be deprecated as it doesn't really work
-    #
-    print("\n========== STARTING NEEDLEMAN-WUNSCH ALIGNMENT ==========")
-    print(f"TARGET: {target_phonemes}")
-    print(f"USER: {user_phonemes}")
-    print(f"Parameters: match_reward={match_reward}, gap_penalty={gap_penalty}, word_boundary_penalty={word_boundary_penalty}")
-    
-    dist = Distance()
-    m, n = len(target_phonemes), len(user_phonemes)
-    
-    score = np.zeros((m+1, n+1), dtype=float)
-    
-    traceback = np.zeros((m+1, n+1), dtype=int)
-    # 0: diagonal, 1: up (deletion), 2: left (insertion)
-    
-    #print("\n--- INITIALIZING MATRICES ---")
-    for i in range(1, m+1):
-        penalty = word_boundary_penalty if target_phonemes[i-1] == ' ' else gap_penalty
-        score[i, 0] = score[i-1, 0] + penalty
-        traceback[i, 0] = 1
-       # print(f"Row {i} ('{target_phonemes[i-1]}'): score={score[i, 0]}, traceback={traceback[i, 0]}")
-    
-    for j in range(1, n+1):
-        penalty = word_boundary_penalty if user_phonemes[j-1] == ' ' else gap_penalty
-        score[0, j] = score[0, j-1] + penalty
-        traceback[0, j] = 2
-      #  print(f"Col {j} ('{user_phonemes[j-1]}'): score={score[0, j]}, traceback={traceback[0, j]}")
-    
-   # print("\n--- INITIAL MATRIX ---")
-   # print_matrix(score, target_phonemes, user_phonemes)
-    
-   # print("\n--- FILLING MATRICES ---")
-    for i in range(1, m+1):
-        for j in range(1, n+1):
-            target_is_space = target_phonemes[i-1] == ' '
-            user_is_space = user_phonemes[j-1] == ' '
-            #print(f"\nProcessing cell [{i},{j}]: Target '{target_phonemes[i-1]}', User '{user_phonemes[j-1]}'")
-            # MISMATCH/MATCH
-            if target_is_space and user_is_space:
-                # space-to-space is a perfect match
-                diag_score = score[i-1, j-1] + match_reward
-               # print(f"  Both spaces: diag_score = {score[i-1, j-1]} + {match_reward} = {diag_score}")
-            elif not target_is_space and not user_is_space:
-                # Regular phoneme comparison using feature distance
-                feature_dist = dist.feature_edit_distance(target_phonemes[i-1], user_phonemes[j-1])
-                similarity = (1 - feature_dist) * match_reward
-                diag_score = score[i-1, j-1] + similarity
-               # print(f"  Phoneme comparison: feature_dist={feature_dist}, similarity={similarity}")
-               # print(f"  diag_score = {score[i-1, j-1]} + {similarity} = {diag_score}")
-            else:
-                # space-to-phoneme mismatch is penalized
-                diag_score = score[i-1, j-1] + word_boundary_penalty
-                #print(f"  Space-phoneme mismatch: diag_score = {score[i-1, j-1]} + {word_boundary_penalty} = {diag_score}")
-            
-            # Calculate up and left scores (gaps)
-            # Use special penalty if the current position is a space
-            up_penalty = word_boundary_penalty if target_is_space else gap_penalty
-            left_penalty = word_boundary_penalty if user_is_space else gap_penalty
-            
-            up_score = score[i-1, j] + up_penalty
-            left_score = score[i, j-1] + left_penalty
-            
-           # print(f"  up_score = {score[i-1, j]} + {up_penalty} = {up_score}")
-            #print(f"  left_score = {score[i, j-1]} + {left_penalty} = {left_score}")
-            
-            # Choose the best move
-            best_scores = [diag_score, up_score, left_score]
-            best_move = np.argmax(best_scores)
-            
-            # Update matrices
-            score[i, j] = best_scores[best_move]
-            traceback[i, j] = best_move
-            
-            move_names = ["diagonal", "up", "left"]
-            #print(f"  Best move: {move_names[best_move]} with score {score[i, j]}")
-    
+    -----
+        target_phrase (str): Original text phrase (e.g., "the cat")
+        target_phonemes (list): List of target IPA phonemes with spaces (or array of phoneme ids)
+        
+    Returns:
+    --------
+        OffsetIndex: Offsets, pass it to get_pronunciation_score for every attempt at the phrase
+    """
+    return OffsetIndex(target_phrase, pi.PhonemeSequence.from_phonemes(target_phonemes), IPA_MAPPINGS,
+                       ga.letter_widths)
 
-    print("\n--- FINAL SCORE MATRIX ---")
-    print_matrix(score, target_phonemes, user_phonemes)
-    
-    print("\n--- FINAL TRACEBACK MATRIX ---")
-    print_traceback_matrix(traceback, target_phonemes, user_phonemes)
-    
-    #print("\n--- TRACEBACK ALIGNMENT ---")
-    mispronounced_indices = {}
-    i, j = m, n
-    target_idx = m - 1
+def fill_alignment(similarity, target_ids, user_ids, gap_penalty, lo, hi, first_column=None, first_row=None):
+    """
+    Fill the Needleman-Wunsch score/traceback matrices one anti-diagonal at a time.
     
-    # Define constants
-    COST_THRESHOLD = 0.09
+    Cells on an anti-diagonal only depend on the two previous ones, so each
+    diagonal is a handful of numpy ops instead of a python loop over cells.
+    Only cells with lo <= j - i <= hi are stored (the full matrix is lo=-m, hi=n).
+    Row i of the band lives at flat[i*width + (j - i - lo + 1)], with a -inf sentinel
+    column on either side, which makes every anti-diagonal and all three
+    neighbours plain strided slices of the flat arrays.
+    Ids can carry leading batch dimensions (e.g., B x m and B x n padded pairs),
+    every pair in the batch is then filled by the same diagonal slices.
     
-    alignment_target = []
-    alignment_user = []
-    alignment_status = []
+    Args:
+    -----
+        similarity (np.ndarray): Diagonal move score between phoneme ids
+        target_ids (np.ndarray): Target phoneme ids (..., m)
+        user_ids (np.ndarray): User phoneme ids (..., n)
+        gap_penalty (float or tuple): Standard gap penalty, or (target_gaps, user_gaps)
+                                      arrays shaped like the ids for a penalty per phoneme
+        lo (int): Lowest j - i offset kept
+        hi (int): Highest j - i offset kept
+        first_column (np.ndarray): Scores of column 0 (..., m + 1) to continue an alignment
+                                   after earlier user phonemes (None starts a new one)
+        first_row (np.ndarray): Scores of row 0 (..., n + 1) to continue an alignment
+                                after earlier target phonemes (None starts a new one)
+        
+    Returns:
+    --------
+        tuple: (flat float64 scores, flat uint8 traceback, row width)
+                traceback codes are 0: diagonal, 1: up (deletion), 2: left (insertion)
+    """
+    m, n = target_ids.shape[-1], user_ids.shape[-1]
+    width = hi - lo + 3
+    step = width - 2
+    score = np.full(target_ids.shape[:-1] + ((m + 1) * width,), -np.inf)
+    traceback = np.zeros(score.shape, dtype=np.uint8)
+    if isinstance(gap_penalty, tuple):
+        target_gaps, user_gaps = gap_penalty
+    else:
+        target_gaps = np.full(target_ids.shape, float(gap_penalty))
+        user_gaps = np.full(user_ids.shape, float(gap_penalty))
+
+    # init first row/col, cumsum adds the gaps in the same order as a running total
+    row_end = min(n, hi)
+    col_end = min(m, -lo)
+    if first_column is not None:
+        first_row = np.cumsum(np.concatenate((first_column[..., :1], user_gaps[..., :row_end]), axis=-1), axis=-1)
+    elif first_row is not None:
+        first_column = np.cumsum(np.concatenate((first_row[..., :1], target_gaps[..., :col_end]), axis=-1), axis=-1)
+    else:
+        zeros = np.zeros(target_ids.shape[:-1] + (1,))
+        first_row = np.concatenate((zeros, np.cumsum(user_gaps[..., :row_end], axis=-1)), axis=-1)
+        first_column = np.concatenate((zeros, np.cumsum(target_gaps[..., :col_end], axis=-1)), axis=-1)
+    score[..., 1 - lo:row_end + 2 - lo] = first_row[..., :row_end + 1]
+    traceback[..., 2 - lo:row_end + 2 - lo] = 2
+    score[..., 1 - lo:col_end * (width - 1) + 2 - lo:width - 1] = first_column[..., :col_end + 1]
+    traceback[..., width - lo:col_end * (width - 1) + 2 - lo:width - 1] = 1
+
+    for d in range(2, m + n + 1):
+        i_start = max(1, d - n, (d - hi + 1) // 2)
+        i_stop = min(m, d - 1, (d - lo) // 2)
+        if i_start > i_stop:
+            continue
+        first = i_start * step + d - lo + 1
+        cells = slice(first, i_stop * step + d - lo + 2, step)
+        # cell (i, j) compares target[i-1] with user[j-1], j = d - i runs backwards
+        sub = similarity[target_ids[..., i_start - 1:i_stop], user_ids[..., d - i_stop - 1:d - i_start][..., ::-1]]
+        diag = score[..., first - width:first - width + (i_stop - i_start) * step + 1:step] + sub
+        up = score[..., first - width + 1:first - width + (i_stop - i_start) * step + 2:step] + target_gaps[..., i_start - 1:i_stop]
+        left = score[..., first - 1:first + (i_stop - i_start) * step:step] + user_gaps[..., d - i_stop - 1:d - i_start][..., ::-1]
+        # same tie breaking as np.argmax([diag, up, left]), first best move wins
+        move = (up > diag).view(np.uint8)
+        best = np.maximum(diag, up)
+        move[left > best] = 2
+        score[..., cells] = np.maximum(best, left)
+        traceback[..., cells] = move
+
+    return score, traceback, width
+
+def band_offsets(m, n, band):
+    """
+    Lowest and highest j - i offset kept by a band around the diagonals of (0, 0) and (m, n).
     
-    while i > 0 or j > 0:
-        #print(f"At position [{i},{j}], target_idx={target_idx}")
+    Args:
+    -----
+        m (int): Number of target phonemes
+        n (int): Number of user phonemes
+        band (int): Number of cells kept on either side of the diagonals
         
-        if i > 0 and j > 0 and traceback[i, j] == 0:  # diagonal (match or substitution)
-            #print(f"  Diagonal move: comparing '{target_phonemes[i-1]}' and '{user_phonemes[j-1]}'")
-            
-            if not (target_phonemes[i-1] == ' ' and user_phonemes[j-1] == ' '):
-                if target_phonemes[i-1] != ' ' and user_phonemes[j-1] != ' ':
-                    feature_dist = dist.feature_edit_distance(target_phonemes[i-1], user_phonemes[j-1])
-                   # print(f"  Feature distance: {feature_dist}")
-                    
-                    if feature_dist > 0:  # substitution error
-                        severity = 'partial' if feature_dist <= COST_THRESHOLD else 'incorrect'
-                        mispronounced_indices[target_idx] = severity
-                       # print(f"  Marked as {severity} at index {target_idx}")
-                        alignment_status.append(severity)
-                    else:
-                        alignment_status.append("correct")
-                elif target_phonemes[i-1] != user_phonemes[j-1]:  # one is space, one is not
-                    mispronounced_indices[target_idx] = "incorrect"
-                   # print(f"  Space mismatch: marked as incorrect at index {target_idx}")
-                    alignment_status.append("incorrect")
-                else:
-                    alignment_status.append("correct")
-            else:
-                alignment_status.append("space")
-                
-            alignment_target.append(target_phonemes[i-1])
-            alignment_user.append(user_phonemes[j-1])
-            
-            i -= 1
-            j -= 1
-            target_idx -= 1
-            
-        elif i > 0 and traceback[i, j] == 1:  # up (deletion)
-           #print(f"  Up move (deletion): '{target_phonemes[i-1]}' is missing in user input")
-            # missing phoneme in user pronunciation
-            if target_phonemes[i-1] != ' ': 
-                mispronounced_indices[target_idx] = "incorrect"
-                #print(f"  Marked as incorrect at index {target_idx}")
-                alignment_status.append("deletion")
-            else:
-                alignment_status.append("space")
-                
-            alignment_target.append(target_phonemes[i-1])
-            alignment_user.append("-")
-            
-            i -= 1
-            target_idx -= 1
-            
-        else:  # left (insertion)
-            #print(f"  Left move (insertion): '{user_phonemes[j-1]}' is extra in user input")
+    Returns:
+    --------
+        tuple: (lo, hi) clipped to the matrix
+    """
+    return max(min(0, n - m) - band, -m), min(max(0, n - m) + band, n)
 
-            if target_idx >= 0 and target_idx < len(target_phonemes) and target_phonemes[target_idx] != ' ':
-                mispronounced_indices[target_idx] = "incorrect"
-                #print(f"  Marked current index {target_idx} as incorrect")
-            
-            if target_idx + 1 < len(target_phonemes) and target_phonemes[target_idx + 1] != ' ':
-                mispronounced_indices[target_idx + 1] = "incorrect"
-                #print(f"  Marked next index {target_idx + 1} as incorrect")
-                
-            alignment_target.append("-")
-            alignment_user.append(user_phonemes[j-1])
-            alignment_status.append("insertion")
-            
-            j -= 1
+def gap_band(m, n, gaps):
+    """
+    Narrowest band (see band_offsets) holding every path from (0, 0) to (m, n) with at most gaps gaps.
     
-    alignment_target.reverse()
-    alignment_user.reverse()
-    alignment_status.reverse()
+    A path reaching offset d = j - i needs |d| + |n - m - d| gaps, so every band
+    cell it leaves costs two more than the |n - m| any path needs.
     
-    print("\n--- FINAL ALIGNMENT ---")
-    print("Target: ", " ".join(alignment_target))
-    print("User:   ", " ".join(alignment_user))
-    print("Status: ", " ".join(alignment_status))
+    Args:
+    -----
+        m (int): Number of target phonemes
+        n (int): Number of user phonemes
+        gaps (float): Most gaps a path may have
+        
+    Returns:
+    --------
+        int: Band
+    """
+    # slack for float rounding in the scores gaps was worked out from
+    return max(int(np.floor((gaps + 1e-6 - abs(n - m)) / 2)), 0)
+
+def straight_path_score(similarity, target_ids, user_ids, gap_penalty):
+    """
+    Score of the better of the two straight paths (every gap at the start or every gap at the end).
     
-    matched_count = sum(1 for i in range(len(target_phonemes)) 
-                       if target_phonemes[i] != ' ' and i not in mispronounced_indices)
-    total_phonemes = sum(1 for p in target_phonemes if p != ' ')
-    accuracy = (matched_count / total_phonemes) * 100 if total_phonemes > 0 else 100
+    Any path scores at most the best alignment, so this is a lower bound on it
+    that only takes one pass over the shorter sequence.
+    """
+    m, n = len(target_ids), len(user_ids)
+    k = min(m, n)
+    diagonal = max(similarity[target_ids[:k], user_ids[:k]].sum(),
+                   similarity[target_ids[m - k:], user_ids[n - k:]].sum())
+    return diagonal + abs(n - m) * gap_penalty
+
+def banded_alignment(similarity, target_ids, user_ids, gap_penalty, band):
+    """
+    Fill only the cells within a band of the diagonal that holds every best path.
     
-    print(f"\nAccuracy: {accuracy:.2f}% ({matched_count}/{total_phonemes} phonemes correct)")
-    print(f"Mispronounced indices: {mispronounced_indices}")
+    A path with g gaps has (m + n - g) / 2 diagonal steps, so it scores at most
+    (m + n - g) / 2 * similarity.max() + g * gap_penalty. A path scoring at least
+    a straight path (see straight_path_score) therefore has a bounded number of
+    gaps and stays within gap_band of the diagonal, so the band is worked out
+    before filling and one fill gives the same result (ties included) as the
+    full matrix, noisy attempts just get wider bands.
+    The anti-diagonal loop still runs m + n times, banding only shortens every
+    diagonal, so the gain grows with the length of the attempt.
     
-    return mispronounced_indices, accuracy
+    Args:
+    -----
+        similarity (np.ndarray): Diagonal move score between phoneme ids
+        target_ids (np.ndarray): Target phoneme ids
+        user_ids (np.ndarray): User phoneme ids
+        gap_penalty (float): Standard gap penalty
+        band (int): Narrowest number of cells kept on either side of the diagonal (at least MIN_BAND)
+        
+    Returns:
+    --------
+        tuple: (flat scores, flat traceback, row width, lowest j - i offset kept)
+    """
+    m, n = len(target_ids), len(user_ids)
+    best_step = similarity.max()
+    band = max(band, MIN_BAND)
+    if gap_penalty >= best_step / 2:
+        # two gaps score at least as much as the diagonal step they replace, nothing bounds the paths outside
+        band = max(m, n)
+    else:
+        straight = straight_path_score(similarity, target_ids, user_ids, gap_penalty)
+        # most gaps a path can have and still score at least the straight path
+        gaps = ((m + n) * best_step / 2 - straight) / (best_step / 2 - gap_penalty)
+        band = max(band, gap_band(m, n, gaps))
+    lo, hi = band_offsets(m, n, band)
+    score, traceback, width = fill_alignment(similarity, target_ids, user_ids, gap_penalty, lo, hi)
+    return score, traceback, width, lo
 
-def print_matrix(matrix, target_phonemes, user_phonemes):
-    #### DEBUGGNG ####
-    m, n = len(target_phonemes), len(user_phonemes)
+def checkpoint_block(m, n, keep=True):
+    """
+    Target phonemes per block of a block by block alignment.
     
-    header = "     "
-    for j in range(n):
-        phoneme = user_phonemes[j]
-        header += f"{phoneme:^5}"
-    print(header)
+    About LOW_MEMORY_BLOCK_CELLS cells (a block of r rows is filled from band -r to n,
+    so it is r * (r + n + 3) cells), but when the first row of every block is kept never
+    fewer than sqrt(m) rows, so there are at most about sqrt(m) blocks and the score
+    rows they start from take O(sqrt(m) * n) memory.
     
-    for i in range(m+1):
-        if i == 0:
-            row = "   |"
-        else:
-            row = f" {target_phonemes[i-1]} |"
-        
-        for j in range(n+1):
-            row += f"{matrix[i,j]:5.2f}"
-        print(row)
-
-def print_traceback_matrix(matrix, target_phonemes, user_phonemes):
-    #### DEBUGGING ####
-    m, n = len(target_phonemes), len(user_phonemes)
-    moves = {0: "diag", 1: "up", 2: "left"}
- 
-    header = "     "
-    for j in range(n):
-        phoneme = user_phonemes[j]
-        header += f"{phoneme:^5}"
-    print(header)
-    for i in range(m+1):
-        if i == 0:
-            row = "   |"
-        else:
-            row = f" {target_phonemes[i-1]} |"
+    Args:
+    -----
+        m (int): Number of target phonemes
+        n (int): Number of user phonemes
+        keep (bool): The first row of every block is kept (see row_checkpoints)
         
-        for j in range(n+1):
-            move = moves[matrix[i,j]]
-            row += f"{move:^5}"
-        print(row)
+    Returns:
+    --------
+        int: Block height
+    """
+    rows = int((np.sqrt((n + 3) ** 2 + 4 * LOW_MEMORY_BLOCK_CELLS) - n - 3) / 2)
+    return max(rows, int(np.ceil(np.sqrt(m))) if keep else 1, 1)
 
-def split_phonemes(phonemes):
+def alignment_bytes(m, n, block=None, keep=True):
     """
-    Split a list of phonemes into words based on spaces.
+    Peak memory of the score and traceback arrays of a full or a block by block alignment.
     
     Args:
     -----
-        phonemes (list): List of phonemes with spaces between words
-                            e.g., ['ð', 'ə', ' ', 'k', 'æ', 't']
-                        
+        m (int): Number of target phonemes
+        n (int): Number of user phonemes
+        block (int): Target phonemes per block (None fills the full matrix)
+        keep (bool): The first row of every block is kept (see row_checkpoints)
+        
     Returns:
     --------
-        list: List of phoneme lists, where each sublist corresponds to a word
-                e.g., [['ð', 'ə'], ['k', 'æ', 't']]
+        int: Bytes (8 per score and 1 per traceback cell)
     """
-    words = []
-    current_word = []
-    for phoneme in phonemes:
-        if phoneme == ' ':
-            words.append(current_word)
-            current_word = []
-        else:
-            current_word.append(phoneme)
-    words.append(current_word)
-    return words
-
+    if block is None:
+        return (m + 1) * (m + n + 3) * 9
+    rows = min(block, m)
+    blocks = -(-m // block) if keep else 1
+    # the block being filled, the one before it (still referenced until the fill returns),
+    # the score row every block starts from and the traceback path
+    return 2 * (rows + 1) * (rows + n + 3) * 9 + blocks * (n + 1) * 8 + (m + n + 1 if keep else 0)
 
-def get_phoneme_index_in_word(phonemes, global_index):
+def low_memory_block(m, n, keep=True):
     """
-    Get the relative index of a phoneme within its word.
+    Block height to align block by block, if the full matrix is over LOW_MEMORY_CELLS and that peaks lower.
     
     Args:
     -----
-        phonemes (list): Complete phoneme list
-        global_index (int): Global index in the list
+        m (int): Number of target phonemes
+        n (int): Number of user phonemes
+        keep (bool): The first row of every block is kept (see row_checkpoints)
         
     Returns:
     --------
-        int: Relative index within the word
+        int: Block height, None to fill the full matrix
     """
-    word_start = global_index
-    while word_start > 0 and phonemes[word_start-1] != ' ':
-        word_start -= 1
-    return global_index - word_start
+    if (m + 1) * (m + n + 3) <= LOW_MEMORY_CELLS:
+        return None
+    block = checkpoint_block(m, n, keep)
+    return block if alignment_bytes(m, n, block, keep) < alignment_bytes(m, n) else None
 
-def get_word_start_position(phrase, word_index):
+def row_checkpoints(similarity, target_ids, user_ids, gap_penalty, block, keep=True):
     """
-    Get the character position where a word starts in the phrase.
+    Fill the full matrix block rows at a time, keeping only the score row each block starts from.
     
     Args:
     -----
-        phrase (str): Original phrase
-        word_idx (int): Index of the word
+        similarity (np.ndarray): Diagonal move score between phoneme ids
+        target_ids (np.ndarray): Target phoneme ids
+        user_ids (np.ndarray): User phoneme ids
+        gap_penalty (float): Standard gap penalty
+        block (int): Target phonemes per block
+        keep (bool): Keep the first row of every block (False only keeps the last row)
         
     Returns:
     --------
-        int: Character position where the word starts
+        tuple: (list of (first row, last row, scores of the first row or None for row 0), scores of row m)
     """
-    words = phrase.split()
-    position = 0
+    m, n = len(target_ids), len(user_ids)
+    checkpoints = []
+    row = None
+    for r0 in range(0, m, block):
+        r1 = min(r0 + block, m)
+        if keep:
+            checkpoints.append((r0, r1, row))
+        score, _, width = fill_alignment(similarity, target_ids[r0:r1], user_ids, gap_penalty, r0 - r1, n, first_row=row)
+        # cell (r1 - r0, j) of the block is at (r1 - r0) * width + j + 1
+        # (copied, a view would keep the whole block alive)
+        row = score[(r1 - r0) * width + 1:(r1 - r0) * width + n + 2].copy()
+    if row is None:
+        row = np.concatenate(([0.0], np.cumsum(np.full(n, float(gap_penalty)))))
+    return checkpoints, row
+
+def low_memory_alignment(similarity, target_ids, user_ids, gap_penalty):
+    """
+    Traceback path of the full matrix in O(m + sqrt(m) * n + LOW_MEMORY_BLOCK_CELLS) memory
+    (one block and the score row every block starts from, see checkpoint_block).
     
-    for i in range(word_index):
-        if i < len(words):
-            position += len(words[i]) + 1  # +1 for space
+    The forward pass keeps only the score row every block starts from, the
+    traceback then refills one block at a time from its row, bottom block first.
+    Refilled scores are bit for bit the same, so ties break exactly like the
+    full matrix (splitting at the best middle cell like Hirschberg would
+    can pick a different one of several equally good paths).
     
-    return position
+    Args:
+    -----
+        similarity (np.ndarray): Diagonal move score between phoneme ids
+        target_ids (np.ndarray): Target phoneme ids
+        user_ids (np.ndarray): User phoneme ids
+        gap_penalty (float): Standard gap penalty
+        
+    Returns:
+    --------
+        np.ndarray: Move of every path cell (i, j) at [i + j], for follow_traceback with strides (1, 1, 0)
+    """
+    m, n = len(target_ids), len(user_ids)
+    checkpoints, _ = row_checkpoints(similarity, target_ids, user_ids, gap_penalty, checkpoint_block(m, n))
+    # every move lowers i + j, so each path cell has its own anti-diagonal
+    path = np.full(m + n + 1, 2, dtype=np.uint8)
+    i, j = m, n
+    for r0, r1, row in reversed(checkpoints):
+        _, traceback, width = fill_alignment(similarity, target_ids[r0:r1], user_ids, gap_penalty, r0 - r1, n, first_row=row)
+        while i > r0 or (r0 == 0 and j > 0):
+            move = traceback[(i - r0) * (width - 1) + j + r1 - r0 + 1]
+            path[i + j] = move
+            if move != 2:
+                i -= 1
+            if move != 1:
+                j -= 1
+    return path
 
-def needleman_wunsch(target_phonemes, user_phonemes, match_reward=3, gap_penalty=-2):
+def needleman_wunsch(target_phonemes, user_phonemes, match_reward=3, gap_penalty=-2, band=None,
+                     legacy_accuracy=False, trace=None, heard=None):
     """
     Needleman-Wunsch algorithm for sequence alignment
     
     Args:
-        target_phonemes: List of target phonemes
-        user_phonemes: List of user phonemes
+        target_phonemes: List of target phonemes (or array of phoneme ids)
+        user_phonemes: List of user phonemes (or array of phoneme ids)
         match_reward: Score for perfect matches
         gap_penalty: Standard gap penalty
+        band: Only fill cells this close to the diagonal (widened automatically,
+              same result as the full matrix, see banded_alignment).
+              None fills the full matrix (block by block above LOW_MEMORY_CELLS cells
+              when that takes less memory, see low_memory_block)
+        legacy_accuracy: Compute accuracy with panphon's own edit distance
+                         (slow, kept for comparison, see weighted_accuracy)
+        trace: AlignmentTrace to record the path, step costs and decisions in (None records nothing)
+        heard: Dict to fill with target phoneme index -> user phoneme id said in its place (see follow_traceback)
     """
-    dist = Distance()
+    target_ids = pi.phoneme_ids(target_phonemes)
+    user_ids = pi.phoneme_ids(user_phonemes)
 
-    feature_edit_distance = dist.weighted_feature_edit_distance(target_phonemes, user_phonemes)
-    max_possible_distance = dist.weighted_feature_edit_distance(target_phonemes, "")
-    accuracy =  (1 - (feature_edit_distance / max_possible_distance)) * 100
+    m, n = len(target_ids), len(user_ids)
 
-    m, n = len(target_phonemes), len(user_phonemes)
+    # scale similarity acc to match reward
+    similarity = (1 - dt.cost_matrix()) * match_reward
+    if band is None and low_memory_block(m, n) is not None:
+        traceback = low_memory_alignment(similarity, target_ids, user_ids, gap_penalty)
+        strides = (1, 1, 0)
+        mispronounced_indices = follow_traceback(traceback, *strides, target_ids, user_ids, heard)
+    else:
+        if band is None:
+            lo = -m
+            score, traceback, width = fill_alignment(similarity, target_ids, user_ids, gap_penalty, lo, n)
+        else:
+            score, traceback, width, lo = banded_alignment(similarity, target_ids, user_ids, gap_penalty, band)
+        strides = (width - 1, 1, 1 - lo)
+        mispronounced_indices = trace_mispronounced(traceback, width, lo, target_ids, user_ids, heard)
+    if legacy_accuracy:
+        accuracy = panphon_accuracy(target_ids, user_ids)
+    elif band is None:
+        accuracy = weighted_accuracy(target_ids, user_ids)
+    else:
+        accuracy = weighted_accuracy(target_ids, user_ids, lo, -lo + n - m)
+    if trace is not None:
+        record_trace(trace, 'needleman_wunsch', dict(match_reward=match_reward, gap_penalty=gap_penalty, band=band),
+                     traceback, strides, target_ids, user_ids, similarity,
+                     lambda move, index, previous: gap_penalty, mispronounced_indices, accuracy)
+    return mispronounced_indices, accuracy
 
-    score = np.zeros((m+1, n+1), dtype=float)
+def weighted_accuracy(target_ids, user_ids, lo=None, hi=None):
+    """
+    Same accuracy as panphon_accuracy without calling panphon per attempt.
+    
+    The weighted edit distance is one more fill_alignment pass over the segments
+    of both sequences (costs negated, so the best score is the cheapest edit).
+    Phonemes are split into segments one at a time where panphon segments the
+    joined string, which only differs if two neighbouring phonemes fuse into one
+    segment (e.g., 'd' 'ʒ'); otherwise it matches panphon_accuracy up to float rounding.
+    
+    Args:
+    -----
+        target_ids (np.ndarray): Target phoneme ids
+        user_ids (np.ndarray): User phoneme ids
+        lo (int): Lowest j - i phoneme offset of the alignment band (None for the full matrix)
+        hi (int): Highest j - i phoneme offset of the alignment band (None for the full matrix)
+        
+    Returns:
+    --------
+        float: Accuracy percentage
+    """
+    feature_edit_distance, max_possible_distance = weighted_distance(target_ids, user_ids, lo, hi)
+    # nothing to pronounce counts as perfect
+    if max_possible_distance == 0:
+        return 100.0
+    return (1 - (feature_edit_distance / max_possible_distance)) * 100
 
-    traceback = np.zeros((m+1, n+1), dtype=int)
-    # 0: diagonal, 1: up (deletion), 2: left (insertion)
+def weighted_distance(target_ids, user_ids, lo=None, hi=None):
+    """
+    panphon's weighted feature edit distance between two phoneme sequences (see weighted_accuracy).
     
-    # init first row/col
-    for i in range(1, m+1):
-        score[i, 0] = score[i-1, 0] + gap_penalty
-        traceback[i, 0] = 1
+    Args:
+    -----
+        target_ids (np.ndarray): Target phoneme ids
+        user_ids (np.ndarray): User phoneme ids
+        lo (int): Lowest j - i phoneme offset of the alignment band (None for the full matrix)
+        hi (int): Highest j - i phoneme offset of the alignment band (None for the full matrix)
+        
+    Returns:
+    --------
+        tuple: (weighted edit distance, distance of deleting the whole target)
+    """
+    substitution, deletion, expansion = dt.weighted_costs()
+    target_counts = (expansion[target_ids] >= 0).sum(axis=1)
+    user_counts = (expansion[user_ids] >= 0).sum(axis=1)
+    target_segments = expansion[target_ids][expansion[target_ids] >= 0]
+    user_segments = expansion[user_ids][expansion[user_ids] >= 0]
+    m, n = len(target_segments), len(user_segments)
+    if m == 0 or n == 0:
+        return (m + n) * deletion, m * deletion
+
+    # only the last score is needed, so rows can go as soon as the next block is done
+    block = low_memory_block(m, n, keep=False) if lo is None else None
+    if block is not None:
+        _, row = row_checkpoints(-substitution, target_segments, user_segments, -deletion, block, keep=False)
+        return -row[n], m * deletion
+    # widen the phoneme band by however far segments can drift from phonemes
+    # (diphthongs add one, spaces drop one) so paths near the alignment still fit
+    lo = -m if lo is None else max(-m, lo - np.maximum(target_counts - 1, 0).sum() - (user_counts == 0).sum())
+    hi = n if hi is None else min(n, hi + np.maximum(user_counts - 1, 0).sum() + (target_counts == 0).sum())
+    # substitutions cost nothing at best, so an edit cheaper than a straight one (see straight_path_score)
+    # has fewer than its distance / deletion gaps, a band that holds them all needs only one fill
+    straight = -straight_path_score(-substitution, target_segments, user_segments, -deletion)
+    band_lo, band_hi = band_offsets(m, n, gap_band(m, n, straight / deletion))
+    if band_hi - band_lo <= hi - lo:
+        score, _, width = fill_alignment(-substitution, target_segments, user_segments, -deletion, band_lo, band_hi)
+        return -score[m * width + n - m - band_lo + 1], m * deletion
+    score, _, width = fill_alignment(-substitution, target_segments, user_segments, -deletion, lo, hi)
+    distance = -score[m * width + n - m - lo + 1]
+    # same bound with the distance found, if a cheaper edit could leave the band refill it once wide enough
+    band_lo, band_hi = band_offsets(m, n, gap_band(m, n, distance / deletion))
+    if band_lo < lo or band_hi > hi:
+        lo, hi = min(lo, band_lo), max(hi, band_hi)
+        score, _, width = fill_alignment(-substitution, target_segments, user_segments, -deletion, lo, hi)
+        distance = -score[m * width + n - m - lo + 1]
+    return distance, m * deletion
 
-    for j in range(1, n+1):
-        score[0, j] = score[0, j-1] + gap_penalty
-        traceback[0, j] = 2
+def panphon_accuracy(target_ids, user_ids, dist=None):
+    """
+    Accuracy of the user phonemes as 1 - weighted feature edit distance
+    relative to deleting the whole target, in percent (legacy, see weighted_accuracy).
     
+    Args:
+    -----
+        target_ids (np.ndarray): Target phoneme ids
+        user_ids (np.ndarray): User phoneme ids
+        dist (Distance): panphon Distance to use, the shared one if None
+        
+    Returns:
+    --------
+        float: Accuracy percentage
+    """
+    if dist is None:
+        dist = dt.panphon_distance()
+
+    feature_edit_distance = dist.weighted_feature_edit_distance(pi.phoneme_symbols(target_ids), pi.phoneme_symbols(user_ids))
+    max_possible_distance = dist.weighted_feature_edit_distance(pi.phoneme_symbols(target_ids), "")
+    return (1 - (feature_edit_distance / max_possible_distance)) * 100
+
+def trace_mispronounced(traceback, width, lo, target_ids, user_ids, heard=None):
+    """
+    Walk the traceback from the bottom right cell and collect mispronounced target phonemes.
     
-    # fill matrix
-    for i in range(1, m+1):
-        for j in range(1, n+1):
-            if target_phonemes[i-1] == user_phonemes[j-1]:
-                diag_score = score[i-1, j-1] + match_reward
-            else:
-                feature_dist = dist_matrix[(target_phonemes[i-1], user_phonemes[j-1])]
-                # scale similarity acc to match reward
-                similarity = (1 - feature_dist) * match_reward
-                diag_score = score[i-1, j-1] + similarity
-            # up and left scores (gaps)
-            up_score = score[i-1, j] + gap_penalty
-            left_score = score[i, j-1] + gap_penalty
-            
-            best_scores = [diag_score, up_score, left_score]
-            best_move = np.argmax(best_scores)
-            score[i, j] = best_scores[best_move]
-            traceback[i, j] = best_move
+    Args:
+    -----
+        traceback (np.ndarray): Flat traceback from fill_alignment (one pair, padding is fine)
+        width (int): Row width from fill_alignment
+        lo (int): Lowest j - i offset kept
+        target_ids (np.ndarray): Target phoneme ids (unpadded)
+        user_ids (np.ndarray): User phoneme ids (unpadded)
+        heard (dict): Filled like follow_traceback's (None skips it)
+        
+    Returns:
+    --------
+        dict: Target phoneme index -> 'partial' or 'incorrect'
+    """
+    # cell (i, j) of the band is at i * (width - 1) + j + 1 - lo
+    return follow_traceback(traceback, width - 1, 1, 1 - lo, target_ids, user_ids, heard)
+
+def follow_traceback(traceback, row_stride, col_stride, offset, target_ids, user_ids, heard=None):
+    """
+    Collect mispronounced target phonemes along the traceback path ending in
+    the cell of the last target and user phoneme.
     
-    # traceback to find mispronounced indices
+    Args:
+    -----
+        traceback (np.ndarray): Flat traceback, cell (i, j) at i * row_stride + j * col_stride + offset
+        row_stride (int): Step between rows
+        col_stride (int): Step between columns
+        offset (int): Position of cell (0, 0)
+        target_ids (np.ndarray): Target phoneme ids up to the end cell
+        user_ids (np.ndarray): User phoneme ids up to the end cell
+        heard (dict): Filled with target phoneme index -> id of the user phoneme said
+                      in its place, for every substitution (None skips it)
+        
+    Returns:
+    --------
+        dict: Target phoneme index -> 'partial' or 'incorrect'
+    """
+    m, n = len(target_ids), len(user_ids)
+    cost_matrix = dt.cost_matrix()
     mispronounced_indices = {}
     i, j = m, n
     target_idx = m - 1
     while i > 0 or j > 0:
-        if i > 0 and j > 0 and traceback[i, j] == 0:  # diagonal (match or substitution)
-            feature_dist = dist_matrix[(target_phonemes[i-1], user_phonemes[j-1])]
+        move = traceback[i * row_stride + j * col_stride + offset]
+        if i > 0 and j > 0 and move == 0:  # diagonal (match or substitution)
+            feature_dist = cost_matrix[target_ids[i-1], user_ids[j-1]]
             if feature_dist > 0:
                 severity = 'partial' if feature_dist <= COST_THRESHOLD else 'incorrect'
                 mispronounced_indices[target_idx] = severity
+                if heard is not None:
+                    heard[target_idx] = int(user_ids[j-1])
             i -= 1
             j -= 1
             target_idx -= 1
         
-        elif i > 0 and traceback[i, j] == 1:  # up (deletion)
+        elif i > 0 and move == 1:  # up (deletion)
             # Missing phoneme in user pronunciation
             mispronounced_indices[target_idx] = "incorrect"
             i -= 1
@@ -403,15 +571,788 @@ def needleman_wunsch(target_phonemes, user_phonemes, match_reward=3, gap_penalty
             
         else:  # left (insertion)
             # i knda forgpt why i did this but its important
-            if target_idx >= 0 and target_idx < len(target_phonemes):
+            if target_idx >= 0 and target_idx < m:
                 mispronounced_indices[target_idx] = "incorrect"
-            if target_idx + 1 < len(target_phonemes):
+            if target_idx + 1 < m:
                 mispronounced_indices[target_idx + 1] = "incorrect"
             j -= 1
 
+    return mispronounced_indices
+
+def record_trace(trace, engine, parameters, traceback, strides, target_ids, user_ids, similarity, gap_score,
+                 mispronounced_indices, accuracy):
+    """
+    Fill an AlignmentTrace from a finished alignment (only called when tracing).
+    
+    Args:
+    -----
+        trace (AlignmentTrace): Trace to fill
+        engine (str): Name of the aligner
+        parameters (dict): Scoring parameters of the aligner
+        traceback (np.ndarray): Flat traceback of the alignment
+        strides (tuple): (row_stride, col_stride, offset) of the traceback, see follow_traceback
+        target_ids (np.ndarray): Target phoneme ids
+        user_ids (np.ndarray): User phoneme ids
+        similarity (np.ndarray): Diagonal move score between phoneme ids
+        gap_score (callable): gap_score(move, phoneme index, previous move) -> score of a gap step
+        mispronounced_indices (dict): Result of the alignment
+        accuracy (float): Result of the alignment
+    """
+    row_stride, col_stride, offset = strides
+    cost_matrix = dt.cost_matrix()
+    trace.engine = engine
+    trace.parameters = parameters
+    trace.target = pi.phoneme_symbols(target_ids)
+    trace.user = pi.phoneme_symbols(user_ids)
+    trace.steps = []
+    trace.mispronounced = dict(mispronounced_indices)
+    trace.accuracy = float(accuracy)
+
+    moves = []
+    i, j = len(target_ids), len(user_ids)
+    while i > 0 or j > 0:
+        move = int(traceback[i * row_stride + j * col_stride + offset])
+        # same reading of the moves as follow_traceback
+        if not (i > 0 and j > 0 and move == 0):
+            move = 1 if i > 0 and move == 1 else 2
+        moves.append((move, i, j))
+        if move != 2:
+            i -= 1
+        if move != 1:
+            j -= 1
+
+    previous = None
+    for move, i, j in reversed(moves):
+        if move == 0:
+            target, user = target_ids[i-1], user_ids[j-1]
+            trace.add_step(0, i - 1, j - 1, float(similarity[target, user]), float(cost_matrix[target, user]),
+                           mispronounced_indices.get(i - 1))
+        elif move == 1:
+            trace.add_step(1, i - 1, None, float(gap_score(1, i - 1, previous)), severity='incorrect')
+        else:
+            trace.add_step(2, None, j - 1, float(gap_score(2, j - 1, previous)), severity='incorrect')
+        previous = move
+    trace.score = trace.steps[-1]['total'] if trace.steps else 0.0
+
+class IncrementalAligner:
+    """
+    Needleman-Wunsch that grows as user phonemes stream in.
+    
+    Only the scores of the last user column are kept, plus one uint8 traceback
+    column per user phoneme, so extending by k phonemes fills k x m cells and
+    never touches earlier columns. Partial results only walk the traceback
+    back to where it joins the previous partial path. After all phonemes are in,
+    finish() gives the same result as needleman_wunsch on the whole sequence.
+    
+    Usage:
+        aligner = IncrementalAligner(target_phonemes)
+        for chunk in stream:
+            partial = aligner.extend(chunk)
+        mispronounced_indices, accuracy = aligner.finish()
+    """
+
+    def __init__(self, target_phonemes, match_reward=3, gap_penalty=-2):
+        self.target_ids = pi.phoneme_ids(target_phonemes)
+        self.match_reward = match_reward
+        self.gap_penalty = gap_penalty
+        self._load_tables()
+        m = len(self.target_ids)
+        self.column = np.concatenate(([0.0], np.cumsum(np.full(m, float(gap_penalty)))))
+        # traceback column j at [j], column 0 is all deletions
+        self.traceback = np.ones((16, m + 1), dtype=np.uint8)
+        self.traceback[0, 0] = 0
+        self.user_ids = np.empty(16, dtype=np.intp)
+        self.n = 0
+        # last partial path from (0, 0) with cell -> position, and the target phonemes each step
+        # flagged first (the step nearest (0, 0) decides a severity, like in follow_traceback)
+        self._path = [(0, 0)]
+        self._positions = {(0, 0): 0}
+        self._step_flags = [[]]
+        self._flags = {}
+
+    def extend(self, user_phonemes):
+        """
+        Align the next user phonemes.
+        
+        Args:
+        -----
+            user_phonemes (list): Newly recognized IPA phonemes (or array of phoneme ids)
+            
+        Returns:
+        --------
+            dict: Partial mispronounced indices (see partial_mispronounced)
+        """
+        chunk = pi.phoneme_ids(user_phonemes)
+        k, m = len(chunk), len(self.target_ids)
+        # phonemes first seen in this chunk were interned above, past the end of the tables
+        if k and chunk.max() >= len(self.similarity):
+            self._load_tables()
+        if k:
+            if self.n + k >= len(self.traceback):
+                capacity = max(2 * len(self.traceback), self.n + k + 1)
+                self.traceback = np.resize(self.traceback, (capacity, m + 1))
+                self.user_ids = np.resize(self.user_ids, capacity)
+            self.user_ids[self.n:self.n + k] = chunk
+            for user_id in chunk.tolist():
+                self.n += 1
+                self.column, self.traceback[self.n] = self._fill_column(user_id)
+        return self.partial_mispronounced()
+
+    def _load_tables(self):
+        """Read the cost and similarity tables again (they grow when new phonemes are interned)."""
+        self.cost_matrix = dt.cost_matrix()
+        self.similarity = (1 - self.cost_matrix) * self.match_reward
+
+    def _fill_column(self, user_id):
+        """
+        Scores and traceback of the next user column.
+        
+        A few new columns are anti-diagonals of only a few cells, so columns are filled
+        directly: diagonal and left moves of every row at once, then the up moves
+        chained down the column one by one (the same additions in the same order as
+        fill_alignment, so scores and ties come out bit for bit the same).
+        """
+        previous = self.column
+        gap = float(self.gap_penalty)
+        diag = previous[:-1] + self.similarity[self.target_ids, user_id]
+        left = previous[1:] + gap
+        column = [previous[0] + gap]
+        for score in np.maximum(diag, left).tolist():
+            up = column[-1] + gap
+            column.append(score if score >= up else up)
+        column = np.array(column)
+        # same tie breaking as fill_alignment, row 0 is an insertion
+        up = column[:-1] + gap
+        move = (up > diag).view(np.uint8)
+        move[left > np.maximum(diag, up)] = 2
+        return column, np.concatenate(([2], move))
+
+    def _step(self, i, j):
+        """(target index, severity) of every phoneme the move out of cell (i, j) flags, like follow_traceback."""
+        move = self.traceback[j, i]
+        if i > 0 and j > 0 and move == 0:
+            feature_dist = self.cost_matrix[self.target_ids[i - 1], self.user_ids[j - 1]]
+            if feature_dist > 0:
+                return [(i - 1, 'partial' if feature_dist <= COST_THRESHOLD else 'incorrect')]
+            return []
+        if i > 0 and move == 1:
+            return [(i - 1, 'incorrect')]
+        # index i is only reported while it is before the end of the path
+        return [(i - 1, 'incorrect'), (i, 'incorrect')] if i > 0 else [(i, 'incorrect')]
+
+    def partial_mispronounced(self):
+        """
+        Mispronounced phonemes of the target prefix the user has covered so far.
+        
+        The prefix ends at the best scoring target phoneme of the last column,
+        later target phonemes are not judged yet. Earlier columns never change,
+        so the path is only walked back to where it joins the previous one.
+        
+        Returns:
+        --------
+            dict: Target phoneme index -> 'partial' or 'incorrect'
+        """
+        end = int(np.argmax(self.column))
+        i, j = end, self.n
+        new_cells = []
+        while (i, j) not in self._positions:
+            new_cells.append((i, j))
+            move = self.traceback[j, i]
+            if i > 0 and j > 0 and move == 0:
+                i -= 1
+                j -= 1
+            elif i > 0 and move == 1:
+                i -= 1
+            else:
+                j -= 1
+        # drop the old path after the joint, then add the new cells
+        joint = self._positions[(i, j)]
+        while len(self._path) > joint + 1:
+            del self._positions[self._path.pop()]
+            for index in self._step_flags.pop():
+                del self._flags[index]
+        for cell in reversed(new_cells):
+            flagged = []
+            for index, severity in self._step(*cell):
+                if index not in self._flags:
+                    self._flags[index] = severity
+                    flagged.append(index)
+            self._positions[cell] = len(self._path)
+            self._path.append(cell)
+            self._step_flags.append(flagged)
+        return {index: severity for index, severity in sorted(self._flags.items()) if index < end}
+
+    def finish(self, legacy_accuracy=False, heard=None):
+        """
+        Result for the complete attempt.
+        
+        Args:
+        -----
+            legacy_accuracy (bool): Compute accuracy with panphon's own edit distance
+            heard (dict): Filled with the user phoneme said for every substitution (see follow_traceback)
+            
+        Returns:
+        --------
+            tuple: (mispronounced indices, accuracy) like needleman_wunsch
+        """
+        user_ids = self.user_ids[:self.n]
+        if legacy_accuracy:
+            accuracy = panphon_accuracy(self.target_ids, user_ids)
+        else:
+            accuracy = weighted_accuracy(self.target_ids, user_ids)
+        # one full walk, so the dict also comes out in needleman_wunsch's order
+        # (column major, cell (i, j) at j * (m + 1) + i)
+        m = len(self.target_ids)
+        mispronounced_indices = follow_traceback(self.traceback.ravel(), 1, m + 1, 0, self.target_ids, user_ids,
+                                                 heard)
+        return mispronounced_indices, accuracy
+
+def batch_needleman_wunsch(pairs, match_reward=3, gap_penalty=-2, legacy_accuracy=False, heard=None):
+    """
+    Needleman-Wunsch for many pairs at once.
+    
+    Pairs are grouped by size (see size_chunks), each group is padded to its longest
+    target/user into B x (m+1) x width arrays and every anti-diagonal is filled for
+    the whole group with the same numpy ops, so memory stays around BATCH_CELLS cells.
+    Padding never leaks into a result because a pair's traceback only reads
+    cells up to its own (m, n), which only depend on cells before them.
+    
+    Args:
+    -----
+        pairs (list): List of (target_phonemes, user_phonemes), phoneme lists or id arrays
+        match_reward: Score for perfect matches
+        gap_penalty: Standard gap penalty
+        legacy_accuracy: Compute accuracy with panphon's own edit distance
+        heard: List to extend with the heard dict of every pair (see needleman_wunsch)
+        
+    Returns:
+    --------
+        list: (mispronounced_indices, accuracy) for every pair, same as needleman_wunsch
+    """
+    pairs = [(pi.phoneme_ids(target), pi.phoneme_ids(user)) for target, user in pairs]
+    results = [None] * len(pairs)
+    pair_heard = [{} for _ in pairs]
+    for chunk in size_chunks([(len(target), len(user)) for target, user in pairs]):
+        chunk_pairs = [pairs[k] for k in chunk]
+        mispronounced = batch_mispronounced(chunk_pairs, match_reward, gap_penalty,
+                                            None if heard is None else [pair_heard[k] for k in chunk])
+        if legacy_accuracy:
+            accuracies = [panphon_accuracy(target, user) for target, user in chunk_pairs]
+        else:
+            accuracies = batch_accuracy(chunk_pairs).tolist()
+        for k, result in zip(chunk, zip(mispronounced, accuracies)):
+            results[k] = result
+    if heard is not None:
+        heard.extend(pair_heard)
+    return results
+
+def pad_pairs(pairs):
+    """
+    Pad (target_ids, user_ids) pairs with SPACE_ID into B x m and B x n arrays.
+    
+    Args:
+    -----
+        pairs (list): List of (target_ids, user_ids)
+        
+    Returns:
+    --------
+        tuple: (target ids, user ids) padded to the longest target/user
+    """
+    m = max(len(target) for target, _ in pairs)
+    n = max(len(user) for _, user in pairs)
+    target_ids = np.full((len(pairs), m), pi.SPACE_ID, dtype=np.intp)
+    user_ids = np.full((len(pairs), n), pi.SPACE_ID, dtype=np.intp)
+    for b, (target, user) in enumerate(pairs):
+        target_ids[b, :len(target)] = target
+        user_ids[b, :len(user)] = user
+    return target_ids, user_ids
+
+def batch_mispronounced(pairs, match_reward=3, gap_penalty=-2, heard=None):
+    """
+    Mispronounced indices of many (target_ids, user_ids) pairs aligned in one batch.
+    
+    heard is None or one dict per pair to fill (see follow_traceback).
+    
+    Returns:
+    --------
+        list: mispronounced_indices for every pair
+    """
+    if not pairs:
+        return []
+    target_ids, user_ids = pad_pairs(pairs)
+    m, n = target_ids.shape[1], user_ids.shape[1]
+    similarity = (1 - dt.cost_matrix()) * match_reward
+    score, traceback, width = fill_alignment(similarity, target_ids, user_ids, gap_penalty, -m, n)
+    heard = heard or [None] * len(pairs)
+    return [trace_mispronounced(traceback[b], width, -m, target, user, heard[b])
+            for b, (target, user) in enumerate(pairs)]
+
+def batch_accuracy(pairs):
+    """
+    weighted_accuracy of many (target_ids, user_ids) pairs in one batch.
+    
+    Returns:
+    --------
+        np.ndarray: Accuracy percentage of every pair
+    """
+    feature_edit_distance, max_possible_distance = batch_distance(pairs)
+    # nothing to pronounce counts as perfect
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(max_possible_distance == 0, 100.0,
+                        (1 - (feature_edit_distance / max_possible_distance)) * 100)
+
+def batch_distance(pairs):
+    """
+    weighted_distance of many (target_ids, user_ids) pairs in one batch.
+    
+    The segments of every pair are padded like pad_pairs and the weighted edit
+    distances filled together, padding never reaches a pair's own last cell.
+    
+    Returns:
+    --------
+        tuple: (weighted edit distance, distance of deleting the whole target) arrays, one entry per pair
+    """
+    if not pairs:
+        return np.zeros(0), np.zeros(0)
+    substitution, deletion, expansion = dt.weighted_costs()
+    segment_pairs = []
+    for target, user in pairs:
+        target, user = expansion[target], expansion[user]
+        segment_pairs.append((target[target >= 0], user[user >= 0]))
+    target_segments, user_segments = pad_pairs(segment_pairs)
+    m, n = target_segments.shape[1], user_segments.shape[1]
+    score, _, width = fill_alignment(-substitution, target_segments, user_segments, -deletion, -m, n)
+    lengths = np.array([(len(target), len(user)) for target, user in segment_pairs])
+    # cell (m_b, n_b) of pair b is at m_b * width + n_b - m_b + m + 1
+    ends = lengths[:, 0] * width + lengths[:, 1] - lengths[:, 0] + m + 1
+    return -score[np.arange(len(pairs)), ends], lengths[:, 0] * deletion
+
+def size_chunks(sizes):
+    """
+    Group pairs of similar size so their padded batch matrices stay around BATCH_CELLS.
+    
+    Args:
+    -----
+        sizes (list): (target length, user length) of every pair
+        
+    Returns:
+    --------
+        list: Lists of pair indices, one per batch
+    """
+    # shortest first so similar sizes share a chunk
+    order = sorted(range(len(sizes)), key=lambda k: sizes[k])
+    chunks = []
+    chunk = []
+    for k in order:
+        chunk.append(k)
+        m, n = sizes[k]
+        # biggest pair is last, keep the chunks padded matrices around BATCH_CELLS
+        if len(chunk) * (m + 1) * (m + n + 3) >= BATCH_CELLS:
+            chunks.append(chunk)
+            chunk = []
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+def word_spans(ids):
+    """
+    Find the words of a phoneme id sequence.
+    
+    Args:
+    -----
+        ids (np.ndarray): Phoneme ids with SPACE_ID between words
+        
+    Returns:
+    --------
+        np.ndarray: W x 2 (start, stop) phoneme index of every word
+    """
+    is_word = np.concatenate(([False], ids != pi.SPACE_ID, [False]))
+    return np.flatnonzero(is_word[1:] != is_word[:-1]).reshape(-1, 2)
+
+def word_pair_scores(target_ids, user_ids, target_words, user_words, candidates, match_reward, gap_penalty):
+    """
+    Straight path score (see straight_path_score) of candidate word pairs, all pairs at once.
+    
+    A lower bound on their alignment score without filling a matrix per pair, exact
+    unless the learner dropped or added a phoneme inside the word.
+    
+    Args:
+    -----
+        target_ids (np.ndarray): Target phoneme ids
+        user_ids (np.ndarray): User phoneme ids
+        target_words (np.ndarray): Target word spans from word_spans
+        user_words (np.ndarray): User word spans from word_spans
+        candidates (list): (target word, user word) index pairs to score
+        match_reward: Score for perfect matches
+        gap_penalty: Standard gap penalty
+        
+    Returns:
+    --------
+        np.ndarray: Score of every candidate pair
+    """
+    similarity = (1 - dt.cost_matrix()) * match_reward
+    a, b = np.array(candidates).T
+    target_starts, target_stops = target_words[a, 0], target_words[a, 1]
+    user_starts, user_stops = user_words[b, 0], user_words[b, 1]
+    target_lengths, user_lengths = target_stops - target_starts, user_stops - user_starts
+    # C x k phoneme positions read from the start and from the end of both words
+    steps = np.arange(np.minimum(target_lengths, user_lengths).max())
+    inside = steps < np.minimum(target_lengths, user_lengths)[:, None]
+    from_start = similarity[target_ids[np.minimum(target_starts[:, None] + steps, len(target_ids) - 1)],
+                            user_ids[np.minimum(user_starts[:, None] + steps, len(user_ids) - 1)]]
+    from_end = similarity[target_ids[np.maximum(target_stops[:, None] - 1 - steps, 0)],
+                          user_ids[np.maximum(user_stops[:, None] - 1 - steps, 0)]]
+    diagonal = np.maximum(np.where(inside, from_start, 0).sum(axis=1), np.where(inside, from_end, 0).sum(axis=1))
+    return diagonal + np.abs(target_lengths - user_lengths) * gap_penalty
+
+def hierarchical_needleman_wunsch(target_phonemes, user_phonemes, match_reward=3, gap_penalty=-2,
+                                  word_band=8, legacy_accuracy=False, heard=None):
+    """
+    Align words first, then phonemes only inside matched words.
+    
+    The word level is Needleman-Wunsch over words (word pair score is the straight
+    path bound of word_pair_scores, a skipped word costs a gap per phoneme), limited
+    to word_band words around the diagonal. Every matched word pair and every run of
+    skipped words is then aligned on its own, all of them batched together, so no
+    matrix is bigger than a few words even for long readings.
+    Mispronounced indices only differ from needleman_wunsch where the flat
+    alignment would have moved phonemes across a word boundary; accuracy adds
+    up the weighted distance of every piece, so it can come out slightly lower.
+    
+    Args:
+    -----
+        target_phonemes: List of target phonemes with spaces (or array of phoneme ids)
+        user_phonemes: List of user phonemes with spaces (or array of phoneme ids)
+        match_reward: Score for perfect matches
+        gap_penalty: Standard gap penalty
+        word_band: Words kept on either side of the word level diagonal
+        legacy_accuracy: Compute accuracy with panphon's own edit distance on the whole sequences
+        heard: Dict to fill with target phoneme index -> user phoneme id said in its place (see follow_traceback)
+        
+    Returns:
+    --------
+        tuple: (mispronounced indices, accuracy) like needleman_wunsch
+    """
+    target_ids = pi.phoneme_ids(target_phonemes)
+    user_ids = pi.phoneme_ids(user_phonemes)
+    target_words = word_spans(target_ids)
+    user_words = word_spans(user_ids)
+    wt, wu = len(target_words), len(user_words)
+
+    # word level alignment, word indices stand in for phoneme ids
+    lo = max(min(0, wu - wt) - word_band, -wt)
+    hi = min(max(0, wu - wt) + word_band, wu)
+    candidates = [(a, b) for a in range(wt) for b in range(max(0, a + lo), min(wu, a + hi + 1))]
+    word_similarity = np.full((wt, wu), -np.inf)
+    if candidates:
+        word_similarity[tuple(np.array(candidates).T)] = word_pair_scores(
+            target_ids, user_ids, target_words, user_words, candidates, match_reward, gap_penalty)
+    word_gaps = (gap_penalty * (target_words[:, 1] - target_words[:, 0]).astype(float),
+                 gap_penalty * (user_words[:, 1] - user_words[:, 0]).astype(float))
+    _, traceback, width = fill_alignment(word_similarity, np.arange(wt), np.arange(wu), word_gaps, lo, hi)
+
+    # matched word pairs and runs of skipped words, as (a0, a1, b0, b1) word ranges
+    pieces = []
+    run = None
+    a, b = wt, wu
+    while a > 0 or b > 0:
+        move = traceback[a * (width - 1) + b + 1 - lo]
+        if a > 0 and b > 0 and move == 0:
+            if run is not None:
+                pieces.append(run)
+                run = None
+            pieces.append((a - 1, a, b - 1, b))
+            a -= 1
+            b -= 1
+        else:
+            if run is None:
+                run = [a, a, b, b]
+            if a > 0 and move == 1:
+                a -= 1
+                run[0] = a
+            else:
+                b -= 1
+                run[2] = b
+    if run is not None:
+        pieces.append(run)
+
+    def phoneme_range(words, first, last):
+        return (words[first, 0], words[last - 1, 1]) if first < last else (0, 0)
+
+    offsets, pairs = [], []
+    for a0, a1, b0, b1 in pieces:
+        t_start, t_stop = phoneme_range(target_words, a0, a1)
+        u_start, u_stop = phoneme_range(user_words, b0, b1)
+        # numpy ints would end up as keys of the result (json cant write them)
+        offsets.append(int(t_start))
+        pairs.append((target_ids[t_start:t_stop], user_ids[u_start:u_stop]))
+
+    piece_results = [None] * len(pairs)
+    piece_heard = [{} for _ in pairs]
+    for chunk in size_chunks([(len(t), len(u)) for t, u in pairs]):
+        chunk_results = batch_mispronounced([pairs[c] for c in chunk], match_reward, gap_penalty,
+                                            [piece_heard[c] for c in chunk])
+        for c, piece_indices in zip(chunk, chunk_results):
+            piece_results[c] = piece_indices
+    # pieces were collected back to front like a traceback, so the dict keeps the usual order
+    mispronounced_indices = {}
+    for offset, piece_indices in zip(offsets, piece_results):
+        for idx, severity in piece_indices.items():
+            mispronounced_indices[offset + idx] = severity
+    if heard is not None:
+        for offset, said in zip(offsets, piece_heard):
+            heard.update((offset + idx, user_id) for idx, user_id in said.items())
+
+    if legacy_accuracy:
+        accuracy = panphon_accuracy(target_ids, user_ids)
+    else:
+        feature_edit_distance = max_possible_distance = 0.0
+        for chunk in size_chunks([(len(t), len(u)) for t, u in pairs]):
+            distance, max_distance = batch_distance([pairs[c] for c in chunk])
+            feature_edit_distance += distance.sum()
+            max_possible_distance += max_distance.sum()
+        accuracy = 100.0 if max_possible_distance == 0 else (1 - (feature_edit_distance / max_possible_distance)) * 100
     return mispronounced_indices, accuracy
+
+def gap_penalties(ids, gap_open, gap_extend, boundary_open, boundary_extend):
+    """
+    Affine gap penalties of every phoneme, spaces (word boundaries) get their own.
+    
+    Args:
+    -----
+        ids (np.ndarray): Phoneme ids
+        gap_open (float): Penalty of the first phoneme of a gap inside a word
+        gap_extend (float): Penalty of every further phoneme of a gap inside a word
+        boundary_open (float): Penalty of a gap starting on a space
+        boundary_extend (float): Penalty of a space inside a longer gap
+        
+    Returns:
+    --------
+        tuple: (open penalty, extend penalty) arrays shaped like ids
+    """
+    at_boundary = ids == pi.SPACE_ID
+    return np.where(at_boundary, boundary_open, gap_open), np.where(at_boundary, boundary_extend, gap_extend)
+
+def fill_affine_alignment(similarity, target_ids, user_ids, target_gaps, user_gaps):
+    """
+    Fill Gotoh's three state matrices (match, deletion, insertion) one anti-diagonal at a time.
     
-def get_pronunciation_score(target_phrase, target_phonemes, user_phonemes):
+    Same idea as fill_alignment on the full (m+1) x (n+1) matrix, cell (i, j) at
+    flat[i * (n + 1) + j], so an anti-diagonal and its three neighbours are slices
+    with step n. Every cell stores where each state came from in one byte:
+    bits 0-1 for match, 2-3 for deletion, 4-5 for insertion
+    (0: match, 1: deletion, 2: insertion, the same codes as traceback moves).
+    
+    Args:
+    -----
+        similarity (np.ndarray): Diagonal move score between phoneme ids
+        target_ids (np.ndarray): Target phoneme ids
+        user_ids (np.ndarray): User phoneme ids
+        target_gaps (tuple): (open, extend) penalty of every target phoneme (see gap_penalties)
+        user_gaps (tuple): (open, extend) penalty of every user phoneme
+        
+    Returns:
+    --------
+        tuple: (match, deletion, insertion) flat float64 scores and the flat uint8 traceback
+    """
+    m, n = len(target_ids), len(user_ids)
+    target_open, target_extend = target_gaps
+    user_open, user_extend = user_gaps
+    match = np.full((m + 1) * (n + 1), -np.inf)
+    deletion = np.full(match.shape, -np.inf)
+    insertion = np.full(match.shape, -np.inf)
+    traceback = np.zeros(match.shape, dtype=np.uint8)
+    match[0] = 0
+    # column 0 is one long deletion, row 0 one long insertion
+    if m:
+        deletion[n + 1::n + 1] = np.cumsum(np.concatenate((target_open[:1], target_extend[1:])))
+        traceback[2 * (n + 1)::n + 1] = 1 << 2
+    if n:
+        insertion[1:n + 1] = np.cumsum(np.concatenate((user_open[:1], user_extend[1:])))
+        traceback[2:n + 1] = 2 << 4
+
+    for d in range(2, m + n + 1):
+        i_start = max(1, d - n)
+        i_stop = min(m, d - 1)
+        if i_start > i_stop:
+            continue
+        first, last = i_start * n + d, i_stop * n + d
+        cells = slice(first, last + 1, n)
+        diag = slice(first - n - 2, last - n - 1, n)
+        up = slice(first - n - 1, last - n, n)
+        left = slice(first - 1, last, n)
+        targets = slice(i_start - 1, i_stop)
+        # j = d - i runs backwards along the diagonal
+        users = slice(d - i_stop - 1, d - i_start)
+        sub = similarity[target_ids[targets], user_ids[users][::-1]]
+
+        # first best state wins ties, like np.argmax
+        best = np.maximum(match[diag], deletion[diag])
+        code = (deletion[diag] > match[diag]).view(np.uint8)
+        code[insertion[diag] > best] = 2
+        match[cells] = np.maximum(best, insertion[diag]) + sub
+
+        opened = match[up] + target_open[targets]
+        extended = deletion[up] + target_extend[targets]
+        switched = insertion[up] + target_open[targets]
+        best = np.maximum(opened, extended)
+        came_from = (extended > opened).view(np.uint8)
+        came_from[switched > best] = 2
+        deletion[cells] = np.maximum(best, switched)
+        code |= came_from << 2
+
+        opened = match[left] + user_open[users][::-1]
+        extended = insertion[left] + user_extend[users][::-1]
+        switched = deletion[left] + user_open[users][::-1]
+        best = np.maximum(opened, extended)
+        came_from = np.where(extended > opened, 2, 0).astype(np.uint8)
+        came_from[switched > best] = 1
+        insertion[cells] = np.maximum(best, switched)
+        traceback[cells] = code | came_from << 4
+
+    return match, deletion, insertion, traceback
+
+def affine_needleman_wunsch(target_phonemes, user_phonemes, match_reward=3, gap_open=-3, gap_extend=-1,
+                            boundary_open=-1.5, boundary_extend=-0.5, legacy_accuracy=False, trace=None,
+                            heard=None):
+    """
+    Needleman-Wunsch with affine (Gotoh) gaps that are cheaper at word boundaries.
+    
+    A gap costs gap_open for its first phoneme and gap_extend for every further one,
+    so a dropped or added word is one cheap run of gaps instead of phonemes being
+    pulled over from neighbouring words, and spaces (boundary penalties) make runs
+    that start or cross between words cheaper still. Time is O(m * n) like
+    needleman_wunsch, memory is three score matrices plus one byte per cell.
+    
+    Args:
+        target_phonemes: List of target phonemes with spaces (or array of phoneme ids)
+        user_phonemes: List of user phonemes with spaces (or array of phoneme ids)
+        match_reward: Score for perfect matches
+        gap_open: Penalty of the first phoneme of a gap inside a word
+        gap_extend: Penalty of every further phoneme of a gap inside a word
+        boundary_open: Penalty of a gap starting on a space
+        boundary_extend: Penalty of a space inside a longer gap
+        legacy_accuracy: Compute accuracy with panphon's own edit distance
+        trace: AlignmentTrace to record the path, step costs and decisions in (None records nothing)
+        heard: Dict to fill with target phoneme index -> user phoneme id said in its place (see follow_traceback)
+        
+    Returns:
+        tuple: (mispronounced indices, accuracy) like needleman_wunsch
+    """
+    target_ids = pi.phoneme_ids(target_phonemes)
+    user_ids = pi.phoneme_ids(user_phonemes)
+    m, n = len(target_ids), len(user_ids)
+    similarity = (1 - dt.cost_matrix()) * match_reward
+    penalties = (gap_open, gap_extend, boundary_open, boundary_extend)
+    target_gaps = gap_penalties(target_ids, *penalties)
+    user_gaps = gap_penalties(user_ids, *penalties)
+    match, deletion, insertion, traceback = fill_affine_alignment(similarity, target_ids, user_ids,
+                                                                  target_gaps, user_gaps)
+    # walk the states back, every move lowers i + j so the moves fit in one array (see low_memory_alignment)
+    end = m * (n + 1) + n
+    state = int(np.argmax([match[end], deletion[end], insertion[end]]))
+    path = np.full(m + n + 1, 2, dtype=np.uint8)
+    i, j = m, n
+    while i > 0 or j > 0:
+        path[i + j] = state
+        state, i, j = (int(traceback[i * (n + 1) + j]) >> 2 * state) & 3, i - (state != 2), j - (state != 1)
+    mispronounced_indices = follow_traceback(path, 1, 1, 0, target_ids, user_ids, heard)
+
+    if legacy_accuracy:
+        accuracy = panphon_accuracy(target_ids, user_ids)
+    else:
+        accuracy = weighted_accuracy(target_ids, user_ids)
+    if trace is not None:
+        # a gap step extends the gap if the step before it moved the same way
+        gap_score = lambda move, index, previous: (target_gaps if move == 1 else user_gaps)[previous == move][index]
+        record_trace(trace, 'affine_needleman_wunsch', dict(match_reward=match_reward, gap_open=gap_open,
+                     gap_extend=gap_extend, boundary_open=boundary_open, boundary_extend=boundary_extend),
+                     path, (1, 1, 0), target_ids, user_ids, similarity, gap_score, mispronounced_indices, accuracy)
+    return mispronounced_indices, accuracy
+
+def lattice_needleman_wunsch(lattice, user_phonemes, match_reward=3, gap_penalty=-2, legacy_accuracy=False,
+                             trace=None, heard=None):
+    """
+    Align user phonemes against every pronunciation in a PronunciationLattice at once.
+    
+    One DP pass over the lattice rows finds the best scoring pronunciation (rows take
+    the best of their predecessors, ties go to the displayed pronunciation), which is
+    then graded with needleman_wunsch. Errors are reported on the displayed phonemes
+    the chosen pronunciation stands for, phonemes a variant leaves out are not errors.
+    
+    Args:
+    -----
+        lattice (PronunciationLattice): Pronunciations of the target phrase
+        user_phonemes (list): List of user's spoken IPA phonemes with spaces (or array of phoneme ids)
+        match_reward: Reward for matching phonemes
+        gap_penalty: Penalty for gaps
+        legacy_accuracy: Compute accuracy with panphon's own edit distance
+        trace: AlignmentTrace to record the grading of the chosen pronunciation in
+               (its target is that pronunciation, indices are not mapped to the displayed phonemes)
+        heard: Dict to fill with displayed target phoneme index -> user phoneme id said in its place
+        
+    Returns:
+    --------
+        tuple: (mispronounced_indices dict of displayed target phoneme index -> severity, accuracy)
+    """
+    user_ids = pi.phoneme_ids(user_phonemes)
+    n = len(user_ids)
+    rows = len(lattice) + 1
+    similarity = (1 - dt.cost_matrix()) * match_reward
+    columns = np.arange(n + 1)
+    gaps = columns * gap_penalty
+    score = np.empty((rows, n + 1))
+    came_from = np.zeros((rows, n + 1), dtype=np.intp)  # predecessor row of diagonal and up moves
+    moves = np.full((rows, n + 1), 2, dtype=np.uint8)  # 0: diagonal, 1: up (deletion), 2: left (insertion)
+    score[0] = gaps
+    for row in range(1, rows):
+        preds = lattice.predecessors(row)
+        # argmax keeps the first predecessor on ties
+        best = preds[np.argmax(score[preds], axis=0)]
+        up = score[best, columns] + gap_penalty
+        diag = np.full(n + 1, -np.inf)
+        diag[1:] = score[best[:-1], columns[:-1]] + similarity[lattice.labels[row], user_ids]
+        # diagonal wins ties, then up
+        use_diag = diag >= up
+        best_move = np.where(use_diag, diag, up)
+        came_from[row] = np.where(use_diag, np.concatenate(([0], best[:-1])), best)
+        # insertions chain along the row: score[j] = max(best_move[j], score[j-1] + gap)
+        score[row] = np.maximum.accumulate(best_move - gaps) + gaps
+        moves[row] = np.where(score[row] > best_move, 2, np.where(use_diag, 0, 1))
+
+    # walk back to find the chosen pronunciation
+    row = lattice.finals[np.argmax(score[lattice.finals, n])]
+    j = n
+    path = []
+    while row > 0:
+        move = moves[row, j]
+        if move != 2:
+            path.append(row)
+            row = came_from[row, j]
+        if move != 1:
+            j -= 1
+    path = np.array(path[::-1], dtype=np.intp)
+
+    path_heard = {}
+    path_mispronounced, accuracy = needleman_wunsch(lattice.labels[path], user_ids, match_reward, gap_penalty,
+                                                    legacy_accuracy=legacy_accuracy, trace=trace, heard=path_heard)
+    mispronounced_indices = {}
+    for path_index, severity in path_mispronounced.items():
+        display = int(lattice.display_index[path[path_index]])
+        if display >= 0 and mispronounced_indices.get(display) != 'incorrect':
+            mispronounced_indices[display] = severity
+            if heard is None:
+                continue
+            # the phoneme heard goes with the severity kept
+            if path_index in path_heard:
+                heard[display] = path_heard[path_index]
+            else:
+                heard.pop(display, None)
+    return mispronounced_indices, accuracy
+
+def get_pronunciation_score(target_phrase, target_phonemes, user_phonemes, band=None, use_cache=True,
+                            legacy_accuracy=False, hierarchical=False, offset_index=None, lattice=None,
+                            affine=False, trace=None, columnar=False):
     """
     Get pronunciation score and error info for a target phrase and user phonemes,
     handling different word counts by comparing entire phoneme sequences.
@@ -421,101 +1362,293 @@ def get_pronunciation_score(target_phrase, target_phonemes, user_phonemes):
         target_phrase (str): Original text phrase (e.g., "the cat")
         target_phonemes (list): List of target IPA phonemes with spaces (e.g., ['ð', 'ə', ' ', 'k', 'æ', 't'])
         user_phonemes (list): List of user's spoken IPA phonemes with spaces (e.g., ['d', 'ə', ' ', 'k', 'æ', 't'])
+        band (int): Use banded alignment starting this wide (see needleman_wunsch)
+        use_cache (bool): Look the result up in score_cache first (the returned dict is shared, dont modify it)
+        legacy_accuracy (bool): Use panphon's edit distance for accuracy (never cached)
+        hierarchical (bool): Align words first, then phonemes within them (see
+                             hierarchical_needleman_wunsch), meant for long readings
+        offset_index (OffsetIndex): Offsets of the target phrase from build_offset_index (built if None)
+        lattice (PronunciationLattice): Accept every pronunciation in this lattice of the target
+                                        (see lattice_needleman_wunsch), band and hierarchical are ignored
+        affine (bool): Use affine gaps that are cheaper between words (see affine_needleman_wunsch),
+                       fewer false flags around dropped words, band is ignored
+        trace (AlignmentTrace): Record how the attempt was graded (skips the cache,
+                                not recorded for hierarchical alignments)
+        columnar (bool): Return a ScoreResult (arrays, builds the error_info keys only when read)
         
     Returns:
     --------
-        dict: Dictionary containing pronunciation feedback information 
+        dict: Dictionary containing pronunciation feedback information (ScoreResult if columnar)
+    """
+    use_cache = use_cache and not legacy_accuracy and trace is None
+    if use_cache:
+        key = score_cache_key(target_phrase, target_phonemes, user_phonemes)
+        # lattices and offset indexes are keyed by identity (the key keeps them alive, so ids arent reused),
+        # the app builds them once per phrase and reuses them for every attempt
+        if lattice is not None:
+            key += ('lattice', lattice)
+        elif hierarchical:
+            key += ('hierarchical',)
+        elif affine:
+            key += ('affine',)
+        elif band is not None:
+            key += ('band', band)
+        if offset_index is not None:
+            key += ('offset_index', offset_index)
+        if columnar:
+            key += ('columnar',)
+        error_info = score_cache.get(key)
+        if error_info is not None:
+            return error_info
+
+    # align integer ids, strings are only needed for the feedback
+    target_ids = pi.phoneme_ids(target_phonemes)
+    # user phoneme said in place of every substituted target phoneme
+    heard = {}
+    # phoneme indices with severity mapping
+    if lattice is not None:
+        mispronounced_indices, accuracy = lattice_needleman_wunsch(lattice, pi.phoneme_ids(user_phonemes),
+                                                                   legacy_accuracy=legacy_accuracy, trace=trace,
+                                                                   heard=heard)
+    elif hierarchical:
+        mispronounced_indices, accuracy = hierarchical_needleman_wunsch(target_ids, pi.phoneme_ids(user_phonemes),
+                                                                        legacy_accuracy=legacy_accuracy, heard=heard)
+    elif affine:
+        mispronounced_indices, accuracy = affine_needleman_wunsch(target_ids, pi.phoneme_ids(user_phonemes),
+                                                                  legacy_accuracy=legacy_accuracy, trace=trace,
+                                                                  heard=heard)
+    else:
+        mispronounced_indices, accuracy = needleman_wunsch(target_ids, pi.phoneme_ids(user_phonemes), band=band,
+                                                          legacy_accuracy=legacy_accuracy, trace=trace, heard=heard)
+    build = build_score_result if columnar else build_error_info
+    error_info = build(target_phrase, target_phonemes, mispronounced_indices, accuracy, offset_index, heard)
+
+    if use_cache:
+        score_cache.put(key, error_info)
+    return error_info
+
+def get_pronunciation_score_nbest(target_phrase, target_phonemes, hypotheses, offset_index=None, lattice=None):
+    """
+    Grade several transcriptions of one attempt (e.g., ASR beams) and keep the best one.
+    
+    Accuracy of every hypothesis comes from one batched weighted_accuracy pass
+    against the shared target, only the best hypothesis is then aligned for
+    feedback, so N hypotheses cost far less than N get_pronunciation_score calls.
+    
+    Args:
+    -----
+        target_phrase (str): Original text phrase (e.g., "the cat")
+        target_phonemes (list): List of target IPA phonemes with spaces
+        hypotheses (list): List of user IPA phoneme lists, most likely transcription first
+        offset_index (OffsetIndex): Offsets of the target phrase from build_offset_index (built if None)
+        lattice (PronunciationLattice): Grade the best hypothesis against this lattice (hypotheses
+                                        are still ranked against target_phonemes)
+        
+    Returns:
+    --------
+        dict: error_info of the best hypothesis (see get_pronunciation_score) plus
+              'hypothesis' (its index) and 'hypothesis_scores' (accuracy of every hypothesis)
+    """
+    target_ids = pi.phoneme_ids(target_phonemes)
+    user_ids = [pi.phoneme_ids(hypothesis) for hypothesis in hypotheses]
+    accuracies = batch_weighted_accuracy(target_ids, user_ids)
+    # ties go to the more likely transcription
+    best = int(np.argmax(accuracies))
+    error_info = get_pronunciation_score(target_phrase, target_phonemes, hypotheses[best],
+                                         offset_index=offset_index, lattice=lattice)
+    # cached dicts are shared, extend a copy
+    return dict(error_info, hypothesis=best, hypothesis_scores=accuracies.tolist())
+
+def batch_weighted_accuracy(target_ids, user_ids):
+    """
+    weighted_accuracy of many user sequences against the same target in one batch.
+    
+    Args:
+    -----
+        target_ids (np.ndarray): Target phoneme ids
+        user_ids (list): List of user phoneme id arrays
+        
+    Returns:
+    --------
+        np.ndarray: Accuracy percentage of every user sequence
+    """
+    pairs = [(target_ids, ids) for ids in user_ids]
+    accuracies = np.empty(len(pairs))
+    for chunk in size_chunks([(len(target), len(user)) for target, user in pairs]):
+        accuracies[chunk] = batch_accuracy([pairs[k] for k in chunk])
+    return accuracies
+
+def score_cache_key(target_phrase, target_phonemes, user_phonemes):
+    """
+    Cache key for a grade.
+    
+    The phrase is normalized to its whitespace separated tokens, which is all the
+    char offsets depend on, so extra spaces or a trailing newline still hit.
+    
+    Args:
+    -----
+        target_phrase (str): Original text phrase
+        target_phonemes (list): List of target IPA phonemes with spaces (or array of phoneme ids)
+        user_phonemes (list): List of user IPA phonemes with spaces (or array of phoneme ids)
+        
+    Returns:
+    --------
+        tuple: Hashable key
     """
+    return (' '.join(target_phrase.split()), phoneme_key(target_phonemes), phoneme_key(user_phonemes))
 
+def phoneme_key(phonemes):
+    """Phoneme ids as bytes (a PhonemeSequence's own buffer), the same for symbols, ids or a sequence."""
+    if isinstance(phonemes, pi.PhonemeSequence):
+        return phonemes.ids.tobytes()
+    return pi.phoneme_ids(phonemes).astype(np.uint8).tobytes()
+
+def get_pronunciation_scores(attempts, workers=None, columnar=False):
+    """
+    Get error info for many attempts at once (e.g., regrading stored attempts).
+    
+    Attempts are sorted by length and cut into chunks so padding stays small,
+    every chunk is aligned in one batch_needleman_wunsch call and chunks are
+    spread over a process pool.
+    
+    Args:
+    -----
+        attempts (list): List of (target_phrase, target_phonemes, user_phonemes)
+        workers (int): Number of worker processes, None uses every core, 1 stays in this process
+        columnar (bool): Return ScoreResults, also much cheaper to send back from the workers
+        
+    Returns:
+    --------
+        list: error_info dict (ScoreResult if columnar) for every attempt in the same order,
+              same as get_pronunciation_score
+    """
+    attempts = list(attempts)
+    chunks = size_chunks([(len(target), len(user)) for _, target, user in attempts])
+
+    workers = workers or os.cpu_count() or 1
+    chunk_attempts = [[attempts[k] for k in chunk] for chunk in chunks]
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            chunk_results = list(pool.map(score_chunk, chunk_attempts, [columnar] * len(chunks)))
+    else:
+        chunk_results = [score_chunk(chunk, columnar) for chunk in chunk_attempts]
+
+    results = [None] * len(attempts)
+    for chunk, chunk_result in zip(chunks, chunk_results):
+        for k, error_info in zip(chunk, chunk_result):
+            results[k] = error_info
+    return results
+
+def score_chunk(attempts, columnar=False):
+    """Align one chunk of (target_phrase, target_phonemes, user_phonemes) in a single batch."""
+    heard = []
+    alignments = batch_needleman_wunsch([(target, user) for _, target, user in attempts], heard=heard)
+    build = build_score_result if columnar else build_error_info
+    return [build(phrase, target, mispronounced_indices, accuracy, heard=said)
+            for (phrase, target, _), (mispronounced_indices, accuracy), said in zip(attempts, alignments, heard)]
+
+def build_error_info(target_phrase, target_phonemes, mispronounced_indices, accuracy, offset_index=None,
+                     heard=None):
+    """
+    Build the error info dict from an alignment result.
+    
+    Args:
+    -----
+        target_phrase (str): Original text phrase (e.g., "the cat")
+        target_phonemes (list): List of target IPA phonemes with spaces (or array of phoneme ids)
+        mispronounced_indices (dict): Target phoneme index -> severity from the aligner
+        accuracy (float): Accuracy percentage from the aligner
+        offset_index (OffsetIndex): Offsets of the target phrase, built if None
+        heard (dict): Target phoneme index -> user phoneme id said in its place (see follow_traceback)
+        
+    Returns:
+    --------
+        dict: Dictionary containing pronunciation feedback information 
+    """
     # NOTE: you may be like wtf is going on
     #       you don't need to understand what or why im doing it
     #       [  JUST KNOW ] the data im returning
     # trust process 💀
     error_info = {
-        'accuracy': 0, # advanced accuracy metric!
+        'accuracy': accuracy, # advanced accuracy metric!
         'incorrect_indices': [], # global character indices for highlighting
         'phoneme_indices': [], # global phoneme indices for highlighting
         'word_feedback': [] # phonemes and start/end positions for all words
     }
-    # phoneme indices with severity mapping
-    mispronounced_indices, error_info['accuracy'] = needleman_wunsch(target_phonemes, user_phonemes)
-    
-    # split target phrase into words and phonemes into word sublists
-    target_word_phonemes = split_phonemes(target_phonemes)
-    # clean punctuation
-    original_words = re.sub(r"[^\w\s']", '', target_phrase).split()
+    target_ids = pi.phoneme_ids(target_phonemes).tolist()
+    heard = heard or {}
+    if offset_index is None:
+        offset_index = build_offset_index(target_phrase, target_phonemes)
     
     ######### POPULATE WORD_FEEDBACK ###########
-    phoneme_index = 0
-    for word_index, word in enumerate(original_words):
-        # get words character positions
-        # count the characters to get to word index
-        word_start_pos = get_word_start_position(target_phrase, word_index)
-        word_end_pos = word_start_pos + len(word) 
-        
-        word_phonemes = target_word_phonemes[word_index]
+    for word_index, word in enumerate(offset_index.words):
         word_data = {
             'word': word,
-            'char_start_index': word_start_pos,
-            'char_end_index': word_end_pos,
+            'char_start_index': int(offset_index.word_char_starts[word_index]),
+            'char_end_index': int(offset_index.word_char_ends[word_index]),
             'phonemes': []
         }
         # populate phoneme list with a mapping of 
         # phonemes and severity
-        for phoneme in word_phonemes:
+        start, stop = offset_index.word_phoneme_spans[word_index]
+        for phoneme_index in range(start, stop):
             severity = mispronounced_indices.get(phoneme_index, "correct")
-            word_data['phonemes'].append({
-                'phoneme': phoneme,
+            phoneme_data = {
+                'phoneme': pi.PHONEMES[target_ids[phoneme_index]],
                 'severity': severity
-            })
-            phoneme_index +=1
-        phoneme_index+=1 # space
+            }
+            if severity != "correct":
+                # what the learner said instead (substitutions only, a dropped phoneme has none)
+                said = heard.get(phoneme_index, pi.SPACE_ID)
+                if said != pi.SPACE_ID:
+                    phoneme_data['likely'] = pi.PHONEMES[said]
+                # nearest phonemes by features, to practise against
+                phoneme_data['confusable'] = dt.confusable_phonemes(target_ids[phoneme_index])
+            word_data['phonemes'].append(phoneme_data)
         error_info['word_feedback'].append(word_data)
     
     ####### GLOBAL CHARACTER INDICES ########
-
-    # phoneme to word mapping
-    phoneme_to_word_map = {}
-    word_index = 0
-    for i, phoneme in enumerate(target_phonemes):
-        if phoneme == ' ':
-            word_index += 1
-        else:
-            phoneme_to_word_map[i] = word_index
     
     # grab mispronounced phonemes
     for phoneme_index, severity in mispronounced_indices.items():
 
-        phoneme = target_phonemes[phoneme_index]
-        if phoneme == ' ':
+        if target_ids[phoneme_index] == pi.SPACE_ID:
             continue
-        # word this phoneme belongs to
-        word_index = phoneme_to_word_map.get(phoneme_index, 0)
-        word_start_pos = error_info['word_feedback'][word_index]['char_start_index']
-        
-        # phoneme index within the word
-        relative_phoneme_index = get_phoneme_index_in_word(target_phonemes, phoneme_index)
-
-        # sum up the character offset before this character
-        char_offset = 0
-        for i in range(phoneme_index - relative_phoneme_index, phoneme_index):
-            if i >= 0 and i < len(target_phonemes) and target_phonemes[i] != ' ':
-                char_offset += IPA_MAPPINGS.get(target_phonemes[i], 1)
-    
-        phoneme_length = IPA_MAPPINGS.get(phoneme, 1)
+        # first character of the phoneme in the phrase and how many it covers
+        char_start, phoneme_length = offset_index.char_span(phoneme_index)
         # add each character position to the error info
         for j in range(phoneme_length):
-            global_char_pos = word_start_pos + char_offset + j
-            error_info['incorrect_indices'].append((global_char_pos, severity))
+            error_info['incorrect_indices'].append((char_start + j, severity))
     
     ###### GLOBAL PHONEME INDICES #######
     error_info['phoneme_indices'] = [(index, sev) for index, sev in mispronounced_indices.items()]
     
     return error_info
 
+def build_score_result(target_phrase, target_phonemes, mispronounced_indices, accuracy, offset_index=None,
+                       heard=None):
+    """
+    Columnar version of build_error_info (see ScoreResult).
+    
+    Args:
+    -----
+        target_phrase (str): Original text phrase (e.g., "the cat")
+        target_phonemes (list): List of target IPA phonemes with spaces (or array of phoneme ids)
+        mispronounced_indices (dict): Target phoneme index -> severity from the aligner
+        accuracy (float): Accuracy percentage from the aligner
+        offset_index (OffsetIndex): Offsets of the target phrase, built if None
+        heard (dict): Target phoneme index -> user phoneme id said in its place (see follow_traceback)
+        
+    Returns:
+    --------
+        ScoreResult: Reads like the error_info dict of build_error_info
+    """
+    if offset_index is None:
+        offset_index = build_offset_index(target_phrase, target_phonemes)
+    return ScoreResult.from_alignment(target_phonemes, mispronounced_indices, accuracy, offset_index, heard)
+
 # EXAMPLE #
 def test_alignment():
-    from panphon.distance import Distance
     import numpy as np
     import text_processing as tp
     
@@ -528,12 +1661,17 @@ def test_alignment():
     #target_phonemes = ['ð', 'ʌ', ' ', 'k', 'w', 'ɪ', 'k', ' ', 'b', 'ɹ', 'aʊ', 'n', ' ', 'f', 'ɑ', 'k', 's']
     #user_phonemes = ['j', 'ʌ', ' ', 'k', 'w', 'ɪ', 'k', ' ', 'b', 'ɹ', 'aʊ', 'n', ' ', 'f', 'ɑ', 'k', 's']
     print(user)
-    ### you can uncomment the print statements but this is final result
-    needleman_wunsch_with_debug(target_phonemes, user_phonemes)
-
-    score = get_pronunciation_score(target, target_phonemes, user_phonemes)
+    # step by step table of how the attempt was graded
+    trace = AlignmentTrace()
+    score = get_pronunciation_score(target, target_phonemes, user_phonemes, trace=trace)
+    print(trace.render())
     #print(score['phoneme_indices'])
     print(score)
 
+    # a streamed phoneme new to the inventory grows the tables mid stream
+    aligner = IncrementalAligner(['k', 'æ', 't'])
+    aligner.extend(['k', 'ʔ'])
+    assert aligner.finish() == needleman_wunsch(['k', 'æ', 't'], ['k', 'ʔ'])
+
 if __name__ == "__main__":
     test_alignment()
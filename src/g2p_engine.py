@@ -0,0 +1,274 @@
+import os
+import re
+import threading
+import unicodedata
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from score_cache import ScoreCache
+from text_processing import ARPA_TO_IPA
+import lexicon_index as li
+
+# this module keeps one g2p_en model per process and caches the pronunciation of every word
+# building a G2p() reloads the CMU dict, the model weights and the tagger, which used to happen per sentence
+# words are looked up in the compiled lexicon (lexicon_index.py) first, the g2p model
+# and tagger are only loaded once a word the lexicon doesnt have (or a homograph) shows up
+# NOTE: tokens follow G2p.__call__ exactly, a word's pronunciation only depends on the word
+#       except for homographs ("I read" / "to read") which g2p picks by part of speech,
+#       so sentences are only tagged when they have one and homographs are never cached
+
+# distinct words kept, a few MB at most
+WORD_CACHE_ENTRIES = 65536
+# texts bulk_ipa converts per round trip to the worker pool
+BULK_CHUNK_TEXTS = 2000
+
+_lock = threading.Lock()
+_engine = None
+
+IPA_TO_ARPA = {ipa: arpabet for arpabet, ipa in ARPA_TO_IPA.items()}
+
+
+def pronounced(arpabet):
+    """
+    ARPAbet phonemes of one word without stress, and their IPA.
+
+    Args:
+    -----
+        arpabet (list): g2p phonemes of the word (e.g., ['K', 'AE1', 'T'])
+
+    Returns:
+    --------
+        tuple: (ARPAbet tuple without stress, IPA tuple), symbols ARPA_TO_IPA doesnt know have no IPA
+    """
+    arpabet = tuple(re.sub(r'\d+', '', phoneme) for phoneme in arpabet)
+    return arpabet, tuple(ARPA_TO_IPA[phoneme] for phoneme in arpabet if phoneme in ARPA_TO_IPA)
+
+
+class G2PEngine:
+    """
+    g2p_en loaded once, with a bounded cache of word pronunciations.
+
+    Safe to share between threads, the model and tagger are only read after loading
+    and the word cache has its own lock.
+
+    Attributes:
+    -----------
+        homographs (dict): Word -> (pronunciation for pos, other pronunciation, pos tag prefix)
+        lexicon (LexiconIndex): Compiled CMU lexicon, None if it wasnt built (g2p's CMU dict is used)
+        word_cache (ScoreCache): Word -> (ARPAbet, IPA) pronunciation of every other word seen
+    """
+
+    def __init__(self, max_words=WORD_CACHE_ENTRIES):
+        """
+        Args:
+        -----
+            max_words (int): Words the pronunciation cache keeps
+        """
+        from g2p_en.expand import normalize_numbers
+        from g2p_en.g2p import construct_homograph_dictionary
+        from nltk.tokenize import TweetTokenizer
+        self._normalize_numbers = normalize_numbers
+        self._tokenize = TweetTokenizer().tokenize
+        self.homographs = {word: (pronounced(pron1), pronounced(pron2), pos)
+                           for word, (pron1, pron2, pos) in construct_homograph_dictionary().items()}
+        self.lexicon = li.load_lexicon_index()
+        self.word_cache = ScoreCache(max_entries=max_words, max_bytes=16 * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._g2p = None
+        self._tagger = None
+
+    def model(self):
+        """g2p_en's G2p (CMU dict and neural model), loaded the first time a word needs it."""
+        if self._g2p is None:
+            with self._lock:
+                if self._g2p is None:
+                    from g2p_en import G2p
+                    self._g2p = G2p()
+        return self._g2p
+
+    def tagger(self):
+        """Part of speech tagger for homographs, loaded on first use (nltk.pos_tag loads one per call)."""
+        if self._tagger is None:
+            with self._lock:
+                if self._tagger is None:
+                    from nltk.tag.perceptron import PerceptronTagger
+                    self._tagger = PerceptronTagger()
+        return self._tagger
+
+    def tokens(self, text):
+        """Words of a text after g2p's normalization (numbers spelled out, lowercase, accents stripped)."""
+        text = self._normalize_numbers(str(text))
+        text = ''.join(char for char in unicodedata.normalize('NFD', text)
+                       if unicodedata.category(char) != 'Mn')
+        text = re.sub(r"[^ a-z'.,?!\-]", "", text.lower())
+        text = text.replace("i.e.", "that is").replace("e.g.", "for example")
+        return self._tokenize(text)
+
+    def word_pronunciation(self, word, tag=None):
+        """
+        Pronunciation of one token.
+
+        Args:
+        -----
+            word (str): Token from tokens()
+            tag (str): Part of speech of the token in its sentence (only used for homographs)
+
+        Returns:
+        --------
+            tuple: (ARPAbet tuple without stress, IPA tuple)
+        """
+        homograph = self.homographs.get(word)
+        if homograph is not None:
+            first, second, pos = homograph
+            return first if (tag or '').startswith(pos) else second
+        pronunciation = self.word_cache.get(word)
+        if pronunciation is None:
+            has_letters = re.search("[a-z]", word) is not None
+            variants = self.lexicon.pronunciations(word) if has_letters and self.lexicon is not None else []
+            if not has_letters:
+                pronunciation = pronounced([word])
+            elif variants:
+                # main lexicon pronunciation, already IPA without stress
+                pronunciation = tuple(IPA_TO_ARPA.get(ipa, ipa) for ipa in variants[0]), variants[0]
+            elif word in self.model().cmu:
+                pronunciation = pronounced(self.model().cmu[word][0])
+            else:
+                # neural model for words no dictionary has
+                pronunciation = pronounced(self.model().predict(word))
+            self.word_cache.put(word, pronunciation)
+        return pronunciation
+
+    def needs_model(self, word):
+        """True if only the g2p model can pronounce a word (not cached, in the lexicon or a homograph)."""
+        if word in self.homographs or re.search("[a-z]", word) is None:
+            return False
+        if self.word_cache.get(word) is not None:
+            return False
+        return self.lexicon is None or word not in self.lexicon
+
+    def pronounce(self, text):
+        """
+        Pronunciation of every word of a text.
+
+        Args:
+        -----
+            text (str): Text (e.g., "I read it")
+
+        Returns:
+        --------
+            list: (ARPAbet tuple, IPA tuple) of every token
+        """
+        words = self.tokens(text)
+        # tagging is the slow part, only homographs need it
+        if any(word in self.homographs for word in words):
+            tags = [tag for _, tag in self.tagger().tag(words)]
+        else:
+            tags = [None] * len(words)
+        return [self.word_pronunciation(word, tag) for word, tag in zip(words, tags)]
+
+    def arpabet(self, text):
+        """ARPAbet phonemes of a text without stress, ' ' between words (like G2p()(text))."""
+        return join_words(arpabet for arpabet, _ in self.pronounce(text))
+
+    def ipa(self, text):
+        """IPA phonemes of a text, ' ' between words."""
+        return join_words(ipa for _, ipa in self.pronounce(text))
+
+
+def join_words(words):
+    """Phonemes of every word in one list with ' ' between words."""
+    phonemes = []
+    for k, word in enumerate(words):
+        if k:
+            phonemes.append(' ')
+        phonemes.extend(word)
+    return phonemes
+
+
+def get_g2p_engine():
+    """The process wide G2PEngine, loaded on first use."""
+    global _engine
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                _engine = G2PEngine()
+    return _engine
+
+
+def _init_worker():
+    """Load the engine with its g2p model once per worker process."""
+    get_g2p_engine().model()
+
+
+def _pronounce_part(words, sentences):
+    """Worker side of bulk_ipa: pronunciations of words and part of speech tags of tokenized sentences."""
+    engine = get_g2p_engine()
+    return ([engine.word_pronunciation(word) for word in words],
+            [[tag for _, tag in engine.tagger().tag(tokens)] for tokens in sentences])
+
+
+def bulk_ipa(texts, workers=None, progress=None, total=None, chunk_size=BULK_CHUNK_TEXTS):
+    """
+    IPA phonemes of many texts, streamed back in order.
+
+    Texts are read chunk_size at a time, every distinct word of a chunk is looked up once,
+    the words only the g2p model knows and the sentences with homographs (which need tagging)
+    are split over a process pool whose workers load the model once. The pool is only started
+    by the first chunk with words the lexicon doesnt have, lexicon only texts never pay for it.
+
+    Args:
+    -----
+        texts (iterable): Texts to convert
+        workers (int): Number of worker processes, None uses every core, 1 stays in this process
+        progress (callable): Called as progress(texts done, total) after every chunk
+        total (int): Number of texts for progress (None if unknown)
+        chunk_size (int): Texts per chunk
+
+    Yields:
+    -------
+        list: IPA phonemes of every text with ' ' between words (same as G2PEngine.ipa)
+    """
+    engine = get_g2p_engine()
+    workers = workers or os.cpu_count() or 1
+    texts = iter(texts)
+    done = 0
+    pool = None
+    try:
+        while True:
+            chunk = list(islice(texts, chunk_size))
+            if not chunk:
+                break
+            token_lists = [engine.tokens(text) for text in chunk]
+            words = list(dict.fromkeys(word for tokens in token_lists for word in tokens if engine.needs_model(word)))
+            tagged = [k for k, tokens in enumerate(token_lists) if any(word in engine.homographs for word in tokens)]
+
+            # contiguous parts, one per worker
+            parts = max(1, min(workers, len(words) + len(tagged)))
+            word_parts = [words[k * len(words) // parts:(k + 1) * len(words) // parts] for k in range(parts)]
+            tag_parts = [[token_lists[i] for i in tagged[k * len(tagged) // parts:(k + 1) * len(tagged) // parts]]
+                         for k in range(parts)]
+            # every worker loads the model, only worth it for words the lexicon doesnt have
+            if words and parts > 1:
+                if pool is None:
+                    pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+                results = list(pool.map(_pronounce_part, word_parts, tag_parts))
+            else:
+                results = [_pronounce_part(w, t) for w, t in zip(word_parts, tag_parts)]
+
+            pronunciations = {}
+            for word_part, (part_pronunciations, _) in zip(word_parts, results):
+                for word, pronunciation in zip(word_part, part_pronunciations):
+                    pronunciations[word] = pronunciation
+                    engine.word_cache.put(word, pronunciation)
+            tags = dict(zip(tagged, (sentence for _, part_tags in results for sentence in part_tags)))
+
+            for k, tokens in enumerate(token_lists):
+                sentence_tags = tags.get(k) or [None] * len(tokens)
+                yield join_words(pronunciations[word][1] if word in pronunciations
+                                 else engine.word_pronunciation(word, tag)[1]
+                                 for word, tag in zip(tokens, sentence_tags))
+            done += len(chunk)
+            if progress is not None:
+                progress(done, total)
+    finally:
+        if pool is not None:
+            pool.shutdown()
@@ -0,0 +1,149 @@
+import threading
+from functools import lru_cache
+import numpy as np
+import phoneme_inventory as pi
+from distance_table import RES_DIR
+
+# this module tells how many letters of a word every phoneme is spelled with
+# (e.g., "though" ð oʊ -> th ough), so highlighting lands on the right letters
+# the alignment of every lexicon pronunciation is built offline by build_grapheme_alignment.py,
+# words or pronunciations the lexicon doesnt have are aligned with its chunk model and cached
+# NOTE: words are matched lowercase, letters are the characters of the word as displayed
+
+ALIGNMENT_VERSION = 2
+ALIGNMENT_PATH = RES_DIR / f'grapheme_alignment_v{ALIGNMENT_VERSION}.npz'
+# fewest and most letters one phoneme is spelled with ("ough"), every phoneme gets a letter
+# so a mispronounced one always highlights something (words with fewer letters than phonemes,
+# like "box" b ɑ k s, cant be split and fall back to the fixed widths)
+MIN_CHUNK = 1
+MAX_CHUNK = 4
+# log probability of a (phoneme, letters) pair the model never saw
+UNSEEN_LOG_PROBABILITY = -20.0
+
+_lock = threading.Lock()
+_alignments = None
+
+
+def encode_strings(strings):
+    """Strings as one uint8 array (newline separated utf-8) for .npz files."""
+    return np.frombuffer('\n'.join(strings).encode('utf-8'), dtype=np.uint8)
+
+
+def decode_strings(array):
+    """Inverse of encode_strings."""
+    return array.tobytes().decode('utf-8').split('\n')
+
+
+def viterbi_widths(word, phonemes, log_probabilities):
+    """
+    Most likely split of a word into one chunk of letters per phoneme.
+
+    Args:
+    -----
+        word (str): Lowercase word (e.g., "though")
+        phonemes (tuple): Phoneme ids of its pronunciation
+        log_probabilities (dict): (phoneme id, chunk) -> log probability
+
+    Returns:
+    --------
+        list: Letters every phoneme is spelled with (sums to len(word)), None if it cant be split
+    """
+    m, n = len(phonemes), len(word)
+    if m == 0 or not m * MIN_CHUNK <= n <= m * MAX_CHUNK:
+        return None
+    best = [[-np.inf] * (n + 1) for _ in range(m + 1)]
+    back = [[0] * (n + 1) for _ in range(m + 1)]
+    best[0][0] = 0.0
+    for i, phoneme in enumerate(phonemes):
+        previous, row, back_row = best[i], best[i + 1], back[i + 1]
+        for j in range(n + 1):
+            for k in range(MIN_CHUNK, min(j, MAX_CHUNK) + 1):
+                if previous[j - k] == -np.inf:
+                    continue
+                score = previous[j - k] + log_probabilities.get((phoneme, word[j - k:j]), UNSEEN_LOG_PROBABILITY)
+                if score > row[j]:
+                    row[j] = score
+                    back_row[j] = k
+    if best[m][n] == -np.inf:
+        return None
+    widths, j = [], n
+    for i in range(m, 0, -1):
+        widths.append(back[i][j])
+        j -= back[i][j]
+    return widths[::-1]
+
+
+class _Alignments:
+    """Contents of the alignment file with phoneme ids remapped to this process's inventory."""
+
+    def __init__(self, data):
+        # the file stores ids of the inventory it was built with
+        remap = np.array([pi.intern(symbol) for symbol in decode_strings(data['symbols'])], dtype=np.intp)
+        self.word_index = {word: k for k, word in enumerate(decode_strings(data['words']))}
+        self.word_entries = data['word_entries']
+        self.entry_starts = data['entry_starts']
+        self.phonemes = remap[data['phonemes']].astype(np.uint8)
+        self.widths = data['widths']
+        self.log_probabilities = {
+            (int(phoneme), chunk): float(p) for phoneme, chunk, p in
+            zip(remap[data['model_phonemes']], decode_strings(data['model_chunks']), data['model_log_probabilities'])
+        }
+
+
+def load_alignments():
+    """
+    The prebuilt alignments, loaded on first use.
+
+    Returns:
+    --------
+        _Alignments: Alignments, None if the file is missing or from another version
+    """
+    global _alignments
+    if _alignments is None:
+        with _lock:
+            if _alignments is None:
+                try:
+                    with np.load(ALIGNMENT_PATH) as data:
+                        if int(data['version']) != ALIGNMENT_VERSION:
+                            return None
+                        _alignments = _Alignments(data)
+                except FileNotFoundError:
+                    return None
+    return _alignments
+
+
+@lru_cache(maxsize=65536)
+def _model_widths(word, phonemes):
+    """Chunk model split of a word the lexicon doesnt have, cached (words repeat a lot)."""
+    alignments = load_alignments()
+    widths = viterbi_widths(word, phonemes, alignments.log_probabilities)
+    return None if widths is None else tuple(widths)
+
+
+def letter_widths(word, phonemes):
+    """
+    Number of letters of a word every one of its phonemes is spelled with.
+
+    Args:
+    -----
+        word (str): Word, any case (e.g., "Though")
+        phonemes (list): IPA phonemes (or phoneme ids) of the word without spaces
+
+    Returns:
+    --------
+        tuple: Letters per phoneme, summing to len(word),
+               None if the alignment file is missing or the word cant be split
+    """
+    alignments = load_alignments()
+    if alignments is None:
+        return None
+    word = word.lower()
+    phoneme_ids = pi.phoneme_ids(phonemes)
+    word_index = alignments.word_index.get(word)
+    if word_index is not None:
+        key = phoneme_ids.astype(np.uint8).tobytes()
+        for entry in range(alignments.word_entries[word_index], alignments.word_entries[word_index + 1]):
+            start, stop = alignments.entry_starts[entry], alignments.entry_starts[entry + 1]
+            if stop - start == len(phoneme_ids) and alignments.phonemes[start:stop].tobytes() == key:
+                return tuple(alignments.widths[start:stop].tolist())
+    return _model_widths(word, tuple(phoneme_ids.tolist()))
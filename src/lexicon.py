@@ -0,0 +1,97 @@
+import re
+import threading
+from pathlib import Path
+import lexicon_index as li
+
+# this module reads the CMU pronouncing dictionary in IPA (CMU.in.IPA.txt)
+# lines look like "aaronson(1),\t\tɑˈɹʌnsʌn", numbered words are alternative pronunciations
+# NOTE: the file writes a few symbols differently from ARPA_TO_IPA (ej, ʤ, ɚ, g, ...),
+#       they are mapped so lexicon phonemes share ids with the g2p ones
+
+LEXICON_PATH = Path(__file__).resolve().parent.parent / 'CMU.in.IPA.txt'
+
+# lexicon spelling -> ARPA_TO_IPA spelling
+LEXICON_TO_IPA = {
+    'ej': 'eɪ', 'ow': 'oʊ', 'aj': 'aɪ', 'aw': 'aʊ', 'ɔj': 'ɔɪ',
+    'ʤ': 'dʒ', 'ʧ': 'tʃ', 'ɚ': 'ɝ', 'g': 'ɡ', 'r': 'ɹ',
+}
+# two letter diphthongs first so 'ej' isnt read as 'e' 'j'
+LEXICON_SYMBOL = re.compile('|'.join(sorted(LEXICON_TO_IPA, key=len, reverse=True)) + '|.')
+STRESS_MARKS = 'ˈˌ'
+
+_lexicon = None
+_lock = threading.Lock()
+
+
+def lexicon_phonemes(ipa):
+    """
+    Split a lexicon pronunciation into IPA phonemes.
+
+    Args:
+    -----
+        ipa (str): Pronunciation as written in the lexicon (e.g., "ejˈbiˈ")
+
+    Returns:
+    --------
+        list: List of IPA phonemes without stress (e.g., ['eɪ', 'b', 'i'])
+    """
+    # capital letters repeat the consonant before them across compound words (bookcase -> bʊˈkKejˌs)
+    ipa = ipa.lower()
+    # stress marks follow the vowel they belong to, splitting on them keeps 'ɔˈj' apart from 'ɔj'
+    return [LEXICON_TO_IPA.get(symbol, symbol) for part in re.split(f'[{STRESS_MARKS}]', ipa)
+            for symbol in LEXICON_SYMBOL.findall(part)]
+
+
+def read_lexicon(path=LEXICON_PATH):
+    """
+    Read every pronunciation of every word in the lexicon.
+
+    Args:
+    -----
+        path (Path): Lexicon file
+
+    Returns:
+    --------
+        dict: Lowercase word -> list of pronunciations (tuples of IPA phonemes), main one first
+    """
+    lexicon = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            word, sep, ipa = line.partition(',')
+            if not sep:
+                continue  # placeholder lines (XXXXX)
+            word = re.sub(r'\(\d+\)$', '', word)
+            variants = lexicon.setdefault(word, [])
+            phonemes = tuple(lexicon_phonemes(ipa.strip()))
+            if phonemes and phonemes not in variants:
+                variants.append(phonemes)
+    return lexicon
+
+
+def get_lexicon():
+    """The lexicon of CMU.in.IPA.txt (see read_lexicon), read on first use."""
+    global _lexicon
+    if _lexicon is None:
+        with _lock:
+            if _lexicon is None:
+                _lexicon = read_lexicon()
+    return _lexicon
+
+
+def pronunciations(word):
+    """
+    Pronunciations the lexicon lists for a word,
+    from the compiled index if it was built (see build_lexicon_index.py).
+
+    Args:
+    -----
+        word (str): Word, any case (e.g., "Read")
+
+    Returns:
+    --------
+        list: Tuples of IPA phonemes, empty if the word isnt in the lexicon
+    """
+    index = li.load_lexicon_index()
+    if index is not None:
+        return index.pronunciations(word)
+    return get_lexicon().get(word.lower(), [])
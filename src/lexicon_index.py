@@ -0,0 +1,164 @@
+import mmap
+import struct
+import sys
+import threading
+from distance_table import RES_DIR
+
+# this module looks words up in the compiled CMU lexicon (built by build_lexicon_index.py)
+# the file is memory mapped, opening it reads only the header and symbols, so it costs nothing
+# at startup and every process shares the same read only pages
+# NOTE: layout is little endian, a header then (n = words, v = pronunciations, p = phonemes)
+#       word_offsets uint32[n+1], word_variants uint32[n+1], variant_starts uint32[v+1],
+#       phonemes uint8[p], word bytes (utf-8, sorted), symbols (utf-8, newline separated)
+
+LEXICON_INDEX_VERSION = 1
+INDEX_PATH = RES_DIR / f'lexicon_v{LEXICON_INDEX_VERSION}.bin'
+# magic, version, words, pronunciations, phonemes, word bytes, symbol bytes
+HEADER = struct.Struct('<4sIIIIII')
+MAGIC = b'LEX1'
+
+_lock = threading.Lock()
+_index = None
+
+
+class LexiconIndex:
+    """
+    Read only view of a compiled lexicon file.
+
+    Words are found by binary search over the sorted word bytes, pronunciations
+    are phoneme ids into the file's symbol list (our inventory when it was built).
+    """
+
+    def __init__(self, path=INDEX_PATH):
+        """
+        Args:
+        -----
+            path (Path): Compiled lexicon file
+        """
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (self.magic, self.version, words, variants, phonemes,
+         word_bytes, symbol_bytes) = HEADER.unpack_from(self._map)
+        view = memoryview(self._map)
+        offset = HEADER.size
+
+        def section(size, fmt):
+            nonlocal offset
+            part = view[offset:offset + size]
+            offset += size
+            return part.cast(fmt)
+
+        self.word_count = words
+        self.pronunciation_count = variants
+        self.phoneme_count = phonemes
+        # uint32 sections cast to 'I', every lookup then reads plain python ints
+        self._word_offsets = section(4 * (words + 1), 'I')
+        self._word_variants = section(4 * (words + 1), 'I')
+        self._variant_starts = section(4 * (variants + 1), 'I')
+        self._phonemes = section(phonemes, 'B')
+        self._word_start = offset
+        offset += word_bytes
+        self.symbols = bytes(view[offset:offset + symbol_bytes]).decode('utf-8').split('\n')
+
+    def valid(self):
+        """True if the file is a lexicon index of this version (and this machine reads it as written)."""
+        # the uint32 sections are read in native order
+        return self.magic == MAGIC and self.version == LEXICON_INDEX_VERSION and sys.byteorder == 'little'
+
+    def _word(self, k):
+        start = self._word_start
+        return self._map[start + self._word_offsets[k]:start + self._word_offsets[k + 1]]
+
+    def find(self, word):
+        """
+        Position of a word in the sorted word table.
+
+        Args:
+        -----
+            word (str): Lowercase word
+
+        Returns:
+        --------
+            int: Word position, -1 if the lexicon doesnt have it
+        """
+        key = word.encode('utf-8')
+        lo, hi = 0, self.word_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._word(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.word_count and self._word(lo) == key:
+            return lo
+        return -1
+
+    def word(self, k):
+        """Word at position k of the sorted word table."""
+        return self._word(k).decode('utf-8')
+
+    def variant_ids(self, k):
+        """Pronunciations of the word at position k as memoryviews of phoneme ids, main one first."""
+        starts = self._variant_starts
+        return [self._phonemes[starts[v]:starts[v + 1]]
+                for v in range(self._word_variants[k], self._word_variants[k + 1])]
+
+    def pronunciation_ids(self, word):
+        """
+        Pronunciations of a word as phoneme ids into symbols.
+
+        Args:
+        -----
+            word (str): Lowercase word
+
+        Returns:
+        --------
+            list: memoryviews of phoneme ids, main pronunciation first (empty if missing)
+        """
+        k = self.find(word)
+        if k < 0:
+            return []
+        return self.variant_ids(k)
+
+    def pronunciations(self, word):
+        """
+        Pronunciations of a word (same as lexicon.pronunciations).
+
+        Args:
+        -----
+            word (str): Word, any case
+
+        Returns:
+        --------
+            list: Tuples of IPA phonemes, main one first (empty if missing)
+        """
+        symbols = self.symbols
+        return [tuple(symbols[i] for i in ids) for ids in self.pronunciation_ids(word.lower())]
+
+    def __len__(self):
+        return self.word_count
+
+    def __contains__(self, word):
+        return self.find(word.lower()) >= 0
+
+
+def load_lexicon_index():
+    """
+    The compiled lexicon, mapped on first use.
+
+    Returns:
+    --------
+        LexiconIndex: The index, None if the file is missing or from another version
+    """
+    global _index
+    if _index is None:
+        with _lock:
+            if _index is None:
+                try:
+                    index = LexiconIndex()
+                except (FileNotFoundError, ValueError, struct.error):
+                    return None
+                if not index.valid():
+                    return None
+                _index = index
+    return _index
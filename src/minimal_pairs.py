@@ -0,0 +1,208 @@
+import mmap
+import struct
+import sys
+import threading
+import lexicon_index as li
+from distance_table import RES_DIR
+
+# this module finds minimal pairs ("ship" / "sheep"): lexicon words one phoneme substitution away
+# built by build_minimal_pairs.py as a deletion neighbourhood, every pronunciation is stored once per
+# position with that phoneme replaced by a wildcard, words sharing such a key differ only there
+# a query is one binary search per phoneme of the word, so it doesnt depend on the lexicon size
+# NOTE: layout is little endian, a header then (g = keys shared by 2+ words, m = their members)
+#       key_offsets uint32[g+1], member_starts uint32[g+1], member_words uint32[m],
+#       member_phonemes uint8[m], key bytes (phoneme ids with WILDCARD, sorted)
+#       words are positions in lexicon_index's word table, phonemes are ids into its symbols
+
+MINIMAL_PAIRS_VERSION = 1
+PAIRS_PATH = RES_DIR / f'minimal_pairs_v{MINIMAL_PAIRS_VERSION}.bin'
+# magic, version, lexicon words, lexicon pronunciations, lexicon phonemes, keys, members, key bytes
+HEADER = struct.Struct('<4sIIIIIII')
+MAGIC = b'MPR1'
+# stands in for the substituted phoneme in a key, phoneme ids fit in a byte below it
+WILDCARD = 255
+
+_lock = threading.Lock()
+_index = None
+
+
+def lexicon_sizes(lexicon):
+    """Words, pronunciations and phonemes of a lexicon index, a pair file built from another lexicon is ignored."""
+    return lexicon.word_count, lexicon.pronunciation_count, lexicon.phoneme_count
+
+
+def neighbour_keys(ids):
+    """
+    Key of every position of a pronunciation.
+
+    Args:
+    -----
+        ids (bytes): Phoneme ids of the pronunciation
+
+    Returns:
+    --------
+        list: bytes with the phoneme at position k replaced by WILDCARD, for every k
+    """
+    ids = bytes(ids)
+    return [ids[:k] + bytes([WILDCARD]) + ids[k + 1:] for k in range(len(ids))]
+
+
+class MinimalPairIndex:
+    """
+    Read only view of a compiled minimal pair file.
+
+    Attributes:
+    -----------
+        lexicon (LexiconIndex): Lexicon the stored words and phoneme ids refer to
+    """
+
+    def __init__(self, lexicon, path=PAIRS_PATH):
+        """
+        Args:
+        -----
+            lexicon (LexiconIndex): Lexicon the file was built from
+            path (Path): Compiled minimal pair file
+        """
+        self.lexicon = lexicon
+        self._symbol_ids = {symbol: i for i, symbol in enumerate(lexicon.symbols)}
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (self.magic, self.version, *self.sizes, keys, members,
+         key_bytes) = HEADER.unpack_from(self._map)
+        view = memoryview(self._map)
+        offset = HEADER.size
+
+        def section(size, fmt):
+            nonlocal offset
+            part = view[offset:offset + size]
+            offset += size
+            return part.cast(fmt)
+
+        self.key_count = keys
+        self._key_offsets = section(4 * (keys + 1), 'I')
+        self._member_starts = section(4 * (keys + 1), 'I')
+        self._member_words = section(4 * members, 'I')
+        self._member_phonemes = section(members, 'B')
+        self._key_start = offset
+
+    def valid(self):
+        """True if the file is a pair file of this version built from this lexicon."""
+        # the uint32 sections are read in native order
+        return (self.magic == MAGIC and self.version == MINIMAL_PAIRS_VERSION and sys.byteorder == 'little'
+                and tuple(self.sizes) == lexicon_sizes(self.lexicon))
+
+    def _key(self, k):
+        start = self._key_start
+        return self._map[start + self._key_offsets[k]:start + self._key_offsets[k + 1]]
+
+    def find(self, key):
+        """Position of a key in the sorted key table, -1 if no two words share it."""
+        lo, hi = 0, self.key_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self.key_count and self._key(lo) == key:
+            return lo
+        return -1
+
+    def neighbour_ids(self, ids, contrast=None):
+        """
+        Lexicon words one phoneme substitution away from a pronunciation.
+
+        Args:
+        -----
+            ids (bytes): Phoneme ids of the pronunciation (into lexicon.symbols)
+            contrast (set): Phoneme ids, only substitutions between two of them are kept (None keeps all)
+
+        Returns:
+        --------
+            list: (word position, phoneme position, phoneme id, neighbour's phoneme id) of every neighbour
+        """
+        ids = bytes(ids)
+        starts, words, phonemes = self._member_starts, self._member_words, self._member_phonemes
+        neighbours = []
+        for k, key in enumerate(neighbour_keys(ids)):
+            if contrast is not None and ids[k] not in contrast:
+                continue
+            g = self.find(key)
+            if g < 0:
+                continue
+            for m in range(starts[g], starts[g + 1]):
+                other = phonemes[m]
+                if other != ids[k] and (contrast is None or other in contrast):
+                    neighbours.append((words[m], k, ids[k], other))
+        return neighbours
+
+    def neighbours(self, phonemes, contrast=None):
+        """
+        Lexicon words one phoneme substitution away from a pronunciation.
+
+        Args:
+        -----
+            phonemes (list): IPA phonemes without stress (e.g., ['ʃ', 'ɪ', 'p'])
+            contrast (tuple): IPA phonemes (e.g., ('θ', 's')), only pairs contrasting them are kept
+
+        Returns:
+        --------
+            list: (word, position, phoneme, neighbour's phoneme) sorted by word
+        """
+        symbols, symbol_ids = self.lexicon.symbols, self._symbol_ids
+        if any(phoneme not in symbol_ids for phoneme in list(phonemes) + list(contrast or ())):
+            return []
+        ids = bytes(symbol_ids[phoneme] for phoneme in phonemes)
+        contrast_ids = None if contrast is None else {symbol_ids[phoneme] for phoneme in contrast}
+        found = {(self.lexicon.word(word), k, symbols[phoneme], symbols[other])
+                 for word, k, phoneme, other in self.neighbour_ids(ids, contrast_ids)}
+        return sorted(found)
+
+
+def load_minimal_pairs():
+    """
+    The compiled minimal pair index, mapped on first use.
+
+    Returns:
+    --------
+        MinimalPairIndex: The index, None if it or the lexicon index is missing or out of date
+    """
+    global _index
+    if _index is None:
+        lexicon = li.load_lexicon_index()
+        if lexicon is None:
+            return None
+        with _lock:
+            if _index is None:
+                try:
+                    index = MinimalPairIndex(lexicon)
+                except (FileNotFoundError, ValueError, struct.error):
+                    return None
+                if not index.valid():
+                    return None
+                _index = index
+    return _index
+
+
+def minimal_pairs(word, contrast=None):
+    """
+    Minimal pairs of a lexicon word, for drills on one sound.
+
+    Args:
+    -----
+        word (str): Word (e.g., "ship")
+        contrast (tuple): IPA phonemes (e.g., ('ʃ', 'tʃ')), only pairs contrasting them are kept
+
+    Returns:
+    --------
+        list: (word, position, phoneme, neighbour's phoneme) over every pronunciation of the word,
+              e.g. ('chip', 0, 'ʃ', 'tʃ'), empty if the word or the index is missing
+    """
+    index = load_minimal_pairs()
+    if index is None:
+        return []
+    word = word.lower()
+    found = set()
+    for phonemes in index.lexicon.pronunciations(word):
+        found.update(pair for pair in index.neighbours(phonemes, contrast) if pair[0] != word)
+    return sorted(found)
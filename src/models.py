@@ -5,6 +5,7 @@ import torch
 import sounddevice as sd
 import librosa 
 import threading
+from collections import defaultdict
 from gtts import gTTS
 from pydub import AudioSegment
 from pydub.playback import play
@@ -25,6 +26,48 @@ def play_tts(text):
 
     threading.Thread(target=_play, daemon=True).start() # avoid freezing main ui thread
 
+def ctc_beam_search(log_probs, blank_id, beam_width=8, n=4):
+    """
+    CTC prefix beam search over per frame token log probabilities.
+
+    Args:
+    -----
+        log_probs (np.ndarray): T x V log probabilities from a CTC model
+        blank_id (int): Id of the CTC blank token
+        beam_width (int): Prefixes (and tokens per frame) kept
+        n (int): Number of hypotheses returned
+
+    Returns:
+    --------
+        list: Up to n token id tuples (blanks and repeats collapsed), most likely first
+    """
+    # prefix -> (log prob ending in blank, log prob ending in a token)
+    beams = {(): (0.0, -np.inf)}
+    for frame in log_probs:
+        # only the likeliest tokens of a frame can keep a prefix in the beam
+        candidates = np.argpartition(frame, -beam_width)[-beam_width:] if len(frame) > beam_width else range(len(frame))
+        next_beams = defaultdict(lambda: (-np.inf, -np.inf))
+        for prefix, (p_blank, p_token) in beams.items():
+            p_prefix = np.logaddexp(p_blank, p_token)
+            for c in candidates:
+                c = int(c)
+                p = frame[c]
+                if c == blank_id:
+                    b, t = next_beams[prefix]
+                    next_beams[prefix] = (np.logaddexp(b, p_prefix + p), t)
+                    continue
+                extended = prefix + (c,)
+                b, t = next_beams[extended]
+                if prefix and prefix[-1] == c:
+                    # a repeat only counts as a new token after a blank, otherwise it stays one token
+                    next_beams[extended] = (b, np.logaddexp(t, p_blank + p))
+                    b, t = next_beams[prefix]
+                    next_beams[prefix] = (b, np.logaddexp(t, p_token + p))
+                else:
+                    next_beams[extended] = (b, np.logaddexp(t, p_prefix + p))
+        beams = dict(sorted(next_beams.items(), key=lambda beam: np.logaddexp(*beam[1]), reverse=True)[:beam_width])
+    return list(beams)[:n]
+
 #### DELETE PHONEME MODEL FOR STORAGE ####
 # this model might get thrown but i need further testing with whisper
 # Whisper model is core to chat bot
@@ -77,6 +120,37 @@ class STTModel:
             traceback.print_exc()
             return ""
 
+    def transcribe_nbest(self, audio_path, n=4, beam_width=8):
+        """
+        Several likely transcriptions from a CTC beam search, most likely first.
+
+        Args:
+        -----
+            audio_path (str): Path of the recorded audio
+            n (int): Number of transcriptions
+            beam_width (int): Beam width of the search
+
+        Returns:
+        --------
+            list: Up to n transcriptions (just [transcribe(audio_path)] if the audio cant be searched)
+        """
+        if not os.path.exists(audio_path) or os.path.getsize(audio_path) < 100:
+            return [self.transcribe(audio_path)]
+        try:
+            audio_input = load_audio(audio_path, self.sample_rate)
+            input_values = self.processor(audio_input, return_tensors="pt", sampling_rate=self.sample_rate).input_values
+            input_values = input_values.to(self.device)
+
+            with torch.no_grad():
+                log_probs = torch.log_softmax(self.model(input_values).logits, dim=-1)[0].cpu().numpy()
+            blank_id = self.processor.tokenizer.pad_token_id
+            hypotheses = ctc_beam_search(log_probs, blank_id, beam_width, n)
+            # beams are already collapsed, grouping again would merge real double letters
+            return [self.processor.decode(list(ids), group_tokens=False) for ids in hypotheses]
+        except Exception as e:
+            print(f"Error during beam search: {str(e)}")
+            return [self.transcribe(audio_path)]
+
 class WhisperModel:
     def __init__(self, model_name="openai/whisper-small.en", sample_rate=16000):
 
@@ -95,8 +169,7 @@ class WhisperModel:
         self.device = torch.device("cpu")
         self.model.to(self.device)
             
-    def transcribe(self, audio_path):
-  
+    def input_features(self, audio_path):
         audio_input = load_audio(audio_path, self.sample_rate)
         
         input_features = self.processor(
@@ -104,7 +177,11 @@ class WhisperModel:
             sampling_rate=self.sample_rate, 
             return_tensors="pt"
         ).input_features
-        input_features = input_features.to(self.device)
+        return input_features.to(self.device)
+
+    def transcribe(self, audio_path):
+  
+        input_features = self.input_features(audio_path)
     
         with torch.no_grad():
             predicted_ids = self.model.generate(input_features)
@@ -115,3 +192,23 @@ class WhisperModel:
         )[0]
         
         return transcription
+
+    def transcribe_nbest(self, audio_path, n=4):
+        """
+        The n best beams of Whisper's beam search, most likely first.
+
+        Args:
+        -----
+            audio_path (str): Path of the recorded audio
+            n (int): Number of transcriptions (and beams)
+
+        Returns:
+        --------
+            list: n transcriptions
+        """
+        input_features = self.input_features(audio_path)
+
+        with torch.no_grad():
+            predicted_ids = self.model.generate(input_features, num_beams=n, num_return_sequences=n)
+
+        return self.processor.batch_decode(predicted_ids, skip_special_tokens=True)
@@ -0,0 +1,198 @@
+import re
+import numpy as np
+import phoneme_inventory as pi
+
+# this module maps between words, phonemes and character positions of one target phrase
+# built once per phrase so scoring, highlighting and click lookup dont rescan the phrase
+# NOTE: positions follow the original scoring code exactly
+#       words start after the raw whitespace split (punctuation counted),
+#       word text and end use the phrase with punctuation removed
+
+
+class OffsetIndex:
+    """
+    Word, phoneme and character offsets of a target phrase.
+
+    Every lookup is O(1) after the linear time build.
+
+    Attributes:
+    -----------
+        words (list): Words of the phrase without punctuation
+        word_char_starts (np.ndarray): Character position where every word starts
+        word_char_ends (np.ndarray): Character position where every word ends
+        word_phoneme_spans (list): (start, stop) phoneme index of every phoneme word
+        phoneme_to_word (np.ndarray): Word index of every phoneme (spaces belong to the next word)
+    """
+
+    def __init__(self, target_phrase, target_phonemes, char_widths, word_widths=None):
+        """
+        Args:
+        -----
+            target_phrase (str): Original text phrase (e.g., "the cat")
+            target_phonemes (PhonemeSequence): Target phonemes with spaces (or a list of IPA phonemes / id array)
+            char_widths (dict): Number of phrase characters a phoneme stands for (default 1)
+            word_widths (callable): (word, phonemes) -> characters of every phoneme of the word,
+                                    or None to fall back to char_widths (e.g., grapheme_alignment.letter_widths)
+        """
+        self.words = re.sub(r"[^\w\s']", '', target_phrase).split()
+        # +1 for the space after every raw word
+        raw_lengths = np.array([len(word) + 1 for word in target_phrase.split()], dtype=np.intp)
+        starts = np.concatenate(([0], np.cumsum(raw_lengths)))
+        # words past the raw split keep the last position, like counting only the words that exist
+        self.word_char_starts = starts[np.minimum(np.arange(len(self.words)), len(raw_lengths))]
+        self.word_char_ends = self.word_char_starts + np.array([len(word) for word in self.words], dtype=np.intp)
+
+        # the sequence already knows its ids and where its words are
+        target_phonemes = pi.PhonemeSequence.from_phonemes(target_phonemes)
+        ids = target_phonemes.as_array()
+        self.phoneme_to_word = np.cumsum(ids == pi.SPACE_ID)
+        word_bounds = np.array(target_phonemes.word_bounds, dtype=np.intp)
+        word_starts = word_bounds[:-1]
+        self.word_phoneme_spans = list(zip(word_starts.tolist(), (word_bounds[1:] - 1).tolist()))
+
+        # character offset of every phoneme inside its word, spaces take no characters
+        id_widths = np.array([0 if phoneme == ' ' else char_widths.get(phoneme, 1) for phoneme in pi.PHONEMES],
+                             dtype=np.intp)
+        widths = id_widths[ids]
+        # words and phoneme words only line up if g2p kept one phoneme word per word
+        if word_widths is not None and len(self.words) == len(self.word_phoneme_spans):
+            for word, (start, stop) in zip(self.words, self.word_phoneme_spans):
+                spelled = word_widths(word, target_phonemes[start:stop]) if stop > start else None
+                if spelled is not None:
+                    widths[start:stop] = spelled
+        ends = np.cumsum(widths)
+        self._char_widths = widths
+        self._word_offsets = ends - widths - np.concatenate(([0], ends))[word_starts][self.phoneme_to_word]
+
+        # phoneme display is the phonemes joined without separators
+        lengths = np.array([len(phoneme) for phoneme in pi.PHONEMES], dtype=np.intp)[ids]
+        self._display_ends = np.cumsum(lengths)
+        self._display_starts = self._display_ends - lengths
+
+        # first word starting/ending at or after every character position, for clicks
+        # (a word is the first to reach a position exactly when the running max first does)
+        positions = np.arange(len(target_phrase) + 2)
+        self._first_start_from = np.searchsorted(np.maximum.accumulate(self.word_char_starts), positions)
+        self._first_end_from = np.searchsorted(np.maximum.accumulate(self.word_char_ends), positions)
+
+    # arrays columns() returns, everything but the words
+    COLUMNS = ('word_char_starts', 'word_char_ends', 'word_phoneme_spans', 'phoneme_to_word', 'char_widths',
+               'word_offsets', 'display_starts', 'display_ends', 'first_start_from', 'first_end_from')
+
+    def columns(self):
+        """
+        Every array the index is made of, to store a prebuilt index (see from_columns).
+
+        Returns:
+        --------
+            dict: COLUMNS name -> np.ndarray (word_phoneme_spans as a words x 2 array)
+        """
+        return {
+            'word_char_starts': self.word_char_starts,
+            'word_char_ends': self.word_char_ends,
+            'word_phoneme_spans': np.array(self.word_phoneme_spans, dtype=np.intp).reshape(-1, 2),
+            'phoneme_to_word': self.phoneme_to_word,
+            'char_widths': self._char_widths,
+            'word_offsets': self._word_offsets,
+            'display_starts': self._display_starts,
+            'display_ends': self._display_ends,
+            'first_start_from': self._first_start_from,
+            'first_end_from': self._first_end_from,
+        }
+
+    @classmethod
+    def from_columns(cls, words, columns):
+        """
+        Index from the arrays of columns(), without rescanning the phrase.
+
+        Args:
+        -----
+            words (list): Words of the phrase without punctuation
+            columns (dict): COLUMNS name -> array (may be read only views of a memory map)
+
+        Returns:
+        --------
+            OffsetIndex: The index
+        """
+        index = cls.__new__(cls)
+        index.words = list(words)
+        index.word_char_starts = columns['word_char_starts']
+        index.word_char_ends = columns['word_char_ends']
+        index.word_phoneme_spans = [tuple(span) for span in np.asarray(columns['word_phoneme_spans']).tolist()]
+        index.phoneme_to_word = columns['phoneme_to_word']
+        index._char_widths = columns['char_widths']
+        index._word_offsets = columns['word_offsets']
+        index._display_starts = columns['display_starts']
+        index._display_ends = columns['display_ends']
+        index._first_start_from = columns['first_start_from']
+        index._first_end_from = columns['first_end_from']
+        return index
+
+    def char_span(self, phoneme_index):
+        """
+        Characters of the phrase a phoneme is highlighted on.
+
+        Args:
+        -----
+            phoneme_index (int): Global phoneme index (not a space)
+
+        Returns:
+        --------
+            tuple: (first character position, number of characters)
+        """
+        word_index = self.phoneme_to_word[phoneme_index]
+        start = self.word_char_starts[word_index] + self._word_offsets[phoneme_index]
+        return int(start), int(self._char_widths[phoneme_index])
+
+    def char_spans(self):
+        """
+        char_span of every phoneme at once.
+
+        Returns:
+        --------
+            tuple: (first character position, number of characters) arrays, spaces take no characters
+        """
+        if not self.words:
+            return np.zeros(len(self._char_widths), dtype=np.intp), self._char_widths
+        # phoneme words past the last word stay on it
+        words = np.minimum(self.phoneme_to_word, len(self.words) - 1)
+        return self.word_char_starts[words] + self._word_offsets, self._char_widths
+
+    def display_span(self, phoneme_index):
+        """
+        Characters of the joined phoneme display a phoneme takes.
+
+        Args:
+        -----
+            phoneme_index (int): Global phoneme index
+
+        Returns:
+        --------
+            tuple: (start, end) character position
+        """
+        return int(self._display_starts[phoneme_index]), int(self._display_ends[phoneme_index])
+
+    def word_at(self, char_start, char_end):
+        """
+        First word starting at or after char_start and ending at or after char_end
+        (the word a click between those positions landed on).
+
+        Args:
+        -----
+            char_start (int): Character position the clicked word starts at
+            char_end (int): Character position the clicked word ends at
+
+        Returns:
+        --------
+            int: Word index, None if there is no such word
+        """
+        last = len(self._first_start_from) - 1
+        # no word before this one can satisfy both, and it already does unless
+        # dropped punctuation made positions go backwards
+        word_index = int(max(self._first_start_from[min(char_start, last)],
+                             self._first_end_from[min(char_end, last)]))
+        while word_index < len(self.words):
+            if self.word_char_starts[word_index] >= char_start and self.word_char_ends[word_index] >= char_end:
+                return word_index
+            word_index += 1
+        return None
@@ -0,0 +1,160 @@
+from array import array
+import numpy as np
+from text_processing import ARPA_TO_IPA
+
+# this module interns IPA phonemes to small integer ids
+# so alignment can work on integer arrays instead of hashing strings per cell
+# NOTE: ids are assigned in ARPA_TO_IPA order (space is always 0)
+#       then EXTRA_PHONEMES, symbols seen at runtime get appended after
+
+# other symbols the distance table covers (british vowels, aspirated stops, ...)
+EXTRA_PHONEMES = ['e', 'ɒ', 'o', 'ə', 'ɜ', 'ɪə', 'eə', 'ʊə', 'ʌə', 'ɚ', 'g', 'r', 'tʰ', 'kʰ', 'pʰ', 'tʃʰ', 'ʃʰ']
+
+SPACE_ID = 0
+PHONEMES = list(dict.fromkeys([' '] + list(ARPA_TO_IPA.values()) + EXTRA_PHONEMES))
+PHONEME_IDS = {phoneme: i for i, phoneme in enumerate(PHONEMES)}
+
+
+def intern(phoneme):
+    """
+    Get the id of a phoneme, giving new symbols the next free id.
+
+    Args:
+    -----
+        phoneme (str): IPA phoneme (e.g., 'ð')
+
+    Returns:
+    --------
+        int: Id of the phoneme
+    """
+    phoneme_id = PHONEME_IDS.get(phoneme)
+    if phoneme_id is None:
+        phoneme_id = PHONEME_IDS[phoneme] = len(PHONEMES)
+        PHONEMES.append(phoneme)
+    return phoneme_id
+
+
+def phoneme_ids(phonemes):
+    """
+    Convert phonemes to an integer id array.
+
+    Args:
+    -----
+        phonemes (list, PhonemeSequence or np.ndarray): List of IPA phonemes with spaces,
+                                                        or an array that already holds ids
+
+    Returns:
+    --------
+        np.ndarray: Id of every phoneme (symbols not in the inventory are interned)
+    """
+    if isinstance(phonemes, np.ndarray):
+        return phonemes
+    if isinstance(phonemes, PhonemeSequence):
+        return phonemes.as_array().astype(np.intp)
+    return np.fromiter((PHONEME_IDS[p] if p in PHONEME_IDS else intern(p) for p in phonemes),
+                       dtype=np.intp, count=len(phonemes))
+
+
+def phoneme_symbols(ids):
+    """
+    Convert an id array back to a list of IPA phonemes.
+
+    Args:
+    -----
+        ids (np.ndarray, PhonemeSequence or list): Phoneme ids (a list of phonemes is returned as is)
+
+    Returns:
+    --------
+        list: List of IPA phonemes with spaces
+    """
+    if not isinstance(ids, np.ndarray):
+        return list(ids)
+    return [PHONEMES[i] for i in ids.tolist()]
+
+
+class PhonemeSequence:
+    """
+    Phonemes with spaces stored as one byte per interned id.
+
+    Iterating, indexing and len work like the list of IPA strings it replaces,
+    so it can go anywhere a phoneme list goes, without a string per phoneme.
+    Words are the runs between spaces (so there is always one more word than spaces).
+
+    Attributes:
+    -----------
+        ids (array): array('B') of phoneme ids
+        word_bounds (array): array('I'), word k is ids[word_bounds[k]:word_bounds[k+1] - 1]
+    """
+
+    __slots__ = ('ids', 'word_bounds', '_display')
+
+    def __init__(self, ids):
+        """
+        Args:
+        -----
+            ids (iterable): Phoneme ids (must fit in a byte)
+        """
+        self.ids = ids if isinstance(ids, array) and ids.typecode == 'B' else array('B', ids)
+        # every word ends one before the next word starts (on its space)
+        self.word_bounds = array('I', [0])
+        self.word_bounds.extend(k + 1 for k, phoneme_id in enumerate(self.ids) if phoneme_id == SPACE_ID)
+        self.word_bounds.append(len(self.ids) + 1)
+        self._display = None
+
+    @classmethod
+    def from_phonemes(cls, phonemes):
+        """
+        Build a sequence from IPA phonemes.
+
+        Args:
+        -----
+            phonemes (list, PhonemeSequence or np.ndarray): IPA phonemes with spaces, or ids
+
+        Returns:
+        --------
+            PhonemeSequence: The sequence (phonemes itself if it already is one)
+        """
+        if isinstance(phonemes, cls):
+            return phonemes
+        if isinstance(phonemes, np.ndarray):
+            return cls(phonemes.astype(np.uint8).tobytes())
+        return cls(PHONEME_IDS[p] if p in PHONEME_IDS else intern(p) for p in phonemes)
+
+    def as_array(self):
+        """The ids as a uint8 numpy array sharing memory with the sequence."""
+        return np.frombuffer(self.ids, dtype=np.uint8)
+
+    @property
+    def display(self):
+        """The phonemes joined without separators (as shown to the learner), built once."""
+        if self._display is None:
+            self._display = ''.join(self)
+        return self._display
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return (PHONEMES[phoneme_id] for phoneme_id in self.ids)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [PHONEMES[phoneme_id] for phoneme_id in self.ids[index]]
+        return PHONEMES[self.ids[index]]
+
+    def __eq__(self, other):
+        if isinstance(other, PhonemeSequence):
+            return self.ids == other.ids
+        if isinstance(other, (list, tuple)):
+            return len(other) == len(self.ids) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.ids.tobytes())
+
+    def __reduce__(self):
+        # ids of symbols interned at runtime differ between processes, send the symbols
+        return PhonemeSequence.from_phonemes, (list(self),)
+
+    def __repr__(self):
+        return f"PhonemeSequence({list(self)!r})"
@@ -0,0 +1,137 @@
+from difflib import SequenceMatcher
+import numpy as np
+import phoneme_inventory as pi
+import lexicon as lx
+from offset_index import OffsetIndex
+
+# this module turns a target phrase into a graph of every accepted pronunciation
+# (g2p output plus the CMU lexicon variants of each word), so one alignment pass
+# can grade against all variant combinations instead of aligning each separately
+# NOTE: variants of a word share common prefixes, words are joined by their space node
+
+
+class PronunciationLattice:
+    """
+    Pronunciation variants of a target phrase as a graph of phoneme nodes.
+
+    Rows number the nodes in topological order starting at 1,
+    row 0 is the start of the phrase (matches the alignment matrix rows).
+
+    Attributes:
+    -----------
+        labels (np.ndarray): Phoneme id of every row (row 0 is a space placeholder)
+        pred_starts (np.ndarray): Predecessors of row r are preds[pred_starts[r]:pred_starts[r+1]]
+        preds (np.ndarray): Predecessor rows, displayed pronunciation first
+        finals (np.ndarray): Rows the phrase can end on, displayed pronunciation first
+        display_index (np.ndarray): Target phoneme index every row is reported on (-1 for none)
+    """
+
+    def __init__(self, target_phonemes, word_variants, word_phoneme_spans):
+        """
+        Args:
+        -----
+            target_phonemes (list): List of target IPA phonemes with spaces (the displayed pronunciation)
+            word_variants (list): Other pronunciations (lists of IPA phonemes) of every phoneme word
+            word_phoneme_spans (list): (start, stop) target phoneme index of every phoneme word
+                                       (phonemes between them, like spaces, have no variants)
+        """
+        target_ids = pi.phoneme_ids(target_phonemes)
+        labels, display_index, preds = [pi.SPACE_ID], [-1], [[]]
+
+        def add_node(label, display, node_preds):
+            labels.append(label)
+            display_index.append(display)
+            preds.append(node_preds)
+            return len(labels) - 1
+
+        ends = [0]
+        position = 0
+        for word_index, (start, stop) in enumerate(word_phoneme_spans):
+            # the space between words (and any target phoneme no word span covers, like a
+            # leading space) is on every path, so a single pronunciation grades like needleman_wunsch
+            for index in range(position, start):
+                ends = [add_node(target_ids[index], index, ends)]
+            position = stop
+            displayed = target_ids[start:stop].tolist()
+            children = {}  # (parent row, phoneme id) -> row, shares prefixes between variants
+            word_ends = []
+            for variant in [displayed] + [pi.phoneme_ids(v).tolist() for v in word_variants[word_index]]:
+                parent = None
+                for phoneme, display in zip(variant, display_positions(displayed, variant)):
+                    key = (parent, phoneme)
+                    if key not in children:
+                        children[key] = add_node(phoneme, -1 if display < 0 else start + display,
+                                                 ends if parent is None else [parent])
+                    parent = children[key]
+                for end in ends if parent is None else [parent]:
+                    if end not in word_ends:
+                        word_ends.append(end)
+            ends = word_ends
+        for index in range(position, len(target_ids)):
+            ends = [add_node(target_ids[index], index, ends)]
+
+        self.labels = np.array(labels, dtype=np.intp)
+        self.display_index = np.array(display_index, dtype=np.intp)
+        self.pred_starts = np.concatenate(([0], np.cumsum([len(p) for p in preds]))).astype(np.intp)
+        self.preds = np.array([row for p in preds for row in p], dtype=np.intp)
+        self.finals = np.array(ends, dtype=np.intp)
+
+    @classmethod
+    def from_phrase(cls, target_phrase, target_phonemes, offset_index=None):
+        """
+        Lattice of a target phrase with the lexicon pronunciations of its words.
+
+        Args:
+        -----
+            target_phrase (str): Original text phrase (e.g., "read the data")
+            target_phonemes (list): List of target IPA phonemes with spaces
+            offset_index (OffsetIndex): Offsets of the target phrase (built if None)
+
+        Returns:
+        --------
+            PronunciationLattice: Lattice of the phrase
+        """
+        target_phonemes = pi.phoneme_symbols(target_phonemes)
+        if offset_index is None:
+            offset_index = OffsetIndex(target_phrase, target_phonemes, {})
+        spans = offset_index.word_phoneme_spans
+        # words and phoneme words only line up if g2p kept one phoneme word per word
+        if len(offset_index.words) == len(spans):
+            word_variants = [lx.pronunciations(word) for word in offset_index.words]
+        else:
+            word_variants = [[] for _ in spans]
+        return cls(target_phonemes, word_variants, spans)
+
+    def __len__(self):
+        return len(self.labels) - 1
+
+    def predecessors(self, row):
+        """Predecessor rows of a row."""
+        return self.preds[self.pred_starts[row]:self.pred_starts[row + 1]]
+
+
+def display_positions(displayed, variant):
+    """
+    Position in the displayed pronunciation every phoneme of a variant is reported on.
+
+    Args:
+    -----
+        displayed (list): Phoneme ids of the displayed pronunciation of a word
+        variant (list): Phoneme ids of another pronunciation of the same word
+
+    Returns:
+    --------
+        list: Displayed position of every variant phoneme (-1 if the word has no phonemes)
+    """
+    if not displayed:
+        return [-1] * len(variant)
+    positions = []
+    for tag, i1, i2, j1, j2 in SequenceMatcher(None, displayed, variant, autojunk=False).get_opcodes():
+        if tag == 'equal':
+            positions.extend(range(i1, i2))
+        elif tag == 'replace':
+            # spread the replaced phonemes over the displayed ones they stand for
+            positions.extend(i1 + (j - j1) * (i2 - i1) // (j2 - j1) for j in range(j1, j2))
+        elif tag == 'insert':
+            positions.extend([min(i1, len(displayed) - 1)] * (j2 - j1))
+    return positions
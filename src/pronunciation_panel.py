@@ -6,6 +6,7 @@ import random
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from res.descriptions import DESCRIPTIONS, AFFIRMATIONS
 from error_detection import IPA_MAPPINGS
+import grapheme_alignment as ga
 
 
 class PronunciationPanel:
@@ -189,12 +190,14 @@ class PronunciationPanel:
         self.text_display.config(width=len(word))
         self.text_display.tag_add("correct", "1.0", tk.END)
         # Map phonemes to character positions in the word
+        # letters each phoneme is spelled with, the fixed widths if the word cant be aligned
+        spelled = ga.letter_widths(word, [phoneme_data['phoneme'] for phoneme_data in phonemes])
         char_pos = 0
-        for phoneme_data in phonemes:
+        for phoneme_index, phoneme_data in enumerate(phonemes):
             phoneme = phoneme_data['phoneme']
             severity = phoneme_data['severity']
             # character count this phoneme represents
-            char_count = IPA_MAPPINGS.get(phoneme, 1)
+            char_count = spelled[phoneme_index] if spelled else IPA_MAPPINGS.get(phoneme, 1)
             # apply tag
             tag_start = f"1.0 + {char_pos}c"
             tag_end = f"1.0 + {char_pos + char_count}c"
@@ -279,14 +282,15 @@ class PronunciationPanel:
                 elif severity == "partial":
                     color = "#ff9933"
                 # Get description for the phoneme
-                description = self.get_phoneme_description(phoneme, severity)
+                description = self.get_phoneme_description(phoneme, severity, phoneme_data.get('confusable'),
+                                                           phoneme_data.get('likely'))
                 self.add_feedback_item(phoneme, description, color)
 
         self.scrollable_frame.update_idletasks()  
         self.canvas.configure(scrollregion=self.canvas.bbox("all"))
         self.update_scroll_indicator()
 
-    def get_phoneme_description(self, phoneme, severity):
+    def get_phoneme_description(self, phoneme, severity, confusable=None, likely=None):
         if severity == "correct":
             return random.choice(AFFIRMATIONS)
         description = DESCRIPTIONS.get(phoneme, 
@@ -294,6 +298,12 @@ class PronunciationPanel:
 
         if severity == "partial":
             description = "Close! " + description
+        # what was said instead, then the nearest sounds by features (see build_error_info)
+        if likely:
+            description += f" It sounded like /{likely}/."
+        others = [p for p in confusable or [] if p != likely][:2]
+        if others:
+            description += " Don't mix it up with " + ", ".join(f"/{p}/" for p in others) + "."
         return description
 
     def play_word_tts(self, word):
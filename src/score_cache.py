@@ -0,0 +1,102 @@
+import sys
+import threading
+from collections import OrderedDict
+
+# this module holds a small LRU cache for pronunciation scores
+# learners retry the same few sentences a lot so identical grades are common
+
+
+def estimate_size(obj):
+    """
+    Rough memory footprint of a cached value in bytes.
+
+    Args:
+    -----
+        obj: dict/list/tuple of strings and numbers (e.g., an error_info dict) or an object with nbytes
+
+    Returns:
+    --------
+        int: Approximate size in bytes including nested containers
+    """
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(estimate_size(item) for item in obj)
+    elif hasattr(obj, 'nbytes'):
+        # array backed values (e.g., ScoreResult)
+        size += obj.nbytes
+    return size
+
+
+class ScoreCache:
+    """
+    Least recently used cache bounded by entry count and memory.
+
+    Values are returned as stored, callers must treat them as read only.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.current_bytes = 0
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for key (marking it recently used) or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        """Store value under key, evicting least recently used entries to stay in bounds."""
+        size = estimate_size(key) + estimate_size(value)
+        # dont let one huge result flush everything else
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.current_bytes -= old[1]
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            while len(self._entries) > self.max_entries or self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+
+    def clear(self):
+        """Drop every entry and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        """
+        Cache statistics.
+
+        Returns:
+        --------
+            dict: hits, misses, entries, bytes and the configured limits
+        """
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+            }
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,252 @@
+import json
+import struct
+from collections.abc import Mapping
+import numpy as np
+import phoneme_inventory as pi
+import distance_table as dt
+
+# this module holds a grade as parallel arrays (one row per target phoneme) instead of nested dicts
+# the error_info keys (accuracy, incorrect_indices, phoneme_indices, word_feedback) are built
+# from the arrays the first time they are read, so graders that only store or ship results never build them
+# NOTE: serialized results carry phoneme symbols, not ids (ids past the fixed inventory differ between processes)
+
+SEVERITIES = ('correct', 'partial', 'incorrect')
+SEVERITY_CODES = {severity: code for code, severity in enumerate(SEVERITIES)}
+# magic, accuracy, then the number of phonemes, words, errors and distinct symbols
+HEADER = struct.Struct('<4sdIIII')
+MAGIC = b'SCR2'
+
+
+class ScoreResult(Mapping):
+    """
+    Grade of one attempt as parallel numpy arrays, read like an error_info dict.
+
+    Attributes:
+    -----------
+        accuracy (float): Accuracy percentage
+        phoneme_ids (np.ndarray): Target phoneme ids (uint8)
+        severity (np.ndarray): Severity code of every target phoneme (index into SEVERITIES)
+        char_starts (np.ndarray): First phrase character every phoneme is highlighted on
+        char_ends (np.ndarray): Character after the last one (equal to the start for spaces)
+        word_index (np.ndarray): Word of every phoneme, -1 for spaces
+        words (list): Words of the phrase without punctuation
+        word_char_starts (np.ndarray): Character position where every word starts
+        word_char_ends (np.ndarray): Character position where every word ends
+        error_order (np.ndarray): Mispronounced phoneme indices in the order the aligner reported them
+        heard_ids (np.ndarray): User phoneme id said in place of every substituted phoneme, SPACE_ID elsewhere
+    """
+
+    # error_info key -> method that builds it
+    VIEWS = {
+        'accuracy': '_accuracy',
+        'incorrect_indices': '_incorrect_indices',
+        'phoneme_indices': '_phoneme_indices',
+        'word_feedback': '_word_feedback',
+    }
+
+    def __init__(self, accuracy, phoneme_ids, severity, char_starts, char_ends, word_index,
+                 words, word_char_starts, word_char_ends, error_order, heard_ids):
+        self.accuracy = float(accuracy)
+        self.phoneme_ids = _frozen(phoneme_ids, np.uint8)
+        self.severity = _frozen(severity, np.uint8)
+        self.char_starts = _frozen(char_starts, np.int32)
+        self.char_ends = _frozen(char_ends, np.int32)
+        self.word_index = _frozen(word_index, np.int32)
+        self.words = list(words)
+        self.word_char_starts = _frozen(word_char_starts, np.int32)
+        self.word_char_ends = _frozen(word_char_ends, np.int32)
+        self.error_order = _frozen(error_order, np.int32)
+        self.heard_ids = _frozen(heard_ids, np.uint8)
+        self._views = {}
+
+    @classmethod
+    def from_alignment(cls, target_phonemes, mispronounced_indices, accuracy, offset_index, heard=None):
+        """
+        Result of an aligner for a target phrase.
+
+        Args:
+        -----
+            target_phonemes (list): List of target IPA phonemes with spaces (or array of phoneme ids)
+            mispronounced_indices (dict): Target phoneme index -> severity from the aligner
+            accuracy (float): Accuracy percentage from the aligner
+            offset_index (OffsetIndex): Offsets of the target phrase
+            heard (dict): Target phoneme index -> user phoneme id said in its place from the aligner
+
+        Returns:
+        --------
+            ScoreResult: The result
+        """
+        phoneme_ids = pi.phoneme_ids(target_phonemes)
+        error_order = np.fromiter(mispronounced_indices, dtype=np.int32, count=len(mispronounced_indices))
+        severity = np.zeros(len(phoneme_ids), dtype=np.uint8)
+        severity[error_order] = [SEVERITY_CODES[s] for s in mispronounced_indices.values()]
+        heard_ids = np.full(len(phoneme_ids), pi.SPACE_ID, dtype=np.uint8)
+        if heard:
+            heard_ids[list(heard)] = list(heard.values())
+
+        is_space = phoneme_ids == pi.SPACE_ID
+        word_index = np.where(is_space, -1, offset_index.phoneme_to_word).astype(np.int32)
+        char_starts, char_widths = offset_index.char_spans()
+        char_ends = char_starts + char_widths
+        return cls(accuracy, phoneme_ids, severity, char_starts, char_ends, word_index,
+                   offset_index.words, offset_index.word_char_starts, offset_index.word_char_ends, error_order,
+                   heard_ids)
+
+    ######### ERROR_INFO VIEWS ###########
+
+    def __getitem__(self, key):
+        view = self._views.get(key)
+        if view is None:
+            # unknown keys fail the VIEWS lookup with a KeyError, like a dict
+            view = self._views[key] = getattr(self, self.VIEWS[key])()
+        return view
+
+    def __iter__(self):
+        return iter(self.VIEWS)
+
+    def __len__(self):
+        return len(self.VIEWS)
+
+    def _accuracy(self):
+        return self.accuracy
+
+    def _incorrect_indices(self):
+        """Every highlighted phrase character with its severity, spaces take none."""
+        incorrect_indices = []
+        for index in self.error_order.tolist():
+            if self.phoneme_ids[index] == pi.SPACE_ID:
+                continue
+            severity = SEVERITIES[self.severity[index]]
+            incorrect_indices.extend((char, severity) for char in range(self.char_starts[index], self.char_ends[index]))
+        return incorrect_indices
+
+    def _phoneme_indices(self):
+        """Mispronounced phoneme indices with their severity, in aligner order."""
+        return [(index, SEVERITIES[self.severity[index]]) for index in self.error_order.tolist()]
+
+    def _word_feedback(self):
+        """Phonemes and character span of every word (see build_error_info)."""
+        symbols = pi.phoneme_symbols(self.phoneme_ids)
+        heard = self.heard_ids.tolist()
+        word_feedback = [{
+            'word': word,
+            'char_start_index': int(start),
+            'char_end_index': int(end),
+            'phonemes': []
+        } for word, start, end in zip(self.words, self.word_char_starts.tolist(), self.word_char_ends.tolist())]
+        for index, (word, code) in enumerate(zip(self.word_index.tolist(), self.severity.tolist())):
+            if word < 0 or word >= len(word_feedback):
+                continue
+            phoneme_data = {'phoneme': symbols[index], 'severity': SEVERITIES[code]}
+            if code:
+                if heard[index] != pi.SPACE_ID:
+                    phoneme_data['likely'] = pi.PHONEMES[heard[index]]
+                phoneme_data['confusable'] = dt.confusable_phonemes(int(self.phoneme_ids[index]))
+            word_feedback[word]['phonemes'].append(phoneme_data)
+        return word_feedback
+
+    ######### SERIALIZATION ###########
+
+    @property
+    def nbytes(self):
+        """Bytes held by the arrays."""
+        return sum(array.nbytes for array in (self.phoneme_ids, self.severity, self.char_starts, self.char_ends,
+                                              self.word_index, self.word_char_starts, self.word_char_ends,
+                                              self.error_order, self.heard_ids))
+
+    def to_bytes(self):
+        """
+        Compact binary form: header, int32 columns, uint8 columns, then symbols and words as text.
+
+        Returns:
+        --------
+            bytes: Serialized result (see from_bytes)
+        """
+        # local ids so the bytes dont depend on this process's interned ids
+        n = len(self.phoneme_ids)
+        symbol_ids, local_ids = np.unique(np.concatenate([self.phoneme_ids, self.heard_ids]), return_inverse=True)
+        symbols = pi.phoneme_symbols(symbol_ids)
+        header = HEADER.pack(MAGIC, self.accuracy, n, len(self.words),
+                             len(self.error_order), len(symbols))
+        text = '\n'.join(symbols + self.words).encode('utf-8')
+        columns = (self.char_starts, self.char_ends, self.word_index, self.word_char_starts,
+                   self.word_char_ends, self.error_order, local_ids[:n].astype(np.uint8),
+                   local_ids[n:].astype(np.uint8), self.severity)
+        return b''.join([header] + [column.astype(column.dtype.newbyteorder('<')).tobytes() for column in columns]
+                        + [text])
+
+    @classmethod
+    def from_bytes(cls, data):
+        """
+        Read a result written by to_bytes.
+
+        Args:
+        -----
+            data (bytes): Serialized result
+
+        Returns:
+        --------
+            ScoreResult: The result, None if data isnt a serialized result
+        """
+        if len(data) < HEADER.size:
+            return None
+        magic, accuracy, n, words, errors, symbols = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            return None
+        offset = HEADER.size
+        columns = []
+        for count, dtype in ((n, '<i4'), (n, '<i4'), (n, '<i4'), (words, '<i4'), (words, '<i4'),
+                             (errors, '<i4'), (n, 'u1'), (n, 'u1'), (n, 'u1')):
+            columns.append(np.frombuffer(data, dtype=dtype, count=count, offset=offset))
+            offset += columns[-1].nbytes
+        (char_starts, char_ends, word_index, word_starts, word_ends, error_order, local_ids, heard_local,
+         severity) = columns
+        text = data[offset:].decode('utf-8').split('\n') if symbols + words else []
+        symbol_ids = pi.phoneme_ids(text[:symbols])
+        return cls(accuracy, symbol_ids[local_ids], severity, char_starts, char_ends, word_index,
+                   text[symbols:], word_starts, word_ends, error_order, symbol_ids[heard_local])
+
+    def to_json(self, **kwargs):
+        """
+        Columns as a JSON object (phonemes as symbols), kwargs go to json.dumps.
+
+        Returns:
+        --------
+            str: Serialized result (see from_json)
+        """
+        return json.dumps({
+            'accuracy': self.accuracy,
+            'phonemes': pi.phoneme_symbols(self.phoneme_ids),
+            'severity': self.severity.tolist(),
+            'char_starts': self.char_starts.tolist(),
+            'char_ends': self.char_ends.tolist(),
+            'word_index': self.word_index.tolist(),
+            'words': self.words,
+            'word_char_starts': self.word_char_starts.tolist(),
+            'word_char_ends': self.word_char_ends.tolist(),
+            'error_order': self.error_order.tolist(),
+            'heard': pi.phoneme_symbols(self.heard_ids),
+        }, ensure_ascii=False, separators=(',', ':'), **kwargs)
+
+    @classmethod
+    def from_json(cls, text):
+        """Read a result written by to_json."""
+        data = json.loads(text)
+        return cls(data['accuracy'], pi.phoneme_ids(data['phonemes']), data['severity'],
+                   data['char_starts'], data['char_ends'], data['word_index'], data['words'],
+                   data['word_char_starts'], data['word_char_ends'], data['error_order'],
+                   pi.phoneme_ids(data['heard']))
+
+    def __reduce__(self):
+        # process pools ship the compact bytes instead of pickling every array
+        return (ScoreResult.from_bytes, (self.to_bytes(),))
+
+    def __repr__(self):
+        return f"ScoreResult(accuracy={self.accuracy:.2f}, phonemes={len(self.phoneme_ids)}, errors={len(self.error_order)})"
+
+
+def _frozen(values, dtype):
+    """Read only array of values (results can be shared through the score cache)."""
+    array = np.array(values, dtype=dtype)
+    array.flags.writeable = False
+    return array
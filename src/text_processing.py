@@ -1,4 +1,3 @@
-from g2p_en import G2p
 import re
 
 # this module holds text processing functions
@@ -9,10 +8,10 @@ import re
 def text_to_phoneme(text):
     # clean text for processing
     text = re.sub(r"[^\w\s']", '', text)
-    g2p = G2p()
-    phonemes = g2p(text)
-    #remove stress markers of phonetic representation
-    return [re.sub(r'\d+', '', phoneme) for phoneme in phonemes]
+    # imported here so modules that only need ARPA_TO_IPA dont load g2p
+    from g2p_engine import get_g2p_engine
+    # one g2p per process with cached words, stress markers already removed
+    return get_g2p_engine().arpabet(text)
 
 ARPA_TO_IPA = {
     "AA": "ɑ", "AE": "æ", "AH": "ʌ", "AO": "ɔ", "AW": "aʊ", "AY": "aɪ",
@@ -26,18 +25,42 @@ ARPA_TO_IPA = {
 
 
 def text_to_ipa_phoneme(text):
-    arpabet_phonemes = text_to_phoneme(text)
-    # convert to IPA
-    ipa_phonemes = []
-    for phoneme in arpabet_phonemes:
-        if phoneme in ARPA_TO_IPA:
-            ipa_phonemes.append(ARPA_TO_IPA[phoneme])
-        elif phoneme == ' ':
-            ipa_phonemes.append(' ')
-
-    return ipa_phonemes
+    # imported here, phoneme_inventory and g2p_engine need ARPA_TO_IPA from this module
+    from phoneme_inventory import PhonemeSequence
+    from g2p_engine import get_g2p_engine
+    # clean text for processing (same as text_to_phoneme)
+    text = re.sub(r"[^\w\s']", '', text)
+    # the engine caches every word's IPA, no per phoneme mapping here
+    ipa_phonemes = get_g2p_engine().ipa(text)
+
+    # one byte per phoneme instead of a list of strings, still iterates like the list
+    return PhonemeSequence.from_phonemes(ipa_phonemes)
  
 
+def text_to_ipa_phonemes(texts, workers=None, progress=None):
+    """
+    text_to_ipa_phoneme for many texts (e.g., a new lesson set), streamed back in order.
+
+    Args:
+    -----
+        texts (iterable): Texts to convert
+        workers (int): Number of worker processes for words the lexicon doesnt have,
+                       None uses every core, 1 stays in this process
+        progress (callable): Called as progress(texts done, total) as chunks finish
+                             (total is None if texts has no len)
+
+    Yields:
+    -------
+        PhonemeSequence: IPA phonemes of every text
+    """
+    from phoneme_inventory import PhonemeSequence
+    from g2p_engine import bulk_ipa
+    total = len(texts) if hasattr(texts, '__len__') else None
+    cleaned = (re.sub(r"[^\w\s']", '', text) for text in texts)
+    for ipa_phonemes in bulk_ipa(cleaned, workers=workers, progress=progress, total=total):
+        yield PhonemeSequence.from_phonemes(ipa_phonemes)
+
+
 if __name__ == "__main__":
     text = "dog, there."    
     phoneme_output = text_to_ipa_phoneme(text)